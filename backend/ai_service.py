@@ -6,6 +6,11 @@ import logging
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 
+from metrics import metrics
+from model_routing import ModelRouter
+from model_keepalive import ModelKeepAlive, KEEP_ALIVE_SECONDS
+from structured_output import list_schema, salvage_json_list, validate_items
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -47,10 +52,26 @@ except ImportError as e:
             self.benefits = benefits
             self.instructions = instructions
 
+# Identical on every chat request so the model server can reuse the
+# evaluated prefix; per-user context is sent as a separate message after it
+CHAT_SYSTEM_PROMPT = """You are a compassionate AI assistant specializing in mental health support and mindful eating. You provide empathetic, non-judgmental responses that help users process their emotions and develop healthier relationships with food and themselves.
+
+Key principles:
+- Always be empathetic and validating
+- Never provide medical or therapeutic advice
+- Focus on mindfulness, self-awareness, and gentle guidance  
+- Encourage professional help when appropriate
+- Use a warm, conversational tone
+- Keep responses concise but meaningful (2-3 paragraphs max)
+
+Respond to the user's message with care and understanding."""
+
 class AIService:
     def __init__(self, ollama_url: str = "http://localhost:11434"):
         self.ollama_url = ollama_url
         self.model_name = "llama3.2:3b"
+        self.router = ModelRouter()
+        self.keepalive = ModelKeepAlive(self._load_model)
         self.initialized = False
         
     async def initialize(self):
@@ -74,8 +95,11 @@ class AIService:
                                 self.initialized = False
                                 return False
                         
+                        self.router.resolve(model_names, self.model_name)
                         self.initialized = True
-                        logger.info(f"AI Service initialized with {self.model_name}")
+                        logger.info(f"AI Service initialized with {self.model_name}, tiers: {self.router.models}")
+                        await self.warm_up()
+                        self.keepalive.start(self.router.models.values())
                         return True
                     else:
                         logger.error(f"Ollama server returned status {response.status}")
@@ -87,55 +111,45 @@ class AIService:
             self.initialized = False
             return False
 
-    async def chat(self, user_id: str, message: str, context: UserContext = None) -> str:
-        """Generate conversational AI response"""
-        
-        # Always ensure we return a non-empty response
-        if not message or not message.strip():
-            return "I'm here to listen. What would you like to talk about?"
-        
-        if not self.initialized:
-            return self._get_fallback_response(message)
-        
+    async def close(self):
+        await self.keepalive.stop()
+
+    def _request(self, task: str, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """Routed request body that also keeps its model loaded between requests"""
+        data = self.router.request(task, messages, **kwargs)
+        data["keep_alive"] = KEEP_ALIVE_SECONDS
+        self.keepalive.touch(data["model"])
+        return data
+
+    async def _load_model(self, model: str) -> bool:
+        """Load (or keep loaded) a model without generating anything"""
+        try:
+            timeout = aiohttp.ClientTimeout(total=120)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                with metrics.timer("llm_model_load", model=model):
+                    async with session.post(f"{self.ollama_url}/api/generate",
+                                            json={"model": model, "keep_alive": KEEP_ALIVE_SECONDS}) as response:
+                        return response.status == 200
+        except Exception as e:
+            logger.warning(f"Could not load model {model}: {e}")
+            return False
+
+    async def warm_up(self):
+        """Load every routed model and prime the prompt cache with the chat system prompt"""
+        for model in sorted(set(self.router.models.values())):
+            if await self._load_model(model):
+                self.keepalive.loaded(model)
+        data = self.router.request("chat", self._chat_messages("Hello"))
+        data["keep_alive"] = KEEP_ALIVE_SECONDS
+        data["options"]["num_predict"] = 1
         try:
-            # Build system prompt
-            system_prompt = """You are a compassionate AI wellness companion. You provide empathetic, supportive responses to help users with mental health and mindful eating. Keep responses warm, concise (2-3 sentences), and encouraging. Never provide medical advice."""
-            
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": message.strip()}
-            ]
-            
-            data = {
-                "model": self.model_name,
-                "messages": messages,
-                "stream": False,
-                "options": {
-                    "temperature": 0.7,
-                    "num_predict": 200  # Shorter responses
-                }
-            }
-            
-            timeout = aiohttp.ClientTimeout(total=15)
+            timeout = aiohttp.ClientTimeout(total=60)
             async with aiohttp.ClientSession(timeout=timeout) as session:
                 async with session.post(f"{self.ollama_url}/api/chat", json=data) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        ai_response = result.get('message', {}).get('content', '').strip()
-                        
-                        # Fallback if empty response
-                        if not ai_response:
-                            return self._get_fallback_response(message)
-                        
-                        return ai_response
-                    else:
-                        logger.error(f"Ollama API error: {response.status}")
-                        return self._get_fallback_response(message)
-                        
+                    await response.read()
         except Exception as e:
-            logger.error(f"Error generating response: {e}")
-            return self._get_fallback_response(message)
-    
+            logger.warning(f"Prompt cache warm-up failed: {e}")
+
     async def _pull_model(self):
         """Pull the model if not available"""
         async with aiohttp.ClientSession() as session:
@@ -146,9 +160,18 @@ class AIService:
                 else:
                     print(f"Failed to pull {self.model_name}")
 
-    async def _generate_response(self, prompt: str, system_prompt: str = None) -> str:
-        """Generate response using Ollama"""
+    async def _generate_response(self, prompt: str, system_prompt: str = None, task: str = "chat",
+                                 context_note: str = None, fallback: bool = True) -> Optional[str]:
+        """Generate response using Ollama with the model and budget routed for `task`.
+
+        system_prompt should be constant per task so the server can reuse its
+        cached prefix; per-user details go in context_note, sent after it.
+        When the model cannot answer, returns a canned reply, or None with
+        fallback=False (for results that are stored and must be retried).
+        """
         if not self.initialized:
+            if not fallback:
+                return None
             logger.warning("AI Service not initialized, using fallback response")
             return self._get_fallback_response(prompt)
         
@@ -156,37 +179,110 @@ class AIService:
         
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
+        if context_note:
+            messages.append({"role": "system", "content": context_note})
         
         messages.append({"role": "user", "content": prompt})
         
-        data = {
-            "model": self.model_name,
-            "messages": messages,
-            "stream": False,
-            "options": {
-                "temperature": 0.7,
-                "top_p": 0.9,
-                "num_predict": 500
-            }
-        }
+        data = self._request(task, messages)
         
         try:
-            timeout = aiohttp.ClientTimeout(total=30)
+            timeout = aiohttp.ClientTimeout(total=self.router.timeout(task))
             async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(f"{self.ollama_url}/api/chat", json=data) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result['message']['content'].strip()
-                    else:
-                        logger.error(f"Ollama API error: {response.status}")
-                        return "I'm having trouble connecting right now. Please try again in a moment."
+                with metrics.timer("llm_latency", task=task, model=data["model"]):
+                    async with session.post(f"{self.ollama_url}/api/chat", json=data) as response:
+                        if response.status == 200:
+                            result = await response.json()
+                            self._record_usage(task, result)
+                            content = result['message']['content'].strip()
+                            return content if content or fallback else None
+                        else:
+                            logger.error(f"Ollama API error: {response.status}")
+                            if not fallback:
+                                return None
+                            return "I'm having trouble connecting right now. Please try again in a moment."
         except asyncio.TimeoutError:
-            logger.error("Ollama request timed out")
+            logger.error(f"Ollama request timed out ({task})")
+            metrics.increment("llm_timeouts", task=task)
+            if not fallback:
+                return None
             return "I'm taking a bit longer to respond than usual. Please try again."
         except Exception as e:
             logger.error(f"Error generating response: {e}")
-            return self._get_fallback_response(prompt)
-    
+            return self._get_fallback_response(prompt) if fallback else None
+
+    @staticmethod
+    def _record_usage(task: str, result: Dict[str, Any]):
+        """Count generated tokens per task, from Ollama's final response fields"""
+        if result.get("eval_count"):
+            metrics.increment("llm_generated_tokens", result["eval_count"], task=task)
+        if result.get("done_reason") == "length":
+            # Hit num_predict: the budget for this task may be too tight
+            metrics.increment("llm_truncated", task=task)
+
+    async def _generate_json(self, messages: List[Dict[str, str]], schema: Dict[str, Any],
+                             task: str) -> Optional[str]:
+        """Chat completion constrained to a JSON schema; None when the request fails"""
+        data = self._request(task, messages, format=schema)
+        try:
+            timeout = aiohttp.ClientTimeout(total=self.router.timeout(task))
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                with metrics.timer("llm_latency", task=task, model=data["model"]):
+                    async with session.post(f"{self.ollama_url}/api/chat", json=data) as response:
+                        if response.status == 200:
+                            result = await response.json()
+                            self._record_usage(task, result)
+                            return result['message']['content']
+                        logger.error(f"Ollama API error: {response.status}")
+        except asyncio.TimeoutError:
+            logger.error(f"Ollama structured request timed out ({task})")
+            metrics.increment("llm_timeouts", task=task)
+        except Exception as e:
+            logger.error(f"Error generating structured response: {e}")
+        return None
+
+    async def _structured_list(self, task: str, model, key: str, count: int,
+                               prompt: str, system_prompt: str) -> list:
+        """Generate `count` model instances, salvaging partial replies.
+
+        Complete replies count as "ok", usable partial ones as "salvaged". A
+        reply with nothing usable gets one shorter repair attempt ("repaired"
+        or "failed"). Returns [] when nothing usable came back, so callers
+        fall back to their static suggestions.
+        """
+        if not self.initialized:
+            metrics.increment("llm_structured_output", task=task, outcome="unavailable")
+            return []
+
+        schema = list_schema(model, key, count)
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        reply = await self._generate_json(messages, schema, task)
+        if reply is None:
+            metrics.increment("llm_structured_output", task=task, outcome="unavailable")
+            return []
+
+        items, complete = salvage_json_list(reply, key)
+        valid = validate_items(items, model)
+        if valid:
+            metrics.increment("llm_structured_output", task=task, outcome="ok" if complete else "salvaged")
+            return valid[:count]
+
+        # One bounded repair: show the model its reply and ask for just the JSON
+        messages += [
+            {"role": "assistant", "content": reply[:2000]},
+            {"role": "user", "content": f'That was not valid. Reply with only a JSON object of the form '
+                                        f'{{"{key}": [...]}} containing {count} items matching the schema.'}
+        ]
+        repaired = await self._generate_json(messages, schema, "repair")
+        valid = validate_items(salvage_json_list(repaired, key)[0], model) if repaired else []
+        metrics.increment("llm_structured_output", task=task, outcome="repaired" if valid else "failed")
+        if not valid:
+            logger.warning(f"Unparseable {task} reply after repair: {(repaired or reply)[:200]!r}")
+        return valid[:count]
+
     def _get_fallback_response(self, prompt: str) -> str:
         """Enhanced fallback responses"""
         prompt_lower = prompt.lower()
@@ -213,49 +309,97 @@ class AIService:
         else:
             return "I'm here to listen and support you. What's on your mind today?"
 
-    async def chat(self, user_id: str, message: str, context: UserContext = None) -> str:
-        """Generate conversational AI response"""
+    def _chat_context_note(self, context: UserContext = None, memories: Optional[List[str]] = None) -> str:
+        """Per-user part of the chat prompt, sent after the shared CHAT_SYSTEM_PROMPT"""
+        # Handle None context
+        if context is None:
+            context = UserContext()
         
-        try:
-            # Handle None context
-            if context is None:
-                context = UserContext()
-            
-            # Build context for the LLM
-            context_info = []
-            
-            if hasattr(context, 'recent_mood') and context.recent_mood:
-                mood_value = getattr(context.recent_mood, 'value', str(context.recent_mood))
-                context_info.append(f"Recent mood: {mood_value}")
-            
-            if hasattr(context, 'common_emotions') and context.common_emotions:
-                context_info.append(f"Common emotions: {', '.join(context.common_emotions)}")
-            
-            if hasattr(context, 'eating_patterns') and context.eating_patterns:
-                context_info.append(f"Eating patterns: {', '.join(context.eating_patterns)}")
-            
-            context_str = " | ".join(context_info) if context_info else "No previous context available"
-            
-            system_prompt = f"""You are a compassionate AI assistant specializing in mental health support and mindful eating. You provide empathetic, non-judgmental responses that help users process their emotions and develop healthier relationships with food and themselves.
-
-Key principles:
-- Always be empathetic and validating
-- Never provide medical or therapeutic advice
-- Focus on mindfulness, self-awareness, and gentle guidance  
-- Encourage professional help when appropriate
-- Use a warm, conversational tone
-- Keep responses concise but meaningful (2-3 paragraphs max)
-
-User context: {context_str}
+        # Build context for the LLM
+        context_info = []
+        
+        if hasattr(context, 'recent_mood') and context.recent_mood:
+            mood_value = getattr(context.recent_mood, 'value', str(context.recent_mood))
+            context_info.append(f"Recent mood: {mood_value}")
+        
+        if hasattr(context, 'common_emotions') and context.common_emotions:
+            context_info.append(f"Common emotions: {', '.join(context.common_emotions)}")
+        
+        if hasattr(context, 'eating_patterns') and context.eating_patterns:
+            context_info.append(f"Eating patterns: {', '.join(context.eating_patterns)}")
+        
+        context_str = " | ".join(context_info) if context_info else "No previous context available"
+        
+        note = f"User context: {context_str}"
+        if memories:
+            # Past journal entries and chats recalled by embedding search
+            recalled = "\n".join(f"- {memory[:500]}" for memory in memories)
+            note += f"\nRelated things the user shared before:\n{recalled}"
+        return note
 
-Respond to the user's message with care and understanding."""
+    def _chat_messages(self, message: str, context: UserContext = None,
+                       memories: Optional[List[str]] = None) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": CHAT_SYSTEM_PROMPT},
+            {"role": "system", "content": self._chat_context_note(context, memories)},
+            {"role": "user", "content": message.strip()}
+        ]
 
-            return await self._generate_response(message, system_prompt)
+    async def chat(self, user_id: str, message: str, context: UserContext = None,
+                   memories: Optional[List[str]] = None) -> str:
+        """Generate conversational AI response"""
+        
+        try:
+            return await self._generate_response(message, CHAT_SYSTEM_PROMPT,
+                                                 context_note=self._chat_context_note(context, memories))
         
         except Exception as e:
             logger.error(f"Error in chat method: {e}")
             return "I'm here to support you. Please tell me more about what's on your mind today."
 
+    async def chat_stream(self, user_id: str, message: str, context: UserContext = None,
+                          memories: Optional[List[str]] = None):
+        """Stream a conversational response token by token"""
+        if not self.initialized:
+            async for token in generate_stream(self._get_fallback_response(message)):
+                yield token
+            return
+        
+        data = self._request("chat", self._chat_messages(message, context, memories), stream=True)
+        
+        produced = False
+        start = asyncio.get_running_loop().time()
+        try:
+            timeout = aiohttp.ClientTimeout(total=2 * self.router.timeout("chat"), sock_read=15)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.post(f"{self.ollama_url}/api/chat", json=data) as response:
+                    if response.status != 200:
+                        logger.error(f"Ollama API error: {response.status}")
+                    else:
+                        # Ollama streams one JSON object per line
+                        async for line in response.content:
+                            if not line.strip():
+                                continue
+                            chunk = json.loads(line)
+                            token = chunk.get('message', {}).get('content', '')
+                            if token:
+                                if not produced:
+                                    metrics.observe("llm_first_token", asyncio.get_running_loop().time() - start,
+                                                    task="chat_stream", model=data["model"])
+                                produced = True
+                                yield token
+                            if chunk.get('done'):
+                                self._record_usage("chat_stream", chunk)
+                                break
+            metrics.observe("llm_latency", asyncio.get_running_loop().time() - start,
+                            task="chat_stream", model=data["model"])
+        except Exception as e:
+            logger.error(f"Error streaming response: {e}")
+        
+        if not produced:
+            async for token in generate_stream(self._get_fallback_response(message)):
+                yield token
+
     async def generate_daily_insights(self, user_id: str, checkin_id: str) -> str:
         """Generate insights based on daily check-in data"""
         
@@ -267,7 +411,7 @@ Respond to the user's message with care and understanding."""
         
         prompt = "Generate an encouraging insight for someone who just completed their daily check-in."
         
-        return await self._generate_response(prompt, system_prompt)
+        return await self._generate_response(prompt, system_prompt, task="insight")
 
     async def generate_journal_reflection(self, content: str) -> str:
         """Generate AI reflection on journal entry"""
@@ -282,18 +426,21 @@ Respond to the user's message with care and understanding."""
         
         prompt = f"Please provide a gentle, validating reflection on this journal entry: {content}"
         
-        return await self._generate_response(prompt, system_prompt)
+        return await self._generate_response(prompt, system_prompt, task="reflection")
 
-    async def get_meal_suggestions(self, user_id: str, mood: Optional[str] = None, energy_level: Optional[int] = None) -> List[MealSuggestion]:
-        """Get personalized meal suggestions"""
+    async def get_meal_suggestions(self, user_id: str, mood: Optional[str] = None, energy_level: Optional[int] = None,
+                                   favorite_foods: Optional[List[str]] = None) -> List[MealSuggestion]:
+        """Get personalized meal suggestions; favorite_foods are foods that lifted the user's mood before"""
         
         mood_energy_context = ""
         if mood:
             mood_energy_context += f"Current mood: {mood}. "
         if energy_level:
             mood_energy_context += f"Energy level: {energy_level}/5. "
+        if favorite_foods:
+            mood_energy_context += f"Foods that have lifted their mood before: {', '.join(favorite_foods)}. "
         
-        system_prompt = f"""You are a mindful eating coach. Suggest 2 specific, simple meals that would be nourishing for someone with: {mood_energy_context}
+        system_prompt = """You are a mindful eating coach. Suggest 2 specific, simple meals that would be nourishing for the person described.
 
 Focus on:
 - Meals that support emotional and physical wellbeing
@@ -301,38 +448,12 @@ Focus on:
 - How the meal might help their current state
 - Practical, accessible options
 
-Format your response as JSON with this structure:
-[
-  {{
-    "name": "Meal Name",
-    "description": "Brief description",
-    "ingredients": ["ingredient1", "ingredient2", "ingredient3"],
-    "mood_benefit": "How this helps their current state", 
-    "prep_time": 15,
-    "difficulty": "easy"
-  }}
-]"""
-        
-        prompt = "Suggest 2 nourishing meals for this person's current state."
+Each meal has a name, a brief description, a short list of ingredients, how it helps their current state (mood_benefit), prep_time in minutes and difficulty ("easy", "medium" or "hard")."""
         
-        response = await self._generate_response(prompt, system_prompt)
+        prompt = f"Suggest 2 nourishing meals for someone with: {mood_energy_context or 'no details shared'}"
         
-        try:
-            meals_data = json.loads(response)
-            suggestions = []
-            for meal in meals_data:
-                suggestions.append(MealSuggestion(
-                    name=meal.get('name', 'Nourishing Meal'),
-                    description=meal.get('description', ''),
-                    ingredients=meal.get('ingredients', []),
-                    mood_benefit=meal.get('mood_benefit', ''),
-                    prep_time=meal.get('prep_time', 10),
-                    difficulty=meal.get('difficulty', 'easy')
-                ))
-            return suggestions
-        except:
-            # Fallback to simple suggestions if JSON parsing fails
-            return await self._get_fallback_meal_suggestions(mood, energy_level)
+        suggestions = await self._structured_list("meals", MealSuggestion, "meals", 2, prompt, system_prompt)
+        return suggestions or await self._get_fallback_meal_suggestions(mood, energy_level)
 
     async def _get_fallback_meal_suggestions(self, mood: Optional[str], energy_level: Optional[int]) -> List[MealSuggestion]:
         """Fallback meal suggestions if LLM response can't be parsed"""
@@ -361,7 +482,7 @@ Format your response as JSON with this structure:
         
         mood_context = f"Current mood: {current_mood}" if current_mood else "General wellbeing"
         
-        system_prompt = f"""You are a mindfulness instructor. Suggest 2 specific mindfulness practices for someone with: {mood_context}
+        system_prompt = """You are a mindfulness instructor. Suggest 2 specific mindfulness practices for the person described.
 
 Focus on:
 - Practices appropriate for their current emotional state
@@ -369,38 +490,12 @@ Focus on:
 - Realistic time commitments
 - Specific benefits
 
-Format as JSON:
-[
-  {{
-    "name": "Practice Name",
-    "description": "What this practice involves",
-    "duration": 5,
-    "difficulty": "easy",
-    "benefits": ["benefit1", "benefit2"],
-    "instructions": ["step1", "step2", "step3"]
-  }}
-]"""
-        
-        prompt = "Suggest 2 appropriate mindfulness practices for this person."
+Each practice has a name, a description, duration in minutes, difficulty ("easy", "medium" or "hard"), a list of benefits and step-by-step instructions."""
         
-        response = await self._generate_response(prompt, system_prompt)
+        prompt = f"Suggest 2 appropriate mindfulness practices for someone with: {mood_context}"
         
-        try:
-            practices_data = json.loads(response)
-            practices = []
-            for practice in practices_data:
-                practices.append(MindfulPractice(
-                    name=practice.get('name', 'Mindful Practice'),
-                    description=practice.get('description', ''),
-                    duration=practice.get('duration', 5),
-                    difficulty=practice.get('difficulty', 'easy'),
-                    benefits=practice.get('benefits', []),
-                    instructions=practice.get('instructions', [])
-                ))
-            return practices
-        except:
-            # Fallback practices
-            return await self._get_fallback_practices(current_mood)
+        practices = await self._structured_list("practices", MindfulPractice, "practices", 2, prompt, system_prompt)
+        return practices or await self._get_fallback_practices(current_mood)
 
     async def _get_fallback_practices(self, current_mood: Optional[str]) -> List[MindfulPractice]:
         """Fallback mindfulness practices"""
@@ -433,8 +528,12 @@ Format as JSON:
         ]
         return practices
 
-    async def generate_weekly_summary(self, user_id: str) -> str:
-        """Generate weekly summary insights"""
+    async def generate_weekly_summary(self, user_id: str, summary: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Generate weekly summary insights, grounded in the week's numbers when given.
+
+        Returns None when the model is unavailable: the narrative is stored,
+        so a canned chat reply must never stand in for it.
+        """
         
         system_prompt = """Generate an encouraging weekly summary for someone who has been tracking their mental health and eating habits. Focus on:
 - Acknowledging their commitment to self-care
@@ -443,5 +542,13 @@ Format as JSON:
 - Keep it warm and supportive (2-3 sentences)"""
         
         prompt = "Create a positive weekly summary for someone committed to their wellbeing journey."
+        if summary:
+            prompt += f"""
+
+Their week ({summary['week_start']} to {summary['week_end']}):
+- Average mood: {summary['avg_mood']}/5, trend: {summary['mood_trend']}
+- Most frequent moods: {', '.join(summary['top_emotions']) or 'none recorded'}
+- Mindful eating score: {summary['mindful_eating_score']}/10
+- Observations: {' '.join(summary['key_insights'])}"""
         
-        return await self._generate_response(prompt, system_prompt)
\ No newline at end of file
+        return await self._generate_response(prompt, system_prompt, task="weekly_summary", fallback=False)
\ No newline at end of file
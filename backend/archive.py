@@ -0,0 +1,226 @@
+# backend/archive.py - Move old conversations and insights out of the hot database
+#
+# Rows older than the retention age are compressed (zlib'd JSON) into a
+# separate SQLite file and deleted from the hot tables, which keeps the main
+# database and its indexes small enough to stay in page cache. Archived rows
+# stay readable through ConversationArchive for history and search.
+#
+# Usage:
+#   python archive.py --days 180            # archive rows older than 180 days
+#   python archive.py --days 180 --vacuum   # also reclaim freed pages incrementally
+import argparse
+import asyncio
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import aiosqlite
+
+from db_connection import connect
+from textcodec import decode_row
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("MINDMATE_ARCHIVE_AFTER_DAYS", "180"))
+
+# hot table -> archive table
+ARCHIVED_TABLES = {
+    "conversations": "archived_conversations",
+    "insights": "archived_insights",
+}
+# Archived tables whose rows may have a vector in embeddings.py's store
+EMBEDDED_TABLES = {"conversations"}
+
+
+def archive_path_for(db_path: str) -> str:
+    root, ext = os.path.splitext(db_path)
+    return f"{root}_archive{ext or '.db'}"
+
+
+def _pack(row: Dict[str, Any]) -> bytes:
+    return zlib.compress(json.dumps(row, separators=(",", ":")).encode(), 9)
+
+
+def _unpack(payload: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(payload))
+
+
+class ConversationArchive:
+    def __init__(self, archive_path: str):
+        self.archive_path = archive_path
+
+    @staticmethod
+    async def _create_tables(db, schema: str = "main"):
+        for table in ARCHIVED_TABLES.values():
+            await db.execute(f"""
+                CREATE TABLE IF NOT EXISTS {schema}.{table} (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    payload BLOB NOT NULL
+                )
+            """)
+            await db.execute(
+                f"CREATE INDEX IF NOT EXISTS {schema}.idx_{table}_user_date ON {table}(user_id, created_at)")
+
+    async def _read(self, table: str, user_id: str, limit: int, before: Optional[str]) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.archive_path):
+            return []
+        async with connect(self.archive_path) as db:
+            await self._create_tables(db)
+            async with db.execute(f"""
+                SELECT payload FROM {table}
+                WHERE user_id = ? AND created_at < ?
+                ORDER BY created_at DESC LIMIT ?
+            """, (user_id, before or "9999", limit)) as cursor:
+                return [_unpack(row[0]) for row in await cursor.fetchall()]
+
+    async def get_conversations(self, user_id: str, limit: int = 50, before: Optional[str] = None):
+        return await self._read("archived_conversations", user_id, limit, before)
+
+    async def get_insights(self, user_id: str, limit: int = 50, before: Optional[str] = None):
+        return await self._read("archived_insights", user_id, limit, before)
+
+    async def search_conversations(self, user_id: str, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Case-insensitive substring search; decompresses only this user's rows"""
+        if not os.path.exists(self.archive_path):
+            return []
+        needle = query.lower()
+        matches = []
+        async with connect(self.archive_path) as db:
+            await self._create_tables(db)
+            async with db.execute("""
+                SELECT payload FROM archived_conversations
+                WHERE user_id = ? ORDER BY created_at DESC
+            """, (user_id,)) as cursor:
+                async for (payload,) in cursor:
+                    row = _unpack(payload)
+                    if needle in row["user_message"].lower() or needle in row["ai_response"].lower():
+                        matches.append(row)
+                        if len(matches) >= limit:
+                            break
+        return matches
+
+
+async def _next_user(db, table: str, after: str) -> Optional[str]:
+    """Smallest user_id in table after `after`; one seek on the (user_id, created_at) index"""
+    async with db.execute(
+        f"SELECT user_id FROM main.{table} WHERE user_id > ? ORDER BY user_id LIMIT 1", (after,)
+    ) as cursor:
+        row = await cursor.fetchone()
+    return row[0] if row else None
+
+
+async def archive_old_rows(db_path: str, days: int = ARCHIVE_AFTER_DAYS, batch_size: int = 1000,
+                           archive_path: Optional[str] = None) -> Dict[str, int]:
+    """Move rows older than `days` into the archive file in small batches.
+
+    Rows are read user by user through the (user_id, created_at) index, so
+    each batch is a few index seeks rather than a scan and sort of the hot
+    table. SQLite only commits each file atomically in WAL mode, not a
+    transaction spanning attached files, so every batch is first committed
+    to the archive and then deleted from the hot table in a second
+    transaction. An interruption in between leaves rows in both places;
+    re-running skips them in the archive (INSERT OR IGNORE) and finishes
+    the delete. Deleting a synced row (conversations) records a "delete"
+    change, so /api/sync clients drop their copy; it stays readable through
+    include_archived. Its embedding mapping goes too, so semantic search no
+    longer ranks it (the vector itself stays in the append-only file).
+    """
+    # database.py imports this module
+    from database import SYNC_TABLES, DatabaseManager
+
+    archive_path = archive_path or archive_path_for(db_path)
+    cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
+    moved = {table: 0 for table in ARCHIVED_TABLES}
+
+    async with connect(db_path) as db:
+        db.row_factory = aiosqlite.Row
+        await db.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+        await ConversationArchive._create_tables(db, "archive")
+        await db.commit()
+
+        for table, archive_table in ARCHIVED_TABLES.items():
+            user_id = await _next_user(db, table, "")
+            while user_id is not None:
+                rows = []
+                while user_id is not None and len(rows) < batch_size:
+                    wanted = batch_size - len(rows)
+                    async with db.execute(f"""
+                        SELECT * FROM main.{table} WHERE user_id = ? AND created_at < ?
+                        ORDER BY created_at LIMIT ?
+                    """, (user_id, cutoff, wanted)) as cursor:
+                        fetched = [decode_row(table, dict(row)) for row in await cursor.fetchall()]
+                    rows += fetched
+                    if len(fetched) < wanted:
+                        # This user has nothing older left; the next batch starts with them otherwise
+                        user_id = await _next_user(db, table, user_id)
+                if not rows:
+                    break
+                await db.executemany(f"""
+                    INSERT OR IGNORE INTO archive.{archive_table} (id, user_id, created_at, payload)
+                    VALUES (?, ?, ?, ?)
+                """, [(row["id"], row["user_id"], row["created_at"], _pack(row)) for row in rows])
+                await db.commit()
+                await db.executemany(f"DELETE FROM main.{table} WHERE id = ?", [(row["id"],) for row in rows])
+                if table in SYNC_TABLES:
+                    await DatabaseManager._record_changes(
+                        db, [(row["user_id"], table, row["id"], "delete") for row in rows])
+                if table in EMBEDDED_TABLES:
+                    await db.executemany(
+                        "DELETE FROM main.embeddings WHERE source_table = ? AND source_id = ?",
+                        [(table, row["id"]) for row in rows])
+                await db.commit()
+                moved[table] += len(rows)
+
+        await db.execute("DETACH DATABASE archive")
+
+    return moved
+
+
+async def incremental_vacuum(db_path: str, pages: int = 2000, enable: bool = False) -> bool:
+    """Return up to `pages` free pages to the filesystem.
+
+    Incremental vacuum needs auto_vacuum=INCREMENTAL, which an existing file
+    only picks up after one full VACUUM; pass enable=True to do that once.
+    Returns False when incremental vacuum is not enabled.
+    """
+    async with connect(db_path) as db:
+        async with db.execute("PRAGMA auto_vacuum") as cursor:
+            (mode,) = await cursor.fetchone()
+        if mode != 2:
+            if not enable:
+                return False
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await db.execute("VACUUM")
+        await db.execute(f"PRAGMA incremental_vacuum({int(pages)})")
+        await db.commit()
+    return True
+
+
+async def run_archive_job(db_path: str, days: int = ARCHIVE_AFTER_DAYS, vacuum_pages: int = 2000):
+    moved = await archive_old_rows(db_path, days)
+    vacuumed = await incremental_vacuum(db_path, vacuum_pages)
+    print(f"Archived {moved} (incremental vacuum {'ran' if vacuumed else 'not enabled'})")
+    return moved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive old conversations and insights")
+    parser.add_argument("--db", default="mindmate.db")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--vacuum", action="store_true",
+                        help="enable incremental auto-vacuum (one full VACUUM the first time) and reclaim space")
+    parser.add_argument("--vacuum-pages", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    moved = asyncio.run(archive_old_rows(args.db, args.days, args.batch_size))
+    print(f"Archived rows: {moved}")
+    if args.vacuum:
+        asyncio.run(incremental_vacuum(args.db, args.vacuum_pages, enable=True))
+        print("Incremental vacuum complete")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# backend/bench_compression.py - Size and latency of compressed text columns
+#
+# Usage:
+#   python bench_compression.py                 # 2000 synthetic journal entries / AI responses
+#   python bench_compression.py --rows 10000
+#   python bench_compression.py --db mindmate.db  # values sampled from a real database
+#
+# Compares raw TEXT, plain zlib and zlib primed with the shared dictionary
+# from textcodec.py: total stored bytes, encode/decode time per value, and
+# the size of a SQLite file holding the same rows in each form.
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import zlib
+
+from textcodec import CURRENT_DICTIONARY, DICTIONARIES, MAGIC, compress_text, decompress_text
+from train_dictionary import sample_values
+
+SENTENCES = [
+    "Today felt really heavy and I was tired after work.",
+    "I went for a walk in the evening and felt a little calmer.",
+    "I have been anxious about my exams this week.",
+    "Dinner with friends helped me feel less lonely.",
+    "I feel grateful for my family even when things are hard.",
+    "It's completely understandable to feel this way. Your feelings are valid.",
+    "Take a moment to notice how your body feels. Try a few slow, deep breaths.",
+    "Remember that small steps still count as progress.",
+    "What do you think might help you feel a little better right now?",
+    "Consider reaching out to someone you trust. Be gentle with yourself.",
+]
+
+
+def synthetic_texts(rows: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(SENTENCES) for _ in range(rng.randint(2, 12))) for _ in range(rows)]
+
+
+def _zlib_plain(value: str) -> bytes:
+    compressor = zlib.compressobj(level=6, wbits=-15)
+    return MAGIC + compressor.compress(value.encode()) + compressor.flush()
+
+
+def _timed(fn, values):
+    timings = []
+    results = []
+    for value in values:
+        start = time.perf_counter()
+        results.append(fn(value))
+        timings.append((time.perf_counter() - start) * 1e6)
+    return results, statistics.median(timings)
+
+
+def _file_size(values) -> int:
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, body)")
+            conn.executemany("INSERT INTO t (body) VALUES (?)", [(v,) for v in values])
+        conn.close()
+        return os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+
+def run(rows: int, db_path: str = None):
+    texts = sample_values(db_path, rows) if db_path else synthetic_texts(rows)
+    rows = len(texts)
+    raw_bytes = sum(len(t.encode()) for t in texts)
+
+    plain, plain_us = _timed(_zlib_plain, texts)
+    primed, primed_us = _timed(compress_text, texts)
+    decoded, decode_us = _timed(decompress_text, primed)
+    assert decoded == texts, "round trip failed"
+
+    def size(values):
+        return sum(len(v) if isinstance(v, bytes) else len(v.encode()) for v in values)
+
+    print(f"{rows} values, dictionary {CURRENT_DICTIONARY} ({len(DICTIONARIES[CURRENT_DICTIONARY])} bytes)")
+    print(f"{'form':<18}{'bytes':>12}{'ratio':>8}{'db file':>12}{'encode us':>11}")
+    print(f"{'raw text':<18}{raw_bytes:>12}{1.0:>8.2f}{_file_size(texts):>12}{'-':>11}")
+    for label, values, encode_us in (("zlib", plain, plain_us), ("zlib + dictionary", primed, primed_us)):
+        stored = size(values)
+        print(f"{label:<18}{stored:>12}{raw_bytes / stored:>8.2f}{_file_size(values):>12}{encode_us:>11.1f}")
+    print(f"decode (dictionary): {decode_us:.1f} us median per value")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compressed text column storage")
+    parser.add_argument("--rows", type=int, default=2000, help="values (per column with --db)")
+    parser.add_argument("--db", help="sample the compressed columns of this database instead")
+    args = parser.parse_args()
+    run(args.rows, args.db)
+
+
+if __name__ == "__main__":
+    main()
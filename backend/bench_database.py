@@ -0,0 +1,326 @@
+# backend/bench_database.py - Synthetic data generator and DatabaseManager microbenchmarks
+#
+# Usage:
+#   python bench_database.py                      # run at the default sizes, compare to baseline
+#   python bench_database.py --sizes 200 2000     # number of users per run (rows scale with users)
+#   python bench_database.py --sizes 10000        # about 8.5 million rows
+#   python bench_database.py --update-baseline    # store the current timings as the new baseline
+#
+# Each user gets about 850 rows, so the default sizes (100 and 1000 users)
+# seed about 85k and 850k rows and run in a minute or two. Each size gets its
+# own scratch database under --workdir, seeded once and reused on later runs.
+#
+# Timings only compare on the same machine: the baseline records the
+# hardware, Python and SQLite versions and benchmark parameters it was
+# measured with, and comparisons against a baseline from a different
+# environment are skipped. Otherwise the process exits with status 1 when
+# any benchmark's p95 latency is worse than the baseline by more than
+# --tolerance.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from database import DatabaseManager
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+# Rows generated per user, roughly 90 days of an active user
+DAYS_OF_HISTORY = 90
+CHECKINS_PER_DAY = 2
+FOOD_LOGS_PER_DAY = 3
+CONVERSATIONS_PER_DAY = 4
+JOURNAL_ENTRIES_PER_WEEK = 3
+
+MOODS = ["very_low", "low", "neutral", "good", "excellent"]
+MEALS = ["breakfast", "lunch", "dinner", "snack"]
+FOODS = ["oatmeal", "salad", "pasta", "rice bowl", "smoothie", "sandwich", "soup", "apple", "yogurt", "curry"]
+WORDS = ("today felt calm busy tired hopeful anxious grateful slow bright heavy light walked "
+         "talked slept worked cooked rested breathed noticed").split()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, sentences: int) -> str:
+    return " ".join(_sentence(rng, rng.randint(6, 14)) for _ in range(sentences))
+
+
+def seed_database(db_path: str, users: int, seed: int = 42, batch_size: int = 20000) -> dict:
+    """Populate db_path with `users` synthetic users and their history.
+
+    Uses plain sqlite3 with executemany so large sizes (10,000 users is about
+    8.5 million rows) can be written in a reasonable time. Returns the number of rows written per table.
+    """
+    asyncio.run(DatabaseManager(db_path).init_db())
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    counts = {"users": 0, "checkins": 0, "food_logs": 0, "conversations": 0, "journal_entries": 0}
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    pending = {name: [] for name in counts}
+    statements = {
+        "users": """INSERT INTO users (id, name, email, password, age, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        "checkins": """INSERT INTO checkins (id, user_id, checkin_type, mood, energy_level, stress_level,
+                                             sleep_hours, exercise_minutes, notes, gratitude, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        "food_logs": """INSERT INTO food_logs (id, user_id, food_name, meal_type, portion_size, calories,
+                                               mood_before, mood_after, notes, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        "conversations": """INSERT INTO conversations (id, user_id, user_message, ai_response, created_at)
+                            VALUES (?, ?, ?, ?, ?)""",
+        "journal_entries": """INSERT INTO journal_entries (id, user_id, title, content, mood, tags, is_private,
+                                                           ai_reflection, created_at, updated_at)
+                              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+    }
+
+    def flush(table: str, force: bool = False):
+        rows = pending[table]
+        if rows and (force or len(rows) >= batch_size):
+            conn.executemany(statements[table], rows)
+            counts[table] += len(rows)
+            rows.clear()
+
+    def stamp(day: int) -> str:
+        moment = now - timedelta(days=day, seconds=rng.randint(0, 86399))
+        return moment.isoformat()
+
+    for index in range(users):
+        user_id = str(uuid.uuid4())
+        created = (now - timedelta(days=DAYS_OF_HISTORY)).isoformat()
+        pending["users"].append((user_id, f"Bench User {index}", f"bench{index}@example.com",
+                                 "not-a-real-hash", rng.randint(18, 70), created, created))
+
+        for day in range(DAYS_OF_HISTORY):
+            for slot in range(CHECKINS_PER_DAY):
+                pending["checkins"].append((
+                    str(uuid.uuid4()), user_id, "morning" if slot == 0 else "evening",
+                    rng.choice(MOODS), rng.randint(1, 5), rng.randint(1, 10),
+                    round(rng.uniform(4, 10), 1), rng.randint(0, 90),
+                    _sentence(rng, 8), _sentence(rng, 5), stamp(day)
+                ))
+            for _ in range(FOOD_LOGS_PER_DAY):
+                pending["food_logs"].append((
+                    str(uuid.uuid4()), user_id, rng.choice(FOODS), rng.choice(MEALS), "medium",
+                    rng.randint(100, 900), rng.randint(1, 10), rng.randint(1, 10),
+                    _sentence(rng, 6), stamp(day)
+                ))
+            for _ in range(CONVERSATIONS_PER_DAY):
+                pending["conversations"].append((
+                    str(uuid.uuid4()), user_id, _sentence(rng, 12), _paragraph(rng, 4), stamp(day)
+                ))
+            if rng.random() < JOURNAL_ENTRIES_PER_WEEK / 7:
+                created_at = stamp(day)
+                pending["journal_entries"].append((
+                    str(uuid.uuid4()), user_id, _sentence(rng, 4), _paragraph(rng, 12),
+                    rng.choice(MOODS), json.dumps(["bench"]), 1, _paragraph(rng, 2),
+                    created_at, created_at
+                ))
+
+        for table in pending:
+            flush(table)
+
+    for table in pending:
+        flush(table, force=True)
+
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    return counts
+
+
+def _sample_user_ids(db_path: str, count: int, seed: int = 7) -> list:
+    conn = sqlite3.connect(db_path)
+    ids = [row[0] for row in conn.execute("SELECT id FROM users")]
+    conn.close()
+    rng = random.Random(seed)
+    return rng.sample(ids, min(count, len(ids)))
+
+
+def _benchmark_cases(db: DatabaseManager) -> dict:
+    """Benchmark name -> coroutine factory taking a user_id.
+
+    Page depths cover the first page and progressively deeper OFFSETs, which
+    is where LIMIT/OFFSET pagination degrades.
+    """
+    cases = {}
+    for offset in (0, 100, 1000):
+        cases[f"get_user_checkins[offset={offset}]"] = (
+            lambda user_id, offset=offset: db.get_user_checkins(user_id, limit=10, offset=offset))
+        cases[f"get_user_journal_entries[offset={offset}]"] = (
+            lambda user_id, offset=offset: db.get_user_journal_entries(user_id, limit=20, offset=offset))
+    for limit in (10, 50, 200):
+        cases[f"get_conversation_history[limit={limit}]"] = (
+            lambda user_id, limit=limit: db.get_conversation_history(user_id, limit=limit))
+    for days in (7, 30, 90):
+        cases[f"get_mood_trends[days={days}]"] = (
+            lambda user_id, days=days: db.get_mood_trends(user_id, days=days))
+    return cases
+
+
+async def _time_case(factory, user_ids: list, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        for user_id in user_ids:
+            started = time.perf_counter()
+            await factory(user_id)
+            samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def _percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_benchmarks(db_path: str, users_sampled: int = 20, repeat: int = 3) -> dict:
+    db = DatabaseManager(db_path)
+    user_ids = _sample_user_ids(db_path, users_sampled)
+    results = {}
+    for name, factory in _benchmark_cases(db).items():
+        # Warm the page cache so we measure query cost rather than first-read I/O
+        await factory(user_ids[0])
+        samples = await _time_case(factory, user_ids, repeat)
+        results[name] = {
+            "p50_ms": round(statistics.median(samples), 3),
+            "p95_ms": round(_percentile(samples, 95), 3),
+            "samples": len(samples),
+        }
+    return results
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def environment(repeat: int, sample_users: int) -> dict:
+    """What the timings depend on besides the code: stored with, and compared against, the baseline"""
+    return {
+        "cpu": _cpu_model(),
+        "cpu_count": os.cpu_count(),
+        "platform": f"{platform.system()} {platform.machine()}",
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "repeat": repeat,
+        "sample_users": sample_users,
+    }
+
+
+def load_baseline(path: str = BASELINE_FILE) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results: dict, path: str = BASELINE_FILE):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float, floor_ms: float) -> list:
+    """Return (size, benchmark, baseline_p95, current_p95) for every regression.
+
+    floor_ms ignores sub-millisecond noise: a query has to be slower than the
+    floor as well as slower than baseline * (1 + tolerance) to count.
+    """
+    regressions = []
+    for size, cases in results.items():
+        if size == "environment":
+            continue
+        for name, stats in cases.items():
+            previous = baseline.get(size, {}).get(name)
+            if not previous:
+                continue
+            limit = max(previous["p95_ms"] * (1 + tolerance), floor_ms)
+            if stats["p95_ms"] > limit:
+                regressions.append((size, name, previous["p95_ms"], stats["p95_ms"]))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark DatabaseManager read paths on synthetic data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000],
+                        help="user counts to benchmark (each user has ~%d rows)" % (
+                            DAYS_OF_HISTORY * (CHECKINS_PER_DAY + FOOD_LOGS_PER_DAY + CONVERSATIONS_PER_DAY)
+                            + DAYS_OF_HISTORY * JOURNAL_ENTRIES_PER_WEEK // 7))
+    parser.add_argument("--workdir", default="bench_data", help="directory for scratch databases")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sample-users", type=int, default=20)
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="allowed fractional p95 slowdown before failing (0.5 = 50%%)")
+    parser.add_argument("--floor-ms", type=float, default=1.0)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--reseed", action="store_true", help="rebuild scratch databases")
+    args = parser.parse_args(argv)
+    current = environment(args.repeat, args.sample_users)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = {}
+    for users in args.sizes:
+        db_path = os.path.join(args.workdir, f"bench_{users}_users.db")
+        if args.reseed and os.path.exists(db_path):
+            os.remove(db_path)
+        if not os.path.exists(db_path):
+            started = time.perf_counter()
+            counts = seed_database(db_path, users)
+            print(f"Seeded {db_path}: {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s")
+
+        size_key = f"{users}_users"
+        results[size_key] = asyncio.run(run_benchmarks(db_path, args.sample_users, args.repeat))
+        print(f"\n{size_key}")
+        for name, stats in results[size_key].items():
+            print(f"  {name:45s} p50 {stats['p50_ms']:8.3f} ms   p95 {stats['p95_ms']:8.3f} ms")
+
+    baseline = load_baseline(args.baseline)
+    if args.update_baseline:
+        # Timings from another environment are not kept alongside these
+        if baseline.get("environment") != current:
+            baseline = {}
+        baseline.update(results, environment=current)
+        save_baseline(baseline, args.baseline)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if baseline.get("environment") != current:
+        print(f"\nBaseline was measured in a different environment, not comparing:\n"
+              f"  baseline: {baseline.get('environment')}\n  current:  {current}\n"
+              f"Run with --update-baseline on this machine first.")
+        return 0
+    regressions = find_regressions(results, baseline, args.tolerance, args.floor_ms)
+    if regressions:
+        print("\nLatency regressions:")
+        for size, name, before, after in regressions:
+            print(f"  {size} {name}: p95 {before:.3f} ms -> {after:.3f} ms")
+        return 1
+    print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+# backend/bench_ids.py - Insert throughput and index size by primary key scheme
+#
+# Usage:
+#   python bench_ids.py                  # 200k conversation rows per scheme
+#   python bench_ids.py --rows 1000000
+#
+# Inserts the same conversation rows, 1000 per transaction, into scratch
+# databases shaped like production (rowid table, id PRIMARY KEY, the
+# (user_id, created_at) index) keyed by random UUID4 text, UUIDv7 text
+# (ids.new_id) and UUIDv7 as a 16-byte BLOB, and reports insert rate and
+# database size.
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from ids import new_id
+
+SCHEMES = {
+    "uuid4 text": lambda: str(uuid.uuid4()),
+    "uuid7 text": new_id,
+    "uuid7 blob": lambda: uuid.UUID(new_id()).bytes,
+}
+
+
+def run_scheme(make_id, rows: int, users, batch: int = 1000):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE conversations (
+                id PRIMARY KEY, user_id TEXT NOT NULL, user_message TEXT NOT NULL,
+                ai_response TEXT NOT NULL, created_at TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX idx_conversations_user_date ON conversations(user_id, created_at)")
+        rng = random.Random(3)
+        start = time.perf_counter()
+        for offset in range(0, rows, batch):
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO conversations VALUES (?, ?, ?, ?, ?)",
+                [(make_id(), rng.choice(users), "How are you today?", "I'm here for you. " * 4,
+                  f"2026-01-01T00:{(offset + i) // 60000:02d}:{(offset + i) % 60000 / 1000:06.3f}")
+                 for i in range(min(batch, rows - offset))]
+            )
+            conn.execute("COMMIT")
+        elapsed = time.perf_counter() - start
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        conn.close()
+        return rows / elapsed, pages * page_size
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def run(rows: int):
+    users = [str(uuid.uuid4()) for _ in range(500)]
+    print(f"{rows} rows, 500 users")
+    print(f"{'key':<14}{'rows/s':>10}{'db bytes':>14}{'bytes/row':>11}")
+    for label, make_id in SCHEMES.items():
+        per_second, size = run_scheme(make_id, rows, users)
+        print(f"{label:<14}{per_second:>10.0f}{size:>14}{size / rows:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark primary key schemes")
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+    run(args.rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+# backend/bulk_import.py - Import a user's history from other trackers
+#
+# Reads CSV or NDJSON incrementally, validates records with the models.py
+# schemas a chunk at a time and writes each chunk with executemany in one
+# short transaction (the write lock is never held while waiting for input).
+# Imports skip AI insights and reflections; the user's food aggregates are
+# rebuilt once at the end instead of per row.
+#
+# NDJSON lines name their type: {"type": "checkin", "created_at": "...", ...}.
+# CSV files hold one type, given with --type / ?type=. An optional created_at
+# keeps the original timestamp, and an optional source_id (the record's id in
+# the other app) makes re-running the same import skip rows already imported.
+#
+# Usage:
+#   python bulk_import.py --email user@example.com --type checkin history.csv
+#   python bulk_import.py --user-id <id> export.ndjson
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from database import BATCH_TABLES, DatabaseManager
+from db_connection import connect
+from ids import new_id
+from models import CheckinCreate, FoodLogCreate, JournalCreate
+
+IMPORT_MODELS = {
+    "checkin": CheckinCreate,
+    "food_log": FoodLogCreate,
+    "journal": JournalCreate,
+}
+
+CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+# Namespace for ids derived from source_id, so re-imports map onto the same rows
+IMPORT_NAMESPACE = uuid.UUID("8f0c5d8e-4c1b-4a57-9b7e-2f7a1d9c3e61")
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a byte stream into lines (without line endings)"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def _quoted_after(line: str, in_quotes: bool) -> bool:
+    """Whether a CSV record is still inside a quoted field at the end of line.
+
+    Follows the csv module's default dialect: a quote opens a field only at
+    the start of the field, and "" inside a quoted field is a literal quote.
+    """
+    if not in_quotes and '"' not in line:
+        return False
+    field_start = not in_quotes
+    position = 0
+    while position < len(line):
+        char = line[position]
+        if in_quotes:
+            if char == '"':
+                if line[position + 1:position + 2] == '"':
+                    position += 1
+                else:
+                    in_quotes = False
+        elif char == '"' and field_start:
+            in_quotes = True
+        field_start = not in_quotes and char == ","
+        position += 1
+    return in_quotes
+
+
+async def _csv_records(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, List[str], Optional[str]]]:
+    """(first line number, lines, error) for each CSV record.
+
+    Lines are awaited until the record's quoted fields close, however many
+    lines that takes, so a record is never parsed from partial input. A
+    record larger than csv.field_size_limit() or cut off by the end of the
+    input is reported as an error instead.
+    """
+    record: List[str] = []
+    start = line_no = size = 0
+    in_quotes = False
+    async for line in lines:
+        line_no += 1
+        if not record:
+            start, size = line_no, 0
+        record.append(line + "\n")
+        size += len(line) + 1
+        in_quotes = _quoted_after(line, in_quotes)
+        if not in_quotes:
+            yield start, record, None
+        elif size > csv.field_size_limit():
+            yield start, record, "field larger than field limit"
+            in_quotes = False
+        else:
+            continue
+        record = []
+    if record:
+        yield start, record, "unterminated quoted field at end of input"
+
+
+async def iter_records(chunks: AsyncIterator[bytes], format: str,
+                       record_type: Optional[str] = None) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """(line number, raw record) pairs from NDJSON or CSV input"""
+    if format == "ndjson":
+        line_no = 0
+        async for line in iter_lines(chunks):
+            line_no += 1
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                record = {"_error": f"Invalid JSON: {e.msg}"}
+            if record_type and isinstance(record, dict):
+                record.setdefault("type", record_type)
+            yield line_no, record
+        return
+
+    header = None
+    async for line_no, lines, error in _csv_records(iter_lines(chunks)):
+        rows = []
+        if error is None:
+            try:
+                rows = [row for row in csv.reader(lines) if row]
+            except csv.Error as e:
+                error = str(e)
+        if error is not None:
+            yield line_no, {"_error": f"Invalid CSV: {error}"}
+            if header is None:
+                # Without a header no row can be read
+                return
+            continue
+        for row in rows:
+            if header is None:
+                header = row
+                continue
+            # Like csv.DictReader: extra values are dropped, missing ones left out
+            record = {key: value for key, value in zip(header, row) if key and value != ""}
+            record.setdefault("type", record_type)
+            yield line_no, record
+
+
+def _created_at(record: Dict[str, Any]) -> str:
+    value = record.get("created_at")
+    if not value:
+        return datetime.utcnow().isoformat()
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo:
+        parsed = parsed.replace(tzinfo=None) - parsed.utcoffset()
+    return parsed.isoformat()
+
+
+def validate_record(user_id: str, record: Any) -> Tuple[str, tuple]:
+    """(type, row in BATCH_TABLES insert order) for a raw record; ValueError if invalid"""
+    if not isinstance(record, dict):
+        raise ValueError("Record must be an object")
+    if "_error" in record:
+        raise ValueError(record["_error"])
+    record_type = record.get("type")
+    if record_type not in IMPORT_MODELS:
+        raise ValueError(f"Unknown type: {record_type!r}")
+    fields = {key: value for key, value in record.items()
+              if key not in ("type", "created_at", "source_id", "id")}
+    if record_type == "journal" and isinstance(fields.get("tags"), str):
+        tags = fields["tags"]
+        fields["tags"] = json.loads(tags) if tags.startswith("[") else [tag.strip() for tag in tags.split(",")]
+    try:
+        model = IMPORT_MODELS[record_type](**fields)
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+        ))
+    try:
+        created_at = _created_at(record)
+    except ValueError:
+        raise ValueError(f"created_at: invalid datetime {record.get('created_at')!r}")
+
+    source_id = record.get("source_id")
+    record_id = (str(uuid.uuid5(IMPORT_NAMESPACE, f"{user_id}:{record_type}:{source_id}"))
+                 if source_id else new_id())
+    _, _, builder = BATCH_TABLES[record_type]
+    return record_type, getattr(DatabaseManager, builder)(record_id, user_id, model, created_at)
+
+
+async def _write_chunk(db_path: str, user_id: str, rows_by_type: Dict[str, List[tuple]]) -> Dict[str, int]:
+    """Insert one chunk in a single transaction; returns rows inserted per type"""
+    inserted = {}
+    async with connect(db_path) as db:
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            changes = []
+            for record_type, rows in rows_by_type.items():
+                if not rows:
+                    continue
+                table, insert_sql, _ = BATCH_TABLES[record_type]
+                # A source_id repeated within the chunk keeps its first row, as the insert does
+                unique = {}
+                for row in rows:
+                    unique.setdefault(row[0], row)
+                rows = list(unique.values())
+                await db.executemany(insert_sql.replace("INSERT INTO", "INSERT OR IGNORE INTO", 1), rows)
+                # Rows this chunk actually wrote have no change-log version yet;
+                # re-imported ones were ignored by the insert
+                new_ids = set()
+                for start in range(0, len(rows), 500):
+                    ids = [row[0] for row in rows[start:start + 500]]
+                    placeholders = ", ".join("?" for _ in ids)
+                    async with db.execute(
+                        f"SELECT id FROM {table} WHERE id IN ({placeholders}) AND version IS NULL", ids
+                    ) as cursor:
+                        new_ids.update(row[0] for row in await cursor.fetchall())
+                new_rows = [row for row in rows if row[0] in new_ids]
+                if record_type == "food_log":
+                    await DatabaseManager._link_food_logs(db, new_rows, update_stats=False)
+                changes += [(user_id, table, row[0], "upsert") for row in new_rows]
+                inserted[record_type] = len(new_rows)
+            if changes:
+                await DatabaseManager._record_changes(db, changes)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+    return inserted
+
+
+async def import_records(db_path: str, user_id: str, chunks: AsyncIterator[bytes], format: str = "ndjson",
+                         record_type: Optional[str] = None, chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+    """Validate and insert every record; invalid records are reported and skipped"""
+    imported = {record_type: 0 for record_type in IMPORT_MODELS}
+    errors = []
+    error_count = 0
+    total = 0
+
+    async def flush(pending: Dict[str, List[tuple]]):
+        for record_type, count in (await _write_chunk(db_path, user_id, pending)).items():
+            imported[record_type] += count
+
+    pending = {record_type: [] for record_type in IMPORT_MODELS}
+    buffered = 0
+    async for line_no, record in iter_records(chunks, format, record_type):
+        total += 1
+        try:
+            row_type, row = validate_record(user_id, record)
+        except ValueError as e:
+            error_count += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": line_no, "detail": str(e)})
+            continue
+        pending[row_type].append(row)
+        buffered += 1
+        if buffered >= chunk_size:
+            await flush(pending)
+            pending = {record_type: [] for record_type in IMPORT_MODELS}
+            buffered = 0
+    if buffered:
+        await flush(pending)
+
+    if imported["food_log"]:
+        async with connect(db_path) as db:
+            await db.execute("BEGIN IMMEDIATE")
+            await DatabaseManager._rebuild_food_stats(db, user_id)
+            await db.commit()
+
+    return {
+        "records": total,
+        "imported": imported,
+        "skipped": total - error_count - sum(imported.values()),
+        "error_count": error_count,
+        "errors": errors,
+    }
+
+
+async def _file_chunks(path: str, size: int = 1 << 20) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def _resolve_user(db_path: str, user_id: Optional[str], email: Optional[str]) -> Optional[str]:
+    async with connect(db_path) as db:
+        async with db.execute("SELECT id FROM users WHERE id = ? OR email = ?", (user_id, email)) as cursor:
+            row = await cursor.fetchone()
+    return row[0] if row else None
+
+
+async def _run_cli(args) -> Dict[str, Any]:
+    await DatabaseManager(args.db).init_db()
+    user_id = await _resolve_user(args.db, args.user_id, args.email)
+    if not user_id:
+        raise SystemExit("No such user")
+    format = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    return await import_records(args.db, user_id, _file_chunks(args.path), format, args.type)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import check-ins, food logs and journal entries")
+    parser.add_argument("path")
+    parser.add_argument("--db", default="mindmate.db")
+    user = parser.add_mutually_exclusive_group(required=True)
+    user.add_argument("--user-id")
+    user.add_argument("--email")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="default: from the file extension")
+    parser.add_argument("--type", choices=sorted(IMPORT_MODELS), help="record type for CSV files")
+    args = parser.parse_args(argv)
+    if (args.format == "csv" or args.path.endswith(".csv")) and not args.type:
+        parser.error("--type is required for CSV files")
+
+    started = datetime.utcnow()
+    result = asyncio.run(_run_cli(args))
+    elapsed = (datetime.utcnow() - started).total_seconds()
+    print(json.dumps(result, indent=2))
+    print(f"{result['records']} records in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
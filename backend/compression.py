@@ -0,0 +1,137 @@
+# backend/compression.py - gzip/brotli response compression middleware
+import gzip
+import os
+from typing import Dict, Optional
+
+import anyio
+
+# brotli is optional; without it we only negotiate gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# Longest matching prefix wins. Large list payloads get a higher level since
+# they compress well and dominate transfer time on slow links.
+DEFAULT_ROUTE_LEVELS = {
+    "/api/chat/history": 6,
+    "/api/journal": 6,
+    "/api/insights": 6,
+    "/api/sync": 6,
+}
+
+
+class CompressionMiddleware:
+    """Compress complete JSON/text responses above a size threshold.
+
+    Streaming responses (more than one body message) pass through untouched.
+    Bodies larger than offload_size are compressed in a worker thread so a
+    big chat history does not stall the event loop for other requests.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = int(os.getenv("MINDMATE_COMPRESS_MIN_SIZE", "1024")),
+        offload_size: int = int(os.getenv("MINDMATE_COMPRESS_OFFLOAD_SIZE", "65536")),
+        default_level: int = int(os.getenv("MINDMATE_COMPRESS_LEVEL", "5")),
+        route_levels: Optional[Dict[str, int]] = None,
+        enable_brotli: bool = os.getenv("MINDMATE_COMPRESS_BROTLI", "1") == "1",
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.default_level = default_level
+        self.route_levels = sorted((route_levels or DEFAULT_ROUTE_LEVELS).items(),
+                                   key=lambda item: len(item[0]), reverse=True)
+        self.enable_brotli = enable_brotli and brotli is not None
+
+    def _level_for(self, path: str) -> int:
+        for prefix, level in self.route_levels:
+            if path.startswith(prefix):
+                return level
+        return self.default_level
+
+    def _choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        accepted = {}
+        for part in accept_encoding.split(","):
+            name, _, params = part.strip().partition(";")
+            quality = 1.0
+            if params.strip().startswith("q="):
+                try:
+                    quality = float(params.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[name.strip().lower()] = quality
+        if self.enable_brotli and accepted.get("br", 0) > 0:
+            return "br"
+        if accepted.get("gzip", 0) > 0:
+            return "gzip"
+        return None
+
+    @staticmethod
+    def _compress(body: bytes, encoding: str, level: int) -> bytes:
+        if encoding == "br":
+            # brotli quality runs 0-11; map the gzip-style 1-9 level onto it
+            return brotli.compress(body, quality=min(11, level + 1))
+        return gzip.compress(body, compresslevel=level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict((k.decode("latin-1").lower(), v.decode("latin-1")) for k, v in scope["headers"])
+        encoding = self._choose_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        level = self._level_for(scope["path"])
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            response_headers = [(k.decode("latin-1").lower(), v.decode("latin-1"))
+                                for k, v in start_message["headers"]]
+            content_type = dict(response_headers).get("content-type", "")
+
+            if (message.get("more_body", False)
+                    or start_message["status"] in (204, 304)
+                    or "content-encoding" in dict(response_headers)
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or len(body) < self.minimum_size):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) >= self.offload_size:
+                compressed = await anyio.to_thread.run_sync(self._compress, body, encoding, level)
+            else:
+                compressed = self._compress(body, encoding, level)
+
+            new_headers = [(k, v) for k, v in response_headers if k not in ("content-length", "vary")]
+            vary = [v for k, v in response_headers if k == "vary"]
+            new_headers.append(("content-encoding", encoding))
+            new_headers.append(("content-length", str(len(compressed))))
+            new_headers.append(("vary", ", ".join(vary + ["Accept-Encoding"])))
+            start_message["headers"] = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in new_headers]
+
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,44 @@
+# conftest.py - Shared pytest fixtures: a freshly migrated database per test
+import asyncio
+
+import pytest
+
+from database import DatabaseManager
+from models import UserCreate
+
+
+@pytest.fixture
+def db(tmp_path) -> DatabaseManager:
+    manager = DatabaseManager(str(tmp_path / "mindmate.db"))
+    asyncio.run(manager.init_db())
+    return manager
+
+
+@pytest.fixture
+def user_id(db) -> str:
+    user = asyncio.run(db.create_user(UserCreate(name="Test User", email="test@example.com", password="x")))
+    return user["id"]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """TestClient for main.app on a scratch database and cache, with fresh rate limits"""
+    from fastapi.testclient import TestClient
+
+    import main
+    from rate_limit import RateLimiter
+
+    monkeypatch.setattr(main.db_manager, "db_path", str(tmp_path / "mindmate.db"))
+    monkeypatch.setattr(main.shared_cache, "db_path", str(tmp_path / "mindmate_cache.db"))
+    monkeypatch.setattr(main.shared_cache, "_local", {})
+    monkeypatch.setattr(main, "rate_limiter", RateLimiter())
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_headers(client) -> dict:
+    response = client.post("/api/auth/signup", json={"name": "Test User", "email": "test@example.com",
+                                                     "password": "secret123", "age": 30})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
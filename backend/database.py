@@ -2,164 +2,196 @@
 import sqlite3
 import aiosqlite
 import json
-import uuid
+import re
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 from models import *
+from archive import ConversationArchive, archive_path_for
+from textcodec import compress_text, decompress_text, decode_row
+from migrations import migrate
+from db_connection import connect
+from ids import new_id
+
+INSERT_CHECKIN_SQL = """
+    INSERT INTO checkins (id, user_id, checkin_type, mood, energy_level,
+                        stress_level, sleep_hours, exercise_minutes, 
+                        notes, gratitude, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_FOOD_LOG_SQL = """
+    INSERT INTO food_logs (id, user_id, food_name, meal_type, portion_size,
+                        calories, mood_before, mood_after, notes, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_JOURNAL_SQL = """
+    INSERT INTO journal_entries (id, user_id, title, content, mood, tags,
+                               is_private, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Sections /api/dashboard can return
+DASHBOARD_FIELDS = ("user", "today_checkins", "recent_checkins", "food_logs",
+                    "mood_trends", "chat_history", "weekly_summary")
+
+# Tables whose changes are exposed through /api/sync
+SYNC_TABLES = ("checkins", "food_logs", "journal_entries", "conversations")
+
+# Batch operation type -> (table, insert statement, row builder name)
+BATCH_TABLES = {
+    "checkin": ("checkins", INSERT_CHECKIN_SQL, "_checkin_row"),
+    "food_log": ("food_logs", INSERT_FOOD_LOG_SQL, "_food_log_row"),
+    "journal": ("journal_entries", INSERT_JOURNAL_SQL, "_journal_row"),
+}
+
+# Free-text food_name values are split into catalog entries on these
+FOOD_NAME_SEPARATORS = re.compile(r"\s*(?:[,;+&/]|\band\b)\s*", re.IGNORECASE)
+
+def canonical_food_name(name: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace ("  Greek-Yogurt!" -> "greek-yogurt")"""
+    return " ".join(re.sub(r"[^\w\s'-]", " ", name.lower()).split()).strip("'-")
+
+def split_food_names(food_name: Optional[str]) -> List[str]:
+    """Canonical, de-duplicated food names mentioned in a food_name value"""
+    names = []
+    for part in FOOD_NAME_SEPARATORS.split(food_name or ""):
+        name = canonical_food_name(part)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+def user_row_to_dict(row) -> Dict[str, Any]:
+    """Convert a fetched users row, parsing its JSON list columns"""
+    user_dict = dict(row)
+    user_dict['dietary_preferences'] = json.loads(user_dict.get('preferences', '[]'))
+    user_dict['mental_health_goals'] = json.loads(user_dict.get('goals', '[]'))
+    user_dict['dietary_restrictions'] = json.loads(user_dict.get('dietary_restrictions', '[]'))
+    return user_dict
+
+def row_to_dict(table: str, row) -> Dict[str, Any]:
+    """Convert a fetched row, decompressing text columns and parsing JSON tags"""
+    result = decode_row(table, dict(row))
+    if table == "journal_entries" and "tags" in result:
+        result['tags'] = json.loads(result.get('tags') or '[]')
+    return result
 
 class DatabaseManager:
     def __init__(self, db_path: str = "mindmate.db"):
         self.db_path = db_path
+        # Optional write_behind.ConversationWriteBuffer; its pending rows are
+        # merged into conversation history reads
+        self.conversation_buffer = None
+
+    @property
+    def archive(self) -> ConversationArchive:
+        """Cold storage for conversations and insights moved out by archive.py"""
+        return ConversationArchive(archive_path_for(self.db_path))
+
+    @asynccontextmanager
+    async def _reader(self, db=None):
+        """Yield db when the caller already holds a connection (see get_dashboard), else a new one"""
+        if db is not None:
+            yield db
+            return
+        async with connect(self.db_path) as conn:
+            conn.row_factory = aiosqlite.Row
+            yield conn
         
     async def init_db(self):
-        """Initialize database with all tables"""
+        """Create or upgrade the schema; a no-op beyond one PRAGMA read when current"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                # Users table with authentication
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        id TEXT PRIMARY KEY,
-                        name TEXT NOT NULL,
-                        email TEXT UNIQUE,
-                        password TEXT,
-                        age INTEGER,
-                        preferences TEXT DEFAULT '[]',
-                        goals TEXT DEFAULT '[]',
-                        dietary_restrictions TEXT DEFAULT '[]',
-                        timezone TEXT DEFAULT 'UTC',
-                        created_at TEXT NOT NULL,
-                        updated_at TEXT NOT NULL,
-                        has_completed_onboarding BOOLEAN DEFAULT 0
-                    )
-                """)
-                
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS checkins (
-                        id TEXT PRIMARY KEY,
-                        user_id TEXT NOT NULL,
-                        checkin_type TEXT NOT NULL,
-                        mood INTEGER NOT NULL,
-                        energy_level INTEGER NOT NULL,
-                        stress_level INTEGER NOT NULL,
-                        sleep_hours REAL,
-                        exercise_minutes INTEGER,
-                        notes TEXT,
-                        gratitude TEXT,
-                        created_at TEXT NOT NULL,
-                        FOREIGN KEY (user_id) REFERENCES users (id)
-                    )
-                """)
-                
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS food_logs (
-                        id TEXT PRIMARY KEY,
-                        user_id TEXT NOT NULL,
-                        food_name TEXT NOT NULL,
-                        meal_type TEXT NOT NULL,
-                        portion_size TEXT,
-                        calories INTEGER,
-                        mood_before INTEGER,
-                        mood_after INTEGER,
-                        notes TEXT,
-                        created_at TEXT NOT NULL,
-                        FOREIGN KEY (user_id) REFERENCES users (id)
-                    )
-                """)
-                
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS conversations (
-                        id TEXT PRIMARY KEY,
-                        user_id TEXT NOT NULL,
-                        user_message TEXT NOT NULL,
-                        ai_response TEXT NOT NULL,
-                        created_at TEXT NOT NULL,
-                        FOREIGN KEY (user_id) REFERENCES users (id)
-                    )
-                """)
-                
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS journal_entries (
-                        id TEXT PRIMARY KEY,
-                        user_id TEXT NOT NULL,
-                        title TEXT,
-                        content TEXT NOT NULL,
-                        mood INTEGER,
-                        tags TEXT DEFAULT '[]',
-                        is_private BOOLEAN DEFAULT 1,
-                        ai_reflection TEXT,
-                        created_at TEXT NOT NULL,
-                        updated_at TEXT NOT NULL,
-                        FOREIGN KEY (user_id) REFERENCES users (id)
-                    )
-                """)
-                
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS insights (
-                        id TEXT PRIMARY KEY,
-                        user_id TEXT NOT NULL,
-                        checkin_id TEXT,
-                        insight_type TEXT NOT NULL,
-                        content TEXT NOT NULL,
-                        created_at TEXT NOT NULL,
-                        FOREIGN KEY (user_id) REFERENCES users (id),
-                        FOREIGN KEY (checkin_id) REFERENCES checkins (id)
-                    )
-                """)
-                
-                # Create indexes for better performance
-                await db.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
-                await db.execute("CREATE INDEX IF NOT EXISTS idx_checkins_user_date ON checkins(user_id, created_at)")
-                await db.execute("CREATE INDEX IF NOT EXISTS idx_food_logs_user_date ON food_logs(user_id, created_at)")
-                await db.execute("CREATE INDEX IF NOT EXISTS idx_conversations_user_date ON conversations(user_id, created_at)")
-                await db.execute("CREATE INDEX IF NOT EXISTS idx_journal_user_date ON journal_entries(user_id, created_at)")
-                
-                await db.commit()
-                print("Database initialized successfully")
+            await migrate(self.db_path)
+            print("Database initialized successfully")
         except Exception as e:
             print(f"Database initialization error: {e}")
             raise
 
+    @staticmethod
+    async def _record_changes(db, changes: List[tuple]) -> int:
+        """Append (user_id, table, row_id, operation) entries to the change log.
+
+        Must run inside a transaction that already holds the write lock (i.e.
+        after the row writes), so version allocation cannot race. Upserted rows
+        are stamped with their new version. Returns the highest version written.
+        """
+        async with db.execute("SELECT COALESCE(MAX(version), 0) FROM change_log") as cursor:
+            (current,) = await cursor.fetchone()
+        now = datetime.utcnow().isoformat()
+        entries = [
+            (current + i + 1, user_id, table, row_id, operation, now)
+            for i, (user_id, table, row_id, operation) in enumerate(changes)
+        ]
+        await db.executemany("""
+            INSERT INTO change_log (version, user_id, table_name, row_id, operation, changed_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, entries)
+
+        stamps = {}
+        for version, _, table, row_id, operation, _ in entries:
+            if operation == "upsert" and table in SYNC_TABLES:
+                stamps.setdefault(table, []).append((version, row_id))
+        for table, rows in stamps.items():
+            await db.executemany(f"UPDATE {table} SET version = ? WHERE id = ?", rows)
+        return current + len(changes)
+
     async def close(self):
         """Close database connections"""
         pass  # aiosqlite handles connections automatically
 
     # User Management
-    async def create_user(self, user_data: UserCreate) -> str:
-        user_id = str(uuid.uuid4())
+    async def create_user(self, user_data: UserCreate) -> Optional[Dict[str, Any]]:
+        """Insert a user and return the stored row, or None if the email is already registered"""
+        user_id = new_id()
         now = datetime.utcnow().isoformat()
         
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
+        async with connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            # The unique email index settles concurrent signups for the same address
+            async with db.execute("""
                 INSERT INTO users (id, name, email, password, age, preferences, 
                                  goals, dietary_restrictions, timezone, 
                                  created_at, updated_at, has_completed_onboarding)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (email) DO NOTHING
+                RETURNING *
             """, (
                 user_id, user_data.name, user_data.email, user_data.password,
                 user_data.age, json.dumps(user_data.dietary_preferences or []),
                 json.dumps(user_data.mental_health_goals or []), 
                 json.dumps(user_data.dietary_restrictions or []), 
                 user_data.timezone or 'UTC', now, now, False
-            ))
+            )) as cursor:
+                row = await cursor.fetchone()
+            if row is None:
+                await db.rollback()
+                return None
+            await self._record_changes(db, [(user_id, "users", user_id, "upsert")])
             await db.commit()
         
-        return user_id
+        return user_row_to_dict(row)
+
+    async def _insert_returning(self, table: str, insert_sql: str, row: tuple, food_log: bool = False
+                                ) -> Dict[str, Any]:
+        """Insert one synced row and return it as stored, version included, in one round trip"""
+        async with connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(insert_sql + " RETURNING *", row) as cursor:
+                stored = row_to_dict(table, await cursor.fetchone())
+            if food_log:
+                await self._link_food_logs(db, [row])
+            stored["version"] = await self._record_changes(db, [(row[1], table, row[0], "upsert")])
+            await db.commit()
+        return stored
 
-    async def get_user(self, user_id: str):
+    async def get_user(self, user_id: str, db=None):
         """Get user by ID - Returns dict format"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
+            async with self._reader(db) as db:
                 async with db.execute("SELECT * FROM users WHERE id = ?", (user_id,)) as cursor:
                     row = await cursor.fetchone()
-                    if row:
-                        user_dict = dict(row)
-                        # Parse JSON fields
-                        user_dict['dietary_preferences'] = json.loads(user_dict.get('preferences', '[]'))
-                        user_dict['mental_health_goals'] = json.loads(user_dict.get('goals', '[]'))
-                        user_dict['dietary_restrictions'] = json.loads(user_dict.get('dietary_restrictions', '[]'))
-                        return user_dict
-                    return None
+                    return user_row_to_dict(row) if row else None
         except Exception as e:
             print(f"Database error getting user: {e}")
             return None
@@ -167,17 +199,11 @@ class DatabaseManager:
     async def get_user_by_email(self, email: str):
         """Get user by email address"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with connect(self.db_path) as db:
                 db.row_factory = aiosqlite.Row
                 async with db.execute("SELECT * FROM users WHERE email = ?", (email,)) as cursor:
                     row = await cursor.fetchone()
-                    if row:
-                        user_dict = dict(row)
-                        user_dict['dietary_preferences'] = json.loads(user_dict.get('preferences', '[]'))
-                        user_dict['mental_health_goals'] = json.loads(user_dict.get('goals', '[]'))
-                        user_dict['dietary_restrictions'] = json.loads(user_dict.get('dietary_restrictions', '[]'))
-                        return user_dict
-                    return None
+                    return user_row_to_dict(row) if row else None
         except Exception as e:
             print(f"Error getting user by email: {e}")
             return None
@@ -211,14 +237,15 @@ class DatabaseManager:
         
         query = f"UPDATE users SET {', '.join(updates)} WHERE id = ?"
         
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             await db.execute(query, values)
+            await self._record_changes(db, [(user_id, "users", user_id, "upsert")])
             await db.commit()
 
     # Check-ins
 
     async def get_checkin(self, checkin_id: str):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             db.row_factory = aiosqlite.Row
             async with db.execute("SELECT * FROM checkins WHERE id = ?", (checkin_id,)) as cursor:
                 row = await cursor.fetchone()
@@ -226,9 +253,8 @@ class DatabaseManager:
                     return None
                 return dict(row)
 
-    async def get_user_checkins(self, user_id: str, limit: int = 10, offset: int = 0):
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+    async def get_user_checkins(self, user_id: str, limit: int = 10, offset: int = 0, db=None):
+        async with self._reader(db) as db:
             async with db.execute("""
                 SELECT * FROM checkins WHERE user_id = ? 
                 ORDER BY created_at DESC LIMIT ? OFFSET ?
@@ -236,10 +262,9 @@ class DatabaseManager:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
-    async def get_today_checkin(self, user_id: str, checkin_type: str):
+    async def get_today_checkin(self, user_id: str, checkin_type: str, db=None):
         today = datetime.utcnow().date().isoformat()
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._reader(db) as db:
             async with db.execute("""
                 SELECT * FROM checkins 
                 WHERE user_id = ? AND checkin_type = ? AND date(created_at) = ?
@@ -251,56 +276,156 @@ class DatabaseManager:
                 return None
 
     # Fix create_checkin method in database.py (around line 232)
-    async def create_checkin(self, user_id: str, checkin) -> str:
-        checkin_id = str(uuid.uuid4())
+    async def create_checkin(self, user_id: str, checkin) -> Dict[str, Any]:
+        """Insert a check-in and return the stored row"""
         now = datetime.utcnow().isoformat()
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                INSERT INTO checkins (id, user_id, checkin_type, mood, energy_level,
-                                    stress_level, sleep_hours, exercise_minutes, 
-                                    notes, gratitude, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                checkin_id, user_id, checkin.checkin_type, checkin.mood,
-                checkin.energy_level, checkin.stress_level, 
-                getattr(checkin, 'sleep_hours', None), 
-                getattr(checkin, 'exercise_minutes', None),
-                getattr(checkin, 'notes', None), 
-                getattr(checkin, 'gratitude', None),
-                now
-            ))
-            await db.commit()
-        
-        return checkin_id
+        return await self._insert_returning(
+            "checkins", INSERT_CHECKIN_SQL, self._checkin_row(new_id(), user_id, checkin, now)
+        )
+
+    @staticmethod
+    def _checkin_row(checkin_id: str, user_id: str, checkin, now: str) -> tuple:
+        return (
+            checkin_id, user_id, checkin.checkin_type, checkin.mood,
+            checkin.energy_level, checkin.stress_level, 
+            getattr(checkin, 'sleep_hours', None), 
+            getattr(checkin, 'exercise_minutes', None),
+            getattr(checkin, 'notes', None), 
+            getattr(checkin, 'gratitude', None),
+            now
+        )
 
     # Fix create_food_log method in database.py (around line 283)
-    async def create_food_log(self, user_id: str, food_log) -> str:
-        log_id = str(uuid.uuid4())
+    async def create_food_log(self, user_id: str, food_log) -> Dict[str, Any]:
+        """Insert a food log, link it into the food catalog and return the stored row"""
         now = datetime.utcnow().isoformat()
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                INSERT INTO food_logs (id, user_id, food_name, meal_type, portion_size,
-                                    calories, mood_before, mood_after, notes, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                log_id, user_id, 
-                getattr(food_log, 'food_name', None),
-                getattr(food_log, 'meal_type', None),
-                getattr(food_log, 'portion_size', None), 
-                getattr(food_log, 'calories', None), 
-                getattr(food_log, 'mood_before', None),
-                getattr(food_log, 'mood_after', None), 
-                getattr(food_log, 'notes', None), 
-                now
-            ))
+        return await self._insert_returning(
+            "food_logs", INSERT_FOOD_LOG_SQL, self._food_log_row(new_id(), user_id, food_log, now), food_log=True
+        )
+
+    @staticmethod
+    def _food_log_row(log_id: str, user_id: str, food_log, now: str) -> tuple:
+        return (
+            log_id, user_id, 
+            getattr(food_log, 'food_name', None),
+            getattr(food_log, 'meal_type', None),
+            getattr(food_log, 'portion_size', None), 
+            getattr(food_log, 'calories', None), 
+            getattr(food_log, 'mood_before', None),
+            getattr(food_log, 'mood_after', None), 
+            getattr(food_log, 'notes', None), 
+            now
+        )
+
+    @staticmethod
+    async def _link_food_logs(db, rows: List[tuple], update_stats: bool = True):
+        """Intern the foods named by new food_logs rows (INSERT_FOOD_LOG_SQL order)
+        and fold each log into the user's per-food aggregates."""
+        links = []
+        for row in rows:
+            log_id, user_id, food_name = row[0], row[1], row[2]
+            mood_before, mood_after, created_at = row[6], row[7], row[9]
+            delta = mood_after - mood_before if mood_before is not None and mood_after is not None else None
+            for name in split_food_names(food_name):
+                links.append((log_id, user_id, name, delta, created_at))
+        if not links:
+            return
+
+        names = sorted({name for _, _, name, _, _ in links})
+        now = datetime.utcnow().isoformat()
+        await db.executemany("INSERT OR IGNORE INTO foods (name, created_at) VALUES (?, ?)",
+                             [(name, now) for name in names])
+        food_ids = {}
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            async with db.execute(f"SELECT name, id FROM foods WHERE name IN ({placeholders})", chunk) as cursor:
+                food_ids.update(await cursor.fetchall())
+
+        await db.executemany("INSERT OR IGNORE INTO food_log_items (log_id, food_id) VALUES (?, ?)",
+                             [(log_id, food_ids[name]) for log_id, _, name, _, _ in links])
+        if update_stats:
+            await db.executemany("""
+                INSERT INTO user_food_stats (user_id, food_id, log_count, mood_delta_sum,
+                                             mood_delta_count, last_eaten_at)
+                VALUES (?, ?, 1, ?, ?, ?)
+                ON CONFLICT (user_id, food_id) DO UPDATE SET
+                    log_count = log_count + 1,
+                    mood_delta_sum = mood_delta_sum + excluded.mood_delta_sum,
+                    mood_delta_count = mood_delta_count + excluded.mood_delta_count,
+                    last_eaten_at = MAX(last_eaten_at, excluded.last_eaten_at)
+            """, [
+                (user_id, food_ids[name], delta or 0, 0 if delta is None else 1, created_at)
+                for _, user_id, name, delta, created_at in links
+            ])
+
+    @staticmethod
+    async def _unlinked_food_logs(db) -> List[tuple]:
+        """food_logs rows (INSERT_FOOD_LOG_SQL order) that have no catalog links yet"""
+        async with db.execute("""
+            SELECT id, user_id, food_name, meal_type, portion_size, calories,
+                   mood_before, mood_after, notes, created_at
+            FROM food_logs
+            WHERE NOT EXISTS (SELECT 1 FROM food_log_items WHERE log_id = food_logs.id)
+        """) as cursor:
+            return [tuple(row) for row in await cursor.fetchall()]
+
+    @staticmethod
+    async def _rebuild_food_stats(db, user_id: Optional[str] = None):
+        """Recompute per-user food aggregates from the link table (one user's, or everyone's)"""
+        user_filter = "WHERE fl.user_id = ?" if user_id else ""
+        params = (user_id,) if user_id else ()
+        await db.execute(f"DELETE FROM user_food_stats {'WHERE user_id = ?' if user_id else ''}", params)
+        await db.execute(f"""
+            INSERT INTO user_food_stats (user_id, food_id, log_count, mood_delta_sum,
+                                         mood_delta_count, last_eaten_at)
+            SELECT fl.user_id, li.food_id, COUNT(*),
+                   COALESCE(SUM(fl.mood_after - fl.mood_before), 0),
+                   COUNT(fl.mood_after - fl.mood_before),
+                   MAX(fl.created_at)
+            FROM food_log_items li
+            JOIN food_logs fl ON fl.id = li.log_id
+            {user_filter}
+            GROUP BY fl.user_id, li.food_id
+        """, params)
+
+    async def rebuild_food_catalog(self):
+        """Link any food logs written without the catalog and recompute all aggregates"""
+        async with connect(self.db_path) as db:
+            await db.execute("BEGIN IMMEDIATE")
+            await self._link_food_logs(db, await self._unlinked_food_logs(db), update_stats=False)
+            await self._rebuild_food_stats(db)
             await db.commit()
-        
-        return log_id
+
+    async def get_user_food_stats(self, user_id: str, limit: int = 20, since: Optional[str] = None,
+                                  order_by: str = "frequency") -> List[Dict[str, Any]]:
+        """Precomputed per-food stats for a user.
+
+        order_by="frequency" lists the most logged foods; order_by="mood" lists
+        foods with a recorded mood change, best average change first.
+        """
+        order = {
+            "frequency": "s.log_count DESC, s.last_eaten_at DESC",
+            "mood": "avg_mood_delta DESC, s.mood_delta_count DESC",
+        }[order_by]
+        mood_filter = "AND s.mood_delta_count > 0" if order_by == "mood" else ""
+        async with connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(f"""
+                SELECT f.name AS food, s.log_count, s.mood_delta_count,
+                       CASE WHEN s.mood_delta_count > 0
+                            THEN ROUND(CAST(s.mood_delta_sum AS REAL) / s.mood_delta_count, 2)
+                       END AS avg_mood_delta,
+                       s.last_eaten_at
+                FROM user_food_stats s
+                JOIN foods f ON f.id = s.food_id
+                WHERE s.user_id = ? AND s.last_eaten_at >= ? {mood_filter}
+                ORDER BY {order} LIMIT ?
+            """, (user_id, since or "", limit)) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
 
     async def get_food_log(self, log_id: str):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             db.row_factory = aiosqlite.Row
             async with db.execute("SELECT * FROM food_logs WHERE id = ?", (log_id,)) as cursor:
                 row = await cursor.fetchone()
@@ -308,9 +433,8 @@ class DatabaseManager:
                     return None
                 return dict(row)
 
-    async def get_user_food_logs(self, user_id: str, limit: int = 20, offset: int = 0):
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+    async def get_user_food_logs(self, user_id: str, limit: int = 20, offset: int = 0, db=None):
+        async with self._reader(db) as db:
             async with db.execute("""
                 SELECT * FROM food_logs WHERE user_id = ? 
                 ORDER BY created_at DESC LIMIT ? OFFSET ?
@@ -326,21 +450,69 @@ class DatabaseManager:
         if not ai_response or not ai_response.strip():
             raise ValueError("AI response cannot be empty")
         
-        conversation_id = str(uuid.uuid4())
+        conversation_id = new_id()
         now = datetime.utcnow().isoformat()
         
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             await db.execute("""
                 INSERT INTO conversations (id, user_id, user_message, ai_response, created_at)
                 VALUES (?, ?, ?, ?, ?)
-            """, (conversation_id, user_id, user_message.strip(), ai_response.strip(), now))
+            """, (conversation_id, user_id, user_message.strip(), compress_text(ai_response.strip()), now))
+            await self._record_changes(db, [(user_id, "conversations", conversation_id, "upsert")])
             await db.commit()
         
         return conversation_id
 
-    async def get_conversation_history(self, user_id: str, limit: int = 50):
-        async with aiosqlite.connect(self.db_path) as db:
+    async def save_conversations(self, rows: List[Dict[str, Any]]):
+        """Insert already-validated conversation rows in one transaction"""
+        async with connect(self.db_path) as db:
+            await db.executemany("""
+                INSERT OR IGNORE INTO conversations (id, user_id, user_message, ai_response, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, [
+                (row["id"], row["user_id"], row["user_message"], compress_text(row["ai_response"]), row["created_at"])
+                for row in rows
+            ])
+            await self._record_changes(db, [(row["user_id"], "conversations", row["id"], "upsert") for row in rows])
+            await db.commit()
+
+    async def get_conversation_history(self, user_id: str, limit: int = 50, include_archived: bool = False,
+                                       db=None):
+        # Snapshot buffered rows before querying so a flush in between
+        # shows up in one place or the other (duplicates are dropped below)
+        pending = self.conversation_buffer.pending_for(user_id) if self.conversation_buffer else []
+        stored = await self._get_stored_conversation_history(user_id, limit, db)
+        history = stored
+        if pending:
+            seen = {row["id"] for row in pending}
+            history = pending + [row for row in stored if row["id"] not in seen]
+            history.sort(key=lambda row: row["created_at"], reverse=True)
+            history = history[:limit]
+        if include_archived and len(history) < limit:
+            before = history[-1]["created_at"] if history else None
+            history += await self.archive.get_conversations(user_id, limit - len(history), before)
+        return history
+
+    async def search_conversations(self, user_id: str, query: str, limit: int = 20,
+                                   include_archived: bool = False):
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        async with connect(self.db_path) as db:
             db.row_factory = aiosqlite.Row
+            # ai_response may be compressed; decompress inside SQLite so LIKE still applies
+            await db.create_function("decompress_text", 1, decompress_text, deterministic=True)
+            async with db.execute("""
+                SELECT * FROM conversations
+                WHERE user_id = ?
+                AND (user_message LIKE ? ESCAPE '\\' OR decompress_text(ai_response) LIKE ? ESCAPE '\\')
+                ORDER BY created_at DESC LIMIT ?
+            """, (user_id, pattern, pattern, limit)) as cursor:
+                results = [row_to_dict("conversations", row) for row in await cursor.fetchall()]
+        if include_archived and len(results) < limit:
+            results += await self.archive.search_conversations(user_id, query, limit - len(results))
+        return results
+
+    async def _get_stored_conversation_history(self, user_id: str, limit: int, db=None):
+        async with self._reader(db) as db:
             async with db.execute("""
                 SELECT * FROM conversations 
                 WHERE user_id = ? 
@@ -352,79 +524,232 @@ class DatabaseManager:
                 LIMIT ?
             """, (user_id, limit)) as cursor:
                 rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+                return [row_to_dict("conversations", row) for row in rows]
 
     # Journal
-    async def create_journal_entry(self, user_id: str, entry) -> str:
-        entry_id = str(uuid.uuid4())
+    async def create_journal_entry(self, user_id: str, entry) -> Dict[str, Any]:
+        """Insert a journal entry and return the stored row"""
         now = datetime.utcnow().isoformat()
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                INSERT INTO journal_entries (id, user_id, title, content, mood, tags,
-                                           is_private, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                entry_id, user_id, entry.title, entry.content,
-                entry.mood, json.dumps(entry.tags or []), 
-                entry.is_private, now, now
-            ))
-            await db.commit()
-        
-        return entry_id
+        return await self._insert_returning(
+            "journal_entries", INSERT_JOURNAL_SQL, self._journal_row(new_id(), user_id, entry, now)
+        )
+
+    @staticmethod
+    def _journal_row(entry_id: str, user_id: str, entry, now: str) -> tuple:
+        return (
+            entry_id, user_id, entry.title, compress_text(entry.content),
+            entry.mood, json.dumps(entry.tags or []), 
+            entry.is_private, now, now
+        )
 
     async def save_journal_reflection(self, entry_id: str, reflection: str):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
+        async with connect(self.db_path) as db:
+            async with db.execute("""
                 UPDATE journal_entries SET ai_reflection = ?, updated_at = ?
                 WHERE id = ?
-            """, (reflection, datetime.utcnow().isoformat(), entry_id))
+                RETURNING user_id
+            """, (compress_text(reflection), datetime.utcnow().isoformat(), entry_id)) as cursor:
+                row = await cursor.fetchone()
+            if row:
+                await self._record_changes(db, [(row[0], "journal_entries", entry_id, "upsert")])
             await db.commit()
 
     async def get_journal_entry(self, entry_id: str):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             db.row_factory = aiosqlite.Row
             async with db.execute("SELECT * FROM journal_entries WHERE id = ?", (entry_id,)) as cursor:
                 row = await cursor.fetchone()
                 if not row:
                     return None
-                result = dict(row)
-                result['tags'] = json.loads(result.get('tags', '[]'))
-                return result
+                return row_to_dict("journal_entries", row)
 
     async def get_user_journal_entries(self, user_id: str, limit: int = 20, offset: int = 0):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             db.row_factory = aiosqlite.Row
             async with db.execute("""
                 SELECT * FROM journal_entries WHERE user_id = ? 
                 ORDER BY created_at DESC LIMIT ? OFFSET ?
             """, (user_id, limit, offset)) as cursor:
                 rows = await cursor.fetchall()
-                result = []
-                for row in rows:
-                    row_dict = dict(row)
-                    row_dict['tags'] = json.loads(row_dict.get('tags', '[]'))
-                    result.append(row_dict)
-                return result
+                return [row_to_dict("journal_entries", row) for row in rows]
+
+    # Batched writes
+    async def apply_batch(self, user_id: str, operations: List[tuple]) -> List[Dict[str, Any]]:
+        """Apply (client_id, operation_type, model) tuples in a single transaction.
+
+        Operations whose client_id was already applied for this user are not
+        written again; their original row is returned with status "duplicate".
+        Results come back in the same order as the operations.
+        """
+        now = datetime.utcnow().isoformat()
+        client_ids = [client_id for client_id, _, _ in operations]
+
+        async with connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                placeholders = ", ".join("?" for _ in client_ids)
+                async with db.execute(f"""
+                    SELECT client_id, operation_type, record_id FROM batch_operations
+                    WHERE user_id = ? AND client_id IN ({placeholders})
+                """, (user_id, *client_ids)) as cursor:
+                    applied = {
+                        row["client_id"]: (row["operation_type"], row["record_id"])
+                        for row in await cursor.fetchall()
+                    }
+
+                record_ids = {}
+                record_types = {}
+                statuses = {}
+                rows_by_type = {op_type: [] for op_type in BATCH_TABLES}
+                ledger = []
+                changes = []
+                for client_id, op_type, model in operations:
+                    if client_id in applied:
+                        record_types[client_id], record_ids[client_id] = applied[client_id]
+                        statuses[client_id] = "duplicate"
+                        continue
+                    if client_id in record_ids:
+                        # Repeated client_id inside the same batch
+                        continue
+                    record_id = new_id()
+                    record_ids[client_id] = record_id
+                    record_types[client_id] = op_type
+                    statuses[client_id] = "created"
+                    _, _, builder = BATCH_TABLES[op_type]
+                    rows_by_type[op_type].append(getattr(self, builder)(record_id, user_id, model, now))
+                    ledger.append((user_id, client_id, op_type, record_id, now))
+                    changes.append((user_id, BATCH_TABLES[op_type][0], record_id, "upsert"))
+
+                for op_type, rows in rows_by_type.items():
+                    if rows:
+                        await db.executemany(BATCH_TABLES[op_type][1], rows)
+                await self._link_food_logs(db, rows_by_type["food_log"])
+                if ledger:
+                    await db.executemany("""
+                        INSERT INTO batch_operations (user_id, client_id, operation_type, record_id, created_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, ledger)
+                    await self._record_changes(db, changes)
+
+                records = {}
+                for op_type, (table, _, _) in BATCH_TABLES.items():
+                    ids = [record_ids[client_id] for client_id, t in record_types.items() if t == op_type]
+                    if not ids:
+                        continue
+                    placeholders = ", ".join("?" for _ in ids)
+                    async with db.execute(
+                        f"SELECT * FROM {table} WHERE user_id = ? AND id IN ({placeholders})",
+                        (user_id, *ids)
+                    ) as cursor:
+                        for row in await cursor.fetchall():
+                            record = row_to_dict(table, row)
+                            records[record["id"]] = record
+
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+        return [
+            {
+                "client_id": client_id,
+                "type": record_types[client_id],
+                "status": statuses[client_id],
+                "data": records.get(record_ids[client_id]),
+            }
+            for client_id, _, _ in operations
+        ]
+
+    # Delta sync
+    async def get_changes_since(self, user_id: str, since: int = 0, limit: int = 500) -> Dict[str, Any]:
+        """Return rows changed and deleted after version `since`.
+
+        Pages through the change log in version order; the returned version is
+        the cursor for the next call and has_more tells the client to continue.
+        """
+        async with connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT version, table_name, row_id, operation FROM change_log
+                WHERE user_id = ? AND version > ? AND table_name IN ({})
+                ORDER BY version LIMIT ?
+            """.format(", ".join("?" for _ in SYNC_TABLES)), (user_id, since, *SYNC_TABLES, limit + 1)) as cursor:
+                entries = [dict(row) for row in await cursor.fetchall()]
+
+            has_more = len(entries) > limit
+            entries = entries[:limit]
+
+            upserts = {table: [] for table in SYNC_TABLES}
+            deleted = []
+            for entry in entries:
+                if entry["operation"] == "delete":
+                    deleted.append({"table": entry["table_name"], "id": entry["row_id"], "version": entry["version"]})
+                elif entry["row_id"] not in upserts[entry["table_name"]]:
+                    upserts[entry["table_name"]].append(entry["row_id"])
+
+            changes = {}
+            for table, ids in upserts.items():
+                changes[table] = []
+                if not ids:
+                    continue
+                placeholders = ", ".join("?" for _ in ids)
+                async with db.execute(
+                    f"SELECT * FROM {table} WHERE user_id = ? AND id IN ({placeholders}) ORDER BY version",
+                    (user_id, *ids)
+                ) as cursor:
+                    for row in await cursor.fetchall():
+                        changes[table].append(row_to_dict(table, row))
+
+        return {
+            "version": entries[-1]["version"] if entries else since,
+            "has_more": has_more,
+            "changes": changes,
+            "deleted": deleted,
+        }
+
+    async def get_user_state_version(self, user_id: str) -> tuple:
+        """(version, changed_at) of the user's most recent write, or (0, None)"""
+        async with connect(self.db_path) as db:
+            async with db.execute("""
+                SELECT version, changed_at FROM change_log
+                WHERE user_id = ? ORDER BY version DESC LIMIT 1
+            """, (user_id,)) as cursor:
+                row = await cursor.fetchone()
+                if row:
+                    return row[0], row[1]
+                return 0, None
 
     # Insights
     async def save_insights(self, user_id: str, checkin_id: str, insights: str):
-        insight_id = str(uuid.uuid4())
+        insight_id = new_id()
         now = datetime.utcnow().isoformat()
         
-        async with aiosqlite.connect(self.db_path) as db:
+        async with connect(self.db_path) as db:
             await db.execute("""
                 INSERT INTO insights (id, user_id, checkin_id, insight_type, content, created_at)
                 VALUES (?, ?, ?, ?, ?, ?)
             """, (insight_id, user_id, checkin_id, "daily", insights, now))
             await db.commit()
 
+    async def get_user_insights(self, user_id: str, limit: int = 20, include_archived: bool = False):
+        async with connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT * FROM insights WHERE user_id = ?
+                ORDER BY created_at DESC LIMIT ?
+            """, (user_id, limit)) as cursor:
+                insights = [dict(row) for row in await cursor.fetchall()]
+        if include_archived and len(insights) < limit:
+            before = insights[-1]["created_at"] if insights else None
+            insights += await self.archive.get_insights(user_id, limit - len(insights), before)
+        return insights
+
     # Analytics
-    async def get_mood_trends(self, user_id: str, days: int = 30):
+    async def get_mood_trends(self, user_id: str, days: int = 30, db=None):
         start_date = (datetime.utcnow() - timedelta(days=days)).isoformat()
         
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._reader(db) as db:
             async with db.execute("""
                 SELECT date(created_at) as date, mood, energy_level, stress_level
                 FROM checkins 
@@ -434,6 +759,50 @@ class DatabaseManager:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
+    async def get_weekly_summary(self, user_id: str, week_start: Optional[str] = None, db=None):
+        """Stored weekly summary for week_start, or the latest one"""
+        async with self._reader(db) as db:
+            async with db.execute("""
+                SELECT week_start, summary, narrative, updated_at FROM weekly_summaries
+                WHERE user_id = ? AND week_start <= ?
+                ORDER BY week_start DESC LIMIT 1
+            """, (user_id, week_start or "9999")) as cursor:
+                row = await cursor.fetchone()
+        if not row:
+            return None
+        result = dict(row)
+        result["summary"] = json.loads(result["summary"])
+        return result
+
+    async def get_dashboard(self, user_id: str, fields, limit: int = 5, days: int = 7) -> Dict[str, Any]:
+        """Landing-screen data for the requested DASHBOARD_FIELDS from one read transaction"""
+        async with connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            # A single read transaction: every section sees the same snapshot
+            await db.execute("BEGIN")
+            try:
+                result = {}
+                if "user" in fields:
+                    result["user"] = await self.get_user(user_id, db=db)
+                if "today_checkins" in fields:
+                    result["today_checkins"] = {
+                        checkin_type.value: await self.get_today_checkin(user_id, checkin_type.value, db=db)
+                        for checkin_type in CheckinType
+                    }
+                if "recent_checkins" in fields:
+                    result["recent_checkins"] = await self.get_user_checkins(user_id, limit, db=db)
+                if "food_logs" in fields:
+                    result["food_logs"] = await self.get_user_food_logs(user_id, limit, db=db)
+                if "mood_trends" in fields:
+                    result["mood_trends"] = await self.get_mood_trends(user_id, days, db=db)
+                if "chat_history" in fields:
+                    result["chat_history"] = await self.get_conversation_history(user_id, limit, db=db)
+                if "weekly_summary" in fields:
+                    result["weekly_summary"] = await self.get_weekly_summary(user_id, db=db)
+            finally:
+                await db.rollback()
+        return result
+
     async def get_user_context(self, user_id: str):
         # Simple implementation - return basic context
         return {
@@ -0,0 +1,20 @@
+# backend/db_connection.py - Connections to the main database
+#
+# Several writers share mindmate.db: every uvicorn worker in production
+# mode, the write-behind buffer, batch and bulk imports, the archive and
+# weekly summary jobs. Every connection goes through connect(), which sets a
+# busy timeout so a writer waits for the lock instead of failing with
+# "database is locked". migrate() switches the file to WAL once (the mode is
+# stored in the file), so readers never block the writer or each other.
+import os
+
+import aiosqlite
+
+# Seconds a connection waits for another writer's lock (sqlite3's timeout is
+# SQLite's busy_timeout)
+BUSY_TIMEOUT = float(os.getenv("MINDMATE_DB_BUSY_TIMEOUT", "30"))
+
+
+def connect(db_path: str) -> aiosqlite.Connection:
+    """Connection that waits up to BUSY_TIMEOUT seconds for a locked database"""
+    return aiosqlite.connect(db_path, timeout=BUSY_TIMEOUT)
@@ -0,0 +1,310 @@
+# backend/embeddings.py - Semantic recall over a user's journal entries and chats
+#
+# New journal entries and conversations are embedded in the background and
+# stored as float16 vectors, appended to one memory-mapped file per user
+# (vectors/<user_id>.<dim>.f16). The embeddings table maps each vector's row
+# in that file back to its source row. Search is a NumPy dot product over
+# the user's unit-length vectors plus argpartition, which stays in the low
+# milliseconds for thousands of entries, and only the top hits are read back
+# from SQLite.
+#
+# MINDMATE_EMBEDDINGS selects the embedder: "ollama" (POST /api/embeddings),
+# "hash" (a local hashing stub for development and tests) or "off" (default).
+#
+# Usage:
+#   python embeddings.py --backfill            # embed rows written before this was enabled
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from db_connection import connect
+from textcodec import decompress_text
+
+EMBEDDING_BACKEND = os.getenv("MINDMATE_EMBEDDINGS", "off")
+EMBEDDING_MODEL = os.getenv("MINDMATE_EMBEDDING_MODEL", "nomic-embed-text")
+VECTOR_DIR = os.getenv("MINDMATE_VECTOR_DIR", "vectors")
+
+# Source table -> SQL returning (id, user_id, and the two text columns source_text() joins)
+SOURCES = {
+    "journal_entries": "SELECT id, user_id, title, content FROM journal_entries",
+    "conversations": "SELECT id, user_id, user_message, ai_response FROM conversations",
+}
+
+
+def source_text(table: str, first: Optional[str], second: Any) -> str:
+    """Text embedded for a row: journal title + content, or the chat exchange"""
+    second = decompress_text(second) or ""
+    if table == "journal_entries":
+        return f"{first}\n{second}" if first else second
+    return f"User: {first}\nAssistant: {second}"
+
+
+class OllamaEmbedder:
+    def __init__(self, ollama_url: str = "http://localhost:11434", model: str = EMBEDDING_MODEL):
+        self.ollama_url = ollama_url
+        self.model = model
+        self.dim: Optional[int] = None
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        import aiohttp
+
+        vectors = []
+        timeout = aiohttp.ClientTimeout(total=30)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            for text in texts:
+                async with session.post(f"{self.ollama_url}/api/embeddings",
+                                        json={"model": self.model, "prompt": text}) as response:
+                    response.raise_for_status()
+                    vectors.append((await response.json())["embedding"])
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+        self.dim = matrix.shape[1]
+        return matrix
+
+
+class HashEmbedder:
+    """Deterministic bag-of-words hashing vectors; no model server needed"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                matrix[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        return _normalize(matrix)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def make_embedder(backend: str = EMBEDDING_BACKEND, ollama_url: str = "http://localhost:11434"):
+    if backend == "ollama":
+        return OllamaEmbedder(ollama_url)
+    if backend == "hash":
+        return HashEmbedder()
+    return None
+
+
+class VectorStore:
+    """Per-user append-only float16 matrices, read through cached memmaps"""
+
+    def __init__(self, vector_dir: str = VECTOR_DIR, max_open: int = 256):
+        self.vector_dir = vector_dir
+        self.max_open = max_open
+        self._maps: "OrderedDict[Tuple[str, int], np.memmap]" = OrderedDict()
+        os.makedirs(vector_dir, exist_ok=True)
+
+    def path(self, user_id: str, dim: int) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_-]", "_", user_id)
+        return os.path.join(self.vector_dir, f"{safe}.{dim}.f16")
+
+    def write(self, user_id: str, start_row: int, vectors: np.ndarray):
+        """Write vectors at row start_row (callers hold the embeddings write lock)"""
+        dim = vectors.shape[1]
+        path = self.path(user_id, dim)
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            f.seek(start_row * dim * 2)
+            f.write(vectors.astype(np.float16).tobytes())
+        self._maps.pop((user_id, dim), None)
+
+    def matrix(self, user_id: str, dim: int, rows: int) -> Optional[np.ndarray]:
+        key = (user_id, dim)
+        cached = self._maps.get(key)
+        if cached is None or cached.shape[0] < rows:
+            path = self.path(user_id, dim)
+            if not os.path.exists(path) or os.path.getsize(path) < rows * dim * 2:
+                return None
+            cached = np.memmap(path, dtype=np.float16, mode="r", shape=(rows, dim))
+            self._maps[key] = cached
+            if len(self._maps) > self.max_open:
+                self._maps.popitem(last=False)
+        self._maps.move_to_end(key)
+        return cached[:rows]
+
+    def top_k(self, user_id: str, dim: int, rows: int, query: np.ndarray, k: int,
+              live: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Best k (row, score) pairs, best first; only rows in `live` when given"""
+        matrix = self.matrix(user_id, dim, rows)
+        if matrix is None or rows == 0:
+            return []
+        # float16 has no BLAS kernel; widen a block at a time and score in float32
+        query = query.astype(np.float32)
+        scores = np.empty(rows, dtype=np.float32)
+        for start in range(0, rows, 2048):
+            scores[start:start + 2048] = matrix[start:start + 2048].astype(np.float32) @ query
+        candidates = np.arange(rows) if live is None else live
+        if len(candidates) == 0:
+            return []
+        k = min(k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+
+class EmbeddingService:
+    def __init__(self, db_path: str, embedder, vector_dir: str = VECTOR_DIR, max_queue: int = 10000,
+                 batch_size: int = 32):
+        self.db_path = db_path
+        self.embedder = embedder
+        self.store = VectorStore(vector_dir)
+        self.batch_size = batch_size
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def enqueue(self, user_id: str, table: str, row_id: str, text: str):
+        """Embed a new row in the background; rows dropped when the queue is full are picked up by backfill"""
+        try:
+            self._queue.put_nowait((user_id, table, row_id, text))
+        except asyncio.QueueFull:
+            print(f"Embedding queue full, skipping {table} {row_id}")
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self.add(batch)
+            except Exception as e:
+                print(f"Embedding batch failed: {e}")
+
+    async def add(self, items: List[Tuple[str, str, str, str]]):
+        """Embed and store (user_id, table, row_id, text) items"""
+        if not items:
+            return
+        vectors = await self.embedder.embed([text for _, _, _, text in items])
+        dim = vectors.shape[1]
+        by_user: Dict[str, List[int]] = {}
+        for index, (user_id, _, _, _) in enumerate(items):
+            by_user.setdefault(user_id, []).append(index)
+
+        now = datetime.utcnow().isoformat()
+        async with connect(self.db_path) as db:
+            # The write lock also serializes appends to the vector files across workers
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                for user_id, indexes in by_user.items():
+                    async with db.execute(
+                        "SELECT COALESCE(MAX(row_index) + 1, 0) FROM embeddings WHERE user_id = ? AND dim = ?",
+                        (user_id, dim)
+                    ) as cursor:
+                        (start_row,) = await cursor.fetchone()
+                    self.store.write(user_id, start_row, vectors[indexes])
+                    await db.executemany("""
+                        INSERT OR IGNORE INTO embeddings (user_id, dim, row_index, source_table, source_id, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """, [
+                        (user_id, dim, start_row + offset, items[index][1], items[index][2], now)
+                        for offset, index in enumerate(indexes)
+                    ])
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+    async def search(self, user_id: str, query: str, k: int = 5, min_score: float = 0.0,
+                     exclude_ids: Tuple[str, ...] = (), query_vector: Optional[np.ndarray] = None
+                     ) -> List[Dict[str, Any]]:
+        """Top-k journal entries and conversations most similar to query"""
+        if query_vector is None:
+            query_vector = (await self.embedder.embed([query]))[0]
+        dim = query_vector.shape[0]
+        async with connect(self.db_path) as db:
+            # Rows whose source was archived lose their mapping but keep their
+            # slot in the file; rank only mapped rows so they cannot crowd out hits
+            async with db.execute(
+                "SELECT row_index FROM embeddings WHERE user_id = ? AND dim = ? ORDER BY row_index",
+                (user_id, dim)
+            ) as cursor:
+                live = np.fromiter((row[0] for row in await cursor.fetchall()), dtype=np.int64)
+            rows = int(live[-1]) + 1 if len(live) else 0
+            hits = [hit for hit in self.store.top_k(user_id, dim, rows, query_vector, k + len(exclude_ids),
+                                                    live if len(live) < rows else None)
+                    if hit[1] >= min_score]
+            if not hits:
+                return []
+
+            placeholders = ", ".join("?" for _ in hits)
+            async with db.execute(f"""
+                SELECT row_index, source_table, source_id FROM embeddings
+                WHERE user_id = ? AND dim = ? AND row_index IN ({placeholders})
+            """, (user_id, dim, *[row for row, _ in hits])) as cursor:
+                sources = {row[0]: (row[1], row[2]) for row in await cursor.fetchall()}
+
+            results = []
+            for row, score in hits:
+                if row not in sources or sources[row][1] in exclude_ids:
+                    continue
+                table, source_id = sources[row]
+                async with db.execute(f"{SOURCES[table]} WHERE id = ?", (source_id,)) as cursor:
+                    source = await cursor.fetchone()
+                if source:
+                    results.append({
+                        "table": table,
+                        "id": source_id,
+                        "score": round(score, 4),
+                        "text": source_text(table, source[2], source[3]),
+                    })
+        return results[:k]
+
+    async def backfill(self, batch_size: int = 256) -> int:
+        """Embed every source row that has no vector yet"""
+        embedded = 0
+        for table, select in SOURCES.items():
+            while True:
+                async with connect(self.db_path) as db:
+                    async with db.execute(f"""
+                        {select}
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM embeddings e
+                            WHERE e.source_table = '{table}' AND e.source_id = {table}.id
+                        )
+                        ORDER BY created_at LIMIT ?
+                    """, (batch_size,)) as cursor:
+                        rows = await cursor.fetchall()
+                if not rows:
+                    break
+                await self.add([(user_id, table, row_id, source_text(table, first, second))
+                                for row_id, user_id, first, second in rows])
+                embedded += len(rows)
+        return embedded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Embed journal entries and conversations")
+    parser.add_argument("--db", default="mindmate.db")
+    parser.add_argument("--backfill", action="store_true", required=True)
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND if EMBEDDING_BACKEND != "off" else "ollama",
+                        choices=["ollama", "hash"])
+    args = parser.parse_args(argv)
+    service = EmbeddingService(args.db, make_embedder(args.backend))
+    print(f"Embedded rows: {asyncio.run(service.backfill())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# backend/export.py - Stream a user's full history as NDJSON or CSV
+#
+# Rows are read in keyset pages ordered by (created_at, id), each page on a
+# short-lived connection, so memory stays constant however large the export
+# and no read transaction is held open while a slow client downloads.
+# Archived conversations and insights (see archive.py) come before the hot
+# rows of the same table.
+#
+# Every NDJSON line carries a cursor ("<table>/<created_at>/<id>"); passing
+# the last one received back as ?cursor= resumes an interrupted export after
+# that row. CSV exports one table at a time and the cursor is built from the
+# table name and the last row's created_at and id columns.
+import csv
+import io
+import json
+import os
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import aiosqlite
+
+from archive import ARCHIVED_TABLES, _unpack, archive_path_for
+from database import row_to_dict
+from db_connection import connect
+
+EXPORT_TABLES = ("checkins", "food_logs", "journal_entries", "conversations", "insights")
+PAGE_SIZE = 500
+
+# Internal bookkeeping columns left out of exports
+SKIPPED_COLUMNS = ("version",)
+
+
+def make_cursor(table: str, row: Dict[str, Any]) -> str:
+    return f"{table}/{row['created_at']}/{row['id']}"
+
+
+def parse_cursor(cursor: Optional[str], tables: Iterable[str]) -> Optional[Tuple[str, str, str]]:
+    """(table, created_at, id) from a cursor string; ValueError if malformed"""
+    if not cursor:
+        return None
+    parts = cursor.split("/")
+    if len(parts) != 3 or parts[0] not in tables or not parts[1] or not parts[2]:
+        raise ValueError("Invalid export cursor")
+    return parts[0], parts[1], parts[2]
+
+
+def parse_tables(tables: Optional[str]) -> List[str]:
+    """Requested tables in export order; ValueError on unknown names"""
+    if not tables:
+        return list(EXPORT_TABLES)
+    requested = [table.strip() for table in tables.split(",") if table.strip()]
+    unknown = [table for table in requested if table not in EXPORT_TABLES]
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(unknown)}")
+    return [table for table in EXPORT_TABLES if table in requested]
+
+
+async def _archived_pages(archive_path: str, table: str, user_id: str, after: Tuple[str, str],
+                          page_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    if table not in ARCHIVED_TABLES or not os.path.exists(archive_path):
+        return
+    while True:
+        async with connect(archive_path) as db:
+            async with db.execute(f"""
+                SELECT payload FROM {ARCHIVED_TABLES[table]}
+                WHERE user_id = ? AND (created_at, id) > (?, ?)
+                ORDER BY created_at, id LIMIT ?
+            """, (user_id, *after, page_size)) as cursor:
+                rows = [_unpack(row[0]) for row in await cursor.fetchall()]
+        if not rows:
+            return
+        yield rows
+        after = (rows[-1]["created_at"], rows[-1]["id"])
+
+
+async def _hot_pages(db_path: str, table: str, user_id: str, after: Tuple[str, str],
+                     page_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    while True:
+        async with connect(db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(f"""
+                SELECT * FROM {table}
+                WHERE user_id = ? AND (created_at, id) > (?, ?)
+                ORDER BY created_at, id LIMIT ?
+            """, (user_id, *after, page_size)) as cursor:
+                rows = [row_to_dict(table, row) for row in await cursor.fetchall()]
+        if not rows:
+            return
+        yield rows
+        after = (rows[-1]["created_at"], rows[-1]["id"])
+
+
+async def export_pages(db_path: str, user_id: str, tables: List[str], cursor: Optional[str] = None,
+                       page_size: int = PAGE_SIZE) -> AsyncIterator[Tuple[str, List[Dict[str, Any]]]]:
+    """(table, rows) pages of the user's data, resuming after cursor"""
+    resume = parse_cursor(cursor, tables)
+    archive_path = archive_path_for(db_path)
+    started = resume is None
+    for table in tables:
+        if not started and table != resume[0]:
+            continue
+        after = (resume[1], resume[2]) if not started else ("", "")
+        started = True
+        for pages in (_archived_pages(archive_path, table, user_id, after, page_size),
+                      _hot_pages(db_path, table, user_id, after, page_size)):
+            async for rows in pages:
+                for row in rows:
+                    for column in SKIPPED_COLUMNS:
+                        row.pop(column, None)
+                yield table, rows
+
+
+async def ndjson_stream(pages: AsyncIterator[Tuple[str, List[Dict[str, Any]]]]) -> AsyncIterator[bytes]:
+    async for table, rows in pages:
+        yield "".join(
+            json.dumps({"table": table, "cursor": make_cursor(table, row), "data": row},
+                       separators=(",", ":"), default=str) + "\n"
+            for row in rows
+        ).encode()
+
+
+async def csv_stream(pages: AsyncIterator[Tuple[str, List[Dict[str, Any]]]]) -> AsyncIterator[bytes]:
+    writer = None
+    buffer = io.StringIO()
+    async for table, rows in pages:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()), extrasaction="ignore")
+            writer.writeheader()
+        for row in rows:
+            writer.writerow({
+                key: json.dumps(value) if isinstance(value, (list, dict)) else value
+                for key, value in row.items()
+            })
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """gzip a byte stream, flushing after every chunk so the client sees progress"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
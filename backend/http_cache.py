@@ -0,0 +1,67 @@
+# backend/http_cache.py - ETag / conditional GET helpers for read-heavy endpoints
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Cache-Control policy per kind of route
+CACHE_POLICIES = {
+    # Same for every user and only changes on deploy
+    "static": "public, max-age=86400",
+    # Per-user data: browsers may keep it but must revalidate (cheap 304s)
+    "private": "private, no-cache",
+    # Aggregates that tolerate being a minute stale between revalidations
+    "private-short": "private, max-age=60",
+}
+
+
+def make_etag(*parts: Any) -> str:
+    """Build a weak ETag from the values the response depends on"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match header lists etag (weak comparison)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+def _cache_headers(etag: str, policy: str, last_modified: Optional[str]) -> dict:
+    headers = {"ETag": etag, "Cache-Control": CACHE_POLICIES[policy], "Vary": "Authorization"}
+    if last_modified:
+        try:
+            moment = datetime.fromisoformat(last_modified).replace(tzinfo=timezone.utc)
+            headers["Last-Modified"] = format_datetime(moment, usegmt=True)
+        except ValueError:
+            pass
+    return headers
+
+
+def not_modified(etag: str, policy: str, last_modified: Optional[str] = None) -> Response:
+    return Response(status_code=304, headers=_cache_headers(etag, policy, last_modified))
+
+
+def cached_json(content: Any, etag: str, policy: str, last_modified: Optional[str] = None) -> JSONResponse:
+    return JSONResponse(content=jsonable_encoder(content), headers=_cache_headers(etag, policy, last_modified))
+
+
+def static_etag(content: Any) -> str:
+    """ETag for a constant payload, computed once at import time"""
+    return make_etag(json.dumps(content, sort_keys=True))
@@ -0,0 +1,51 @@
+# backend/ids.py - Time-ordered record IDs
+#
+# New rows get UUIDv7 IDs (RFC 9562): a 48-bit millisecond timestamp
+# followed by random bits, in the usual 36-character form. Consecutive IDs
+# sort in creation order, so inserts land at the right-hand edge of the
+# primary key B-tree instead of splitting random pages as UUID4 does.
+# Within one millisecond a counter in the rand_a bits keeps IDs increasing.
+# Existing UUID4 IDs stay valid; both forms are opaque strings to clients.
+#
+# IDs are stored as 36-character text, not 16-byte BLOBs. bench_ids.py at
+# its default 200k rows: uuid4 text 23.3k rows/s, 335 bytes/row; uuid7 text
+# 40.6k rows/s, 337 bytes/row; uuid7 blob 34.9k rows/s, 295 bytes/row. Time
+# ordering gives the insert gain; a BLOB key would save about 40 bytes a row
+# (12%) but inserts slower here (the text/bytes conversion on every write
+# and lookup outweighs the smaller key), so it is not worth re-keying for.
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def new_id() -> str:
+    """A new UUIDv7 string, increasing within this process"""
+    global _last_ms, _counter
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            _last_ms = ms
+            _counter = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        else:
+            # Same (or an earlier, after a clock step) millisecond: count up from the last ID
+            _counter += 1
+            if _counter > 0xFFF:
+                _last_ms += 1
+                _counter = 0
+        ms, counter = _last_ms, _counter
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand_b
+    return str(uuid.UUID(int=value))
+
+
+def id_timestamp(record_id: str) -> float:
+    """Creation time (Unix seconds) embedded in a UUIDv7; ValueError for other IDs"""
+    value = uuid.UUID(record_id)
+    if value.version != 7:
+        raise ValueError("Not a UUIDv7")
+    return (value.int >> 80) / 1000
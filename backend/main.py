@@ -1,16 +1,19 @@
 # backend/main.py
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional, Dict, Any
 import sqlite3
 import asyncio
 import json
 from datetime import datetime, timedelta
-import uvicorn
 from contextlib import asynccontextmanager
 import hashlib
+import hmac
+import math
 import os
 import uuid
 
@@ -23,26 +26,47 @@ from auth_service import (
 
 # Import our modules
 from models import *
-from database import DatabaseManager
+from database import DatabaseManager, DASHBOARD_FIELDS
+from compression import CompressionMiddleware
+from http_cache import make_etag, etag_matches, not_modified, cached_json, static_etag
+from realtime import Connection, ConnectionManager
+from shared_cache import SharedCache
+from rate_limit import RateLimiter, client_ip
+from write_behind import ConversationWriteBuffer, WRITE_BEHIND_ENABLED
+from archive import run_archive_job, ARCHIVE_AFTER_DAYS
+from weekly_summary import run_weekly_summaries, WEEKLY_SUMMARY_HOUR
+from metrics import metrics
+from embeddings import EmbeddingService, make_embedder
+from semantic_cache import SemanticCache, SEMANTIC_CACHE_ENABLED
+from export import export_pages, ndjson_stream, csv_stream, gzip_stream, parse_cursor, parse_tables
+from bulk_import import import_records, IMPORT_MODELS
+
+# Canned replies for running without a model server (MINDMATE_AI=placeholder)
+class PlaceholderAIService:
+    initialized = False
 
-# Simple AI service placeholder
-class AIService:
     async def initialize(self):
         print("AI service initialized (placeholder)")
     
-    async def chat(self, user_id: str, message: str, context: dict):
+    async def chat(self, user_id: str, message: str, context: dict, memories=None):
         return f"Thanks for your message: {message}. I'm here to help with your wellness journey!"
     
+    async def chat_stream(self, user_id: str, message: str, context: dict, memories=None):
+        response = await self.chat(user_id, message, context)
+        for word in response.split():
+            yield word + " "
+    
     async def generate_daily_insights(self, user_id: str, checkin_id: str):
         return "Great job on completing your check-in today!"
     
     async def analyze_food_mood_correlation(self, user_id: str, days: int):
         return []
     
-    async def generate_weekly_summary(self, user_id: str):
-        return "You're doing great this week!"
+    async def generate_weekly_summary(self, user_id: str, summary: dict = None):
+        # Narratives are stored: no model, no narrative (it stays NULL and is retried)
+        return None
     
-    async def get_meal_suggestions(self, user_id: str, mood: str, energy_level: int):
+    async def get_meal_suggestions(self, user_id: str, mood: str, energy_level: int, favorite_foods=None):
         return ["Try some fruits for natural energy", "Consider a balanced meal with protein"]
     
     async def get_mindful_practices(self, user_id: str, current_mood: str):
@@ -50,22 +74,115 @@ class AIService:
     
     async def generate_journal_reflection(self, content: str):
         return "Your thoughts show self-awareness and growth."
+    
+    async def close(self):
+        pass
+
+def make_ai_service():
+    """The Ollama-backed AIService, or the placeholder when MINDMATE_AI=placeholder.
+
+    A missing dependency (aiohttp) fails startup instead of silently
+    degrading to canned replies.
+    """
+    if os.getenv("MINDMATE_AI", "ollama").lower() == "placeholder":
+        return PlaceholderAIService()
+    from ai_service import AIService
+    return AIService(os.getenv("MINDMATE_OLLAMA_URL", "http://localhost:11434"))
 
 # Initialize services
 db_manager = DatabaseManager()
-ai_service = AIService()
+ai_service = make_ai_service()
+connection_manager = ConnectionManager()
+shared_cache = SharedCache()
+# Buckets are shared through the cache file when several workers serve requests
+rate_limiter = RateLimiter(shared=shared_cache if int(os.getenv("MINDMATE_WORKERS", "1")) > 1 else None)
+# Opt-in (MINDMATE_WRITE_BEHIND=1): chat replies return before the conversation is on disk
+conversation_buffer = ConversationWriteBuffer(db_manager) if WRITE_BEHIND_ENABLED else None
+# Opt-in (MINDMATE_EMBEDDINGS=ollama|hash): recall related journal entries and chats in replies
+_embedder = make_embedder()
+embedding_service = EmbeddingService(db_manager.db_path, _embedder) if _embedder else None
+# Opt-in (MINDMATE_SEMANTIC_CACHE=1, needs embeddings): reuse replies to near-duplicate messages
+semantic_cache = SemanticCache(_embedder) if SEMANTIC_CACHE_ENABLED and _embedder else None
+if SEMANTIC_CACHE_ENABLED and not _embedder:
+    print("Semantic cache needs MINDMATE_EMBEDDINGS; running without it")
 security = HTTPBearer(auto_error=False)
 
 # Configuration
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
 
+# Shared cache lifetimes (seconds)
+AUTH_CACHE_TTL = 300
+CONTEXT_CACHE_TTL = 600
+SUGGESTION_CACHE_TTL = 3600
+
+# Recalled memories passed to chat, and the least similarity worth mentioning
+RECALL_LIMIT = 3
+RECALL_MIN_SCORE = float(os.getenv("MINDMATE_RECALL_MIN_SCORE", "0.35"))
+
+# Hours between in-process archive runs; 0 leaves archiving to cron (python archive.py)
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("MINDMATE_ARCHIVE_INTERVAL_HOURS", "0"))
+
+async def _archive_periodically():
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL_HOURS * 3600)
+        # One worker archives; the lease outlives a missed wake-up, then lapses to another worker
+        if not await shared_cache.acquire_lease("archive", ARCHIVE_INTERVAL_HOURS * 3600 * 1.5):
+            continue
+        try:
+            await run_archive_job(db_manager.db_path, ARCHIVE_AFTER_DAYS)
+        except Exception as e:
+            print(f"Archive job failed: {e}")
+
+async def _weekly_summaries_daily():
+    """Run the weekly summary pipeline at WEEKLY_SUMMARY_HOUR (UTC) every day.
+
+    Daily rather than weekly so a missed Monday is caught up; weeks already
+    summarized only get their numbers re-checked. With several workers only
+    the one holding the "weekly-summaries" lease runs it.
+    """
+    while True:
+        now = datetime.utcnow()
+        next_run = now.replace(hour=WEEKLY_SUMMARY_HOUR, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+        if not await shared_cache.acquire_lease("weekly-summaries", 1.5 * 24 * 3600):
+            continue
+        try:
+            # Numbers only with the placeholder: it has no model to write narratives
+            narrator = None if isinstance(ai_service, PlaceholderAIService) else ai_service
+            await run_weekly_summaries(db_manager.db_path, narrator)
+        except Exception as e:
+            print(f"Weekly summary job failed: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await db_manager.init_db()
-    await ai_service.initialize()
+    await shared_cache.init()
+    shared_cache.subscribe(_relay_worker_event)
+    if conversation_buffer:
+        await conversation_buffer.start()
+    if embedding_service:
+        await embedding_service.start()
+    archive_task = asyncio.create_task(_archive_periodically()) if ARCHIVE_INTERVAL_HOURS > 0 else None
+    summary_task = asyncio.create_task(_weekly_summaries_daily()) if WEEKLY_SUMMARY_HOUR >= 0 else None
+    # Probe the model server in the background so we accept traffic at once;
+    # requests arriving before it finishes get fallback responses
+    ai_init_task = asyncio.create_task(ai_service.initialize())
     yield
+    ai_init_task.cancel()
+    await ai_service.close()
+    if archive_task:
+        archive_task.cancel()
+    if summary_task:
+        summary_task.cancel()
     # Shutdown
+    if embedding_service:
+        await embedding_service.stop()
+    if conversation_buffer:
+        await conversation_buffer.stop()
+    await shared_cache.close()
     await db_manager.close()
 
 app = FastAPI(
@@ -82,8 +199,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified", "Retry-After"],
 )
 
+# Response compression for large list payloads (chat history, journal, trends)
+app.add_middleware(CompressionMiddleware)
+
 # Authentication dependency
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     if not credentials:
@@ -96,27 +217,118 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             detail="Invalid authentication credentials"
         )
     
-    user = await db_manager.get_user(user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
-        )
+    # Existence check is cached across workers; a miss falls back to the DB
+    if not await shared_cache.get(f"auth:{user_id}"):
+        user = await db_manager.get_user(user_id)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found"
+            )
+        await shared_cache.set(f"auth:{user_id}", True, AUTH_CACHE_TTL)
     
     return user_id
 
+def rate_limited(route: str):
+    """Dependency: authenticate, then spend a token from the route's budget.
+
+    Signed-in users are limited per user ID, anonymous callers per IP.
+    """
+    async def dependency(request: Request, user_id: str = Depends(get_current_user)) -> str:
+        key = user_id if user_id != "anonymous" else f"ip:{client_ip(request)}"
+        await rate_limiter.check(route, key)
+        return user_id
+    return dependency
+
+def ip_rate_limited(route: str):
+    """Dependency for unauthenticated routes such as login and signup"""
+    async def dependency(request: Request):
+        await rate_limiter.check(route, f"ip:{client_ip(request)}")
+    return dependency
+
+async def save_conversation(user_id: str, message: str, ai_response: str):
+    """Persist a chat exchange, through the write-behind buffer when enabled"""
+    if conversation_buffer:
+        conversation_id = (await conversation_buffer.add(user_id, message, ai_response))["id"]
+    else:
+        conversation_id = await db_manager.save_conversation(user_id, message, ai_response)
+    if embedding_service:
+        embedding_service.enqueue(user_id, "conversations", conversation_id,
+                                  f"User: {message}\nAssistant: {ai_response}")
+
+async def recall_memories(user_id: str, message: str, vector=None) -> Optional[List[str]]:
+    """Past journal entries and chats related to message, when embeddings are enabled"""
+    if not embedding_service:
+        return None
+    try:
+        hits = await embedding_service.search(user_id, message, RECALL_LIMIT, RECALL_MIN_SCORE,
+                                              query_vector=vector)
+    except Exception as e:
+        print(f"Memory recall failed: {e}")
+        return None
+    return [hit["text"] for hit in hits]
+
+async def cached_reply(user_id: str, message: str, context):
+    """(reply to a near-duplicate message or None, message vector) from the semantic cache"""
+    if not semantic_cache:
+        return None, None
+    try:
+        return await semantic_cache.lookup(user_id, message, context)
+    except Exception as e:
+        print(f"Semantic cache lookup failed: {e}")
+        return None, None
+
+async def get_cached_user_context(user_id: str):
+    key = f"context:{user_id}"
+    context = await shared_cache.get(key)
+    if context is None:
+        context = await db_manager.get_user_context(user_id)
+        await shared_cache.set(key, jsonable_encoder(context), CONTEXT_CACHE_TTL)
+    return context
+
+async def invalidate_user_context(user_id: str):
+    """Call after any write that feeds get_user_context"""
+    await shared_cache.invalidate(f"context:{user_id}")
+
+# Background AI enrichment - results are pushed to the user's open sockets
+async def publish_event(user_id: str, event: dict):
+    """Push to this worker's sockets and relay to the other workers' sockets"""
+    await connection_manager.publish(user_id, event)
+    if int(os.getenv("MINDMATE_WORKERS", "1")) > 1:
+        await shared_cache.broadcast(f"user:{user_id}", event)
+
+async def _relay_worker_event(channel: str, event: dict):
+    if channel.startswith("user:"):
+        await connection_manager.publish(channel[len("user:"):], event)
+
+async def generate_checkin_insights(user_id: str, checkin_id: str):
+    try:
+        insights = await ai_service.generate_daily_insights(user_id, checkin_id)
+        await db_manager.save_insights(user_id, checkin_id, insights)
+        await publish_event(user_id, {
+            "type": "insight.ready",
+            "checkin_id": checkin_id,
+            "content": insights
+        })
+    except Exception as e:
+        print(f"Failed to generate insights: {e}")
+
+async def generate_journal_reflection(user_id: str, entry_id: str, content: str):
+    try:
+        reflection = await ai_service.generate_journal_reflection(content)
+        await db_manager.save_journal_reflection(entry_id, reflection)
+        await publish_event(user_id, {
+            "type": "journal.reflection_ready",
+            "entry_id": entry_id,
+            "reflection": reflection
+        })
+    except Exception as e:
+        print(f"Failed to generate journal reflection: {e}")
+
 # Authentication Routes
-@app.post("/api/auth/signup", response_model=Token)
+@app.post("/api/auth/signup", response_model=Token, dependencies=[Depends(ip_rate_limited("signup"))])
 async def signup(user_data: UserSignup):
     try:
-        # Check if user already exists
-        existing_user = await db_manager.get_user_by_email(user_data.email)
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered"
-            )
-        
         # Hash the password
         hashed_password = get_password_hash(user_data.password)
         
@@ -129,9 +341,14 @@ async def signup(user_data: UserSignup):
             dietary_preferences=user_data.preferences
         )
         
-        # Create user in database
-        user_id = await db_manager.create_user(user_create_data)
-        user = await db_manager.get_user(user_id)
+        # Create user in database; None means the email is already registered
+        user = await db_manager.create_user(user_create_data)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered"
+            )
+        user_id = user["id"]
         
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -159,7 +376,7 @@ async def signup(user_data: UserSignup):
 
 # Replace the existing login endpoint in main.py with this:
 
-@app.post("/api/auth/login", response_model=Token)
+@app.post("/api/auth/login", response_model=Token, dependencies=[Depends(ip_rate_limited("login"))])
 async def login(user_data: UserLogin):
     try:
         # Get user by email
@@ -247,10 +464,29 @@ async def logout(user_id: str = Depends(get_current_user)):
 
 # Add this endpoint after the logout endpoint in main.py (around line 175)
 
+def profile_payload(user: dict) -> dict:
+    """Public profile fields returned by /api/auth/me and /api/dashboard"""
+    return {
+        "id": user["id"],
+        "name": user["name"],
+        "email": user["email"],
+        "age": user.get("age"),
+        "dietary_preferences": user.get("dietary_preferences", []),
+        "mental_health_goals": user.get("mental_health_goals", []),
+        "dietary_restrictions": user.get("dietary_restrictions", []),
+        "timezone": user.get("timezone", "UTC"),
+        "has_completed_onboarding": user.get("has_completed_onboarding", False)
+    }
+
 @app.get("/api/auth/me")
-async def get_current_user_profile(user_id: str = Depends(get_current_user)):
+async def get_current_user_profile(request: Request, user_id: str = Depends(get_current_user)):
     """Get current authenticated user's profile"""
     try:
+        version, changed_at = await db_manager.get_user_state_version(user_id)
+        etag = make_etag("auth-me", user_id, version)
+        if etag_matches(request, etag):
+            return not_modified(etag, "private", changed_at)
+
         user = await db_manager.get_user(user_id)
         if not user:
             raise HTTPException(
@@ -258,17 +494,7 @@ async def get_current_user_profile(user_id: str = Depends(get_current_user)):
                 detail="User not found"
             )
         
-        return {
-            "id": user["id"],
-            "name": user["name"],
-            "email": user["email"],
-            "age": user.get("age"),
-            "dietary_preferences": user.get("dietary_preferences", []),
-            "mental_health_goals": user.get("mental_health_goals", []),
-            "dietary_restrictions": user.get("dietary_restrictions", []),
-            "timezone": user.get("timezone", "UTC"),
-            "has_completed_onboarding": user.get("has_completed_onboarding", False)
-        }
+        return cached_json(profile_payload(user), etag, "private", changed_at)
         
     except HTTPException:
         raise
@@ -289,31 +515,38 @@ async def health_check():
 
 # User Management
 @app.get("/api/users/profile")
-async def get_profile(user_id: str = Depends(get_current_user)):
+async def get_profile(request: Request, user_id: str = Depends(get_current_user)):
+    version, changed_at = await db_manager.get_user_state_version(user_id)
+    etag = make_etag("profile", user_id, version)
+    if etag_matches(request, etag):
+        return not_modified(etag, "private", changed_at)
+
     user = await db_manager.get_user(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return cached_json(user, etag, "private", changed_at)
 
 @app.put("/api/users/profile")
 async def update_profile(user_data: UserUpdate, user_id: str = Depends(get_current_user)):
     await db_manager.update_user(user_id, user_data)
+    await shared_cache.invalidate(f"ai:{user_id}:")
+    await invalidate_user_context(user_id)
     user = await db_manager.get_user(user_id)
     return user
 
 # Daily Check-ins
 @app.post("/api/checkins")
-async def create_checkin(checkin: CheckinCreate, user_id: str = Depends(get_current_user)):
-    checkin_id = await db_manager.create_checkin(user_id, checkin)
+async def create_checkin(
+    checkin: CheckinCreate,
+    background_tasks: BackgroundTasks,
+    user_id: str = Depends(rate_limited("ai"))
+):
+    result = await db_manager.create_checkin(user_id, checkin)
+    await invalidate_user_context(user_id)
     
-    # Generate AI insights
-    try:
-        insights = await ai_service.generate_daily_insights(user_id, checkin_id)
-        await db_manager.save_insights(user_id, checkin_id, insights)
-    except Exception as e:
-        print(f"Failed to generate insights: {e}")
+    # Generate AI insights after responding; delivered as an insight.ready event
+    background_tasks.add_task(generate_checkin_insights, user_id, result["id"])
     
-    result = await db_manager.get_checkin(checkin_id)
     return result
 
 @app.get("/api/checkins")
@@ -350,8 +583,8 @@ async def create_food_log(
     # then try to validate manually
     food_log = FoodLogCreate(**body)
 
-    log_id = await db_manager.create_food_log(user_id, food_log)
-    result = await db_manager.get_food_log(log_id)
+    result = await db_manager.create_food_log(user_id, food_log)
+    await invalidate_user_context(user_id)
     return result
 
 
@@ -366,7 +599,7 @@ async def get_food_logs(
     return logs
 
 @app.post("/api/chat")
-async def chat_with_ai(chat_request: ChatRequest, user_id: str = Depends(get_current_user)):
+async def chat_with_ai(chat_request: ChatRequest, user_id: str = Depends(rate_limited("chat"))):
     try:
         # Validate input
         if not chat_request.message or not chat_request.message.strip():
@@ -375,21 +608,29 @@ async def chat_with_ai(chat_request: ChatRequest, user_id: str = Depends(get_cur
         message = chat_request.message.strip()
         
         # Get user context for personalized responses
-        user_context = await db_manager.get_user_context(user_id)
-        
-        # Generate AI response
-        ai_response = await ai_service.chat(
-            user_id=user_id,
-            message=message,
-            context=user_context
-        )
+        user_context = await get_cached_user_context(user_id)
         
-        # Ensure response is not empty
-        if not ai_response or not ai_response.strip():
-            ai_response = "I'm here to listen. Could you tell me more about what's on your mind?"
+        ai_response, vector = await cached_reply(user_id, message, user_context)
+        if ai_response is None:
+            memories = await recall_memories(user_id, message, vector)
+            
+            # Generate AI response
+            ai_response = await ai_service.chat(
+                user_id=user_id,
+                message=message,
+                context=user_context,
+                memories=memories
+            )
+            
+            # Ensure response is not empty
+            if not ai_response or not ai_response.strip():
+                ai_response = "I'm here to listen. Could you tell me more about what's on your mind?"
+            elif semantic_cache and ai_service.initialized:
+                # Canned replies (model down, placeholder) are never reused
+                semantic_cache.store(user_id, user_context, vector, ai_response.strip(), personal=bool(memories))
         
         # Save conversation
-        await db_manager.save_conversation(user_id, message, ai_response.strip())
+        await save_conversation(user_id, message, ai_response.strip())
         
         return {
             "message": ai_response.strip(),
@@ -404,10 +645,11 @@ async def chat_with_ai(chat_request: ChatRequest, user_id: str = Depends(get_cur
 @app.get("/api/chat/history")
 async def get_chat_history(
     user_id: str = Depends(get_current_user),
-    limit: int = 50
+    limit: int = 50,
+    include_archived: bool = False
 ):
     try:
-        history = await db_manager.get_conversation_history(user_id, limit)
+        history = await db_manager.get_conversation_history(user_id, limit, include_archived)
         # Filter out any conversations with empty messages
         valid_history = [
             conv for conv in history 
@@ -418,59 +660,256 @@ async def get_chat_history(
         print(f"Error getting chat history: {e}")
         return []
 
+@app.get("/api/chat/search")
+async def search_chat_history(
+    q: str,
+    user_id: str = Depends(get_current_user),
+    limit: int = 20,
+    include_archived: bool = False
+):
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Search query cannot be empty")
+    return await db_manager.search_conversations(user_id, q.strip(), min(limit, 100), include_archived)
+
+# Realtime channel
+async def _stream_chat_reply(connection: Connection, user_id: str, request_id, message: str):
+    """Stream one chat reply over the socket and persist the finished exchange"""
+    try:
+        user_context = await get_cached_user_context(user_id)
+        ai_response, vector = await cached_reply(user_id, message, user_context)
+        if ai_response is not None:
+            await connection.send_wait({"type": "chat.token", "id": request_id, "token": ai_response})
+        else:
+            memories = await recall_memories(user_id, message, vector)
+            parts = []
+            async for token in ai_service.chat_stream(user_id=user_id, message=message, context=user_context,
+                                                      memories=memories):
+                parts.append(token)
+                # Waits for queue space, so a slow reader throttles generation
+                await connection.send_wait({"type": "chat.token", "id": request_id, "token": token})
+            
+            ai_response = "".join(parts).strip()
+            if not ai_response:
+                ai_response = "I'm here to listen. Could you tell me more about what's on your mind?"
+            elif semantic_cache and ai_service.initialized:
+                semantic_cache.store(user_id, user_context, vector, ai_response, personal=bool(memories))
+        
+        await save_conversation(user_id, message, ai_response)
+        await connection.send_wait({
+            "type": "chat.done",
+            "id": request_id,
+            "message": ai_response,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+    except Exception as e:
+        print(f"WebSocket chat error: {e}")
+        connection.send({
+            "type": "error",
+            "id": request_id,
+            "detail": "I'm having trouble responding right now. Please try again."
+        })
+
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = None):
+    """Authenticated once per connection; carries chat and server-push events.
+
+    Client messages: {"type": "chat", "id": ..., "message": ...} and {"type": "pong"}.
+    Server messages: chat.token, chat.done, insight.ready,
+    journal.reflection_ready, ping and error.
+    """
+    user_id = verify_token(token) if token else None
+    # Rejections accept first: closing before the handshake turns into a plain
+    # HTTP 403 and the client never sees the close code
+    if user_id is None or not await db_manager.get_user(user_id):
+        await websocket.accept()
+        await websocket.close(code=4401)
+        return
+    # Claim the slot before the first await so concurrent connects respect the cap
+    if not connection_manager.reserve(user_id):
+        await websocket.accept()
+        await websocket.close(code=4429)
+        return
+    
+    try:
+        await websocket.accept()
+    except Exception:
+        connection_manager.release(user_id)
+        raise
+    connection = Connection(websocket, user_id)
+    connection_manager.register(connection)
+    heartbeat = asyncio.create_task(connection_manager.heartbeat(connection))
+    chat_task = None
+    
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                break
+            connection.touch()
+            try:
+                data = json.loads(frame.get("text") or frame.get("bytes") or "")
+            except ValueError:
+                # One bad frame is the client's bug, not a reason to drop the socket
+                connection.send({"type": "error", "detail": "Messages must be JSON objects"})
+                continue
+            kind = data.get("type") if isinstance(data, dict) else None
+            
+            if kind == "chat":
+                message = str(data.get("message") or "").strip()
+                if not message or len(message) > 2000:
+                    connection.send({"type": "error", "id": data.get("id"),
+                                     "detail": "Message must be 1-2000 characters"})
+                elif retry_after := await rate_limiter.try_acquire("chat", user_id):
+                    connection.send({"type": "error", "id": data.get("id"),
+                                     "detail": "Too many requests. Please slow down.",
+                                     "retry_after": max(1, math.ceil(retry_after))})
+                elif chat_task is not None and not chat_task.done():
+                    connection.send({"type": "error", "id": data.get("id"),
+                                     "detail": "Please wait for the current reply to finish"})
+                else:
+                    chat_task = asyncio.create_task(
+                        _stream_chat_reply(connection, user_id, data.get("id"), message))
+            elif kind != "pong":
+                connection.send({"type": "error", "detail": f"Unknown message type: {kind}"})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        heartbeat.cancel()
+        if chat_task is not None:
+            chat_task.cancel()
+        connection_manager.unregister(connection)
+        await connection.close()
+
 # Insights & Analytics
 @app.get("/api/insights/mood-trends")
 async def get_mood_trends(
+    request: Request,
     user_id: str = Depends(get_current_user),
     days: int = 30
 ):
+    version, changed_at = await db_manager.get_user_state_version(user_id)
+    # The window slides daily, so today's date is part of the validator
+    etag = make_etag("mood-trends", user_id, version, days, datetime.utcnow().date())
+    if etag_matches(request, etag):
+        return not_modified(etag, "private-short", changed_at)
+
     trends = await db_manager.get_mood_trends(user_id, days)
-    return {"trends": trends}
+    return cached_json({"trends": trends}, etag, "private-short", changed_at)
+
+@app.get("/api/insights/history")
+async def get_insight_history(
+    user_id: str = Depends(get_current_user),
+    limit: int = 20,
+    include_archived: bool = False
+):
+    insights = await db_manager.get_user_insights(user_id, limit, include_archived)
+    return {"insights": insights}
 
 @app.get("/api/insights/food-mood-correlation")
 async def get_food_mood_correlation(
     user_id: str = Depends(get_current_user),
     days: int = 30
 ):
-    correlations = await ai_service.analyze_food_mood_correlation(user_id, days)
+    since = (datetime.utcnow() - timedelta(days=days)).isoformat()
+    correlations = await db_manager.get_user_food_stats(user_id, since=since, order_by="mood")
     return {"correlations": correlations}
 
 @app.get("/api/insights/weekly-summary")
-async def get_weekly_summary(user_id: str = Depends(get_current_user)):
-    summary = await ai_service.generate_weekly_summary(user_id)
-    return {"summary": summary}
+async def get_weekly_summary(
+    request: Request,
+    user_id: str = Depends(get_current_user),
+    week_start: Optional[str] = None
+):
+    """Latest precomputed summary (see weekly_summary.py); never calls the LLM"""
+    stored = await db_manager.get_weekly_summary(user_id, week_start)
+    if not stored:
+        return {
+            "summary": "Keep checking in - your first weekly summary arrives after a full week of tracking.",
+            "weekly_summary": None
+        }
+
+    etag = make_etag("weekly-summary", user_id, stored["week_start"], stored["updated_at"])
+    if etag_matches(request, etag):
+        return not_modified(etag, "private", stored["updated_at"])
+    weekly_summary = stored["summary"]
+    # Narrative is filled in off-peak; until then the computed insights stand in
+    narrative = stored["narrative"] or " ".join(weekly_summary["key_insights"])
+    return cached_json({"summary": narrative, "weekly_summary": weekly_summary},
+                       etag, "private", stored["updated_at"])
+
+@app.get("/api/dashboard")
+async def get_dashboard(
+    user_id: str = Depends(get_current_user),
+    fields: Optional[str] = None,
+    limit: int = 5,
+    days: int = 7
+):
+    """Everything the landing screen renders in one request.
+
+    `fields` is a comma-separated subset of DASHBOARD_FIELDS (default: all);
+    `limit` caps the list sections and `days` the mood trend window.
+    """
+    selected = [field.strip() for field in fields.split(",") if field.strip()] if fields else list(DASHBOARD_FIELDS)
+    unknown = [field for field in selected if field not in DASHBOARD_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown dashboard fields: {', '.join(unknown)}. Choose from: {', '.join(DASHBOARD_FIELDS)}"
+        )
+
+    dashboard = await db_manager.get_dashboard(user_id, set(selected), min(max(limit, 1), 50), min(max(days, 1), 90))
+    if "user" in dashboard:
+        dashboard["user"] = profile_payload(dashboard["user"]) if dashboard["user"] else None
+    return dashboard
 
 # Suggestions
 @app.get("/api/suggestions/meals")
 async def get_meal_suggestions(
     mood: Optional[str] = None,
     energy_level: Optional[int] = None,
-    user_id: str = Depends(get_current_user)
+    user_id: str = Depends(rate_limited("suggestions"))
 ):
-    suggestions = await ai_service.get_meal_suggestions(user_id, mood, energy_level)
+    key = f"ai:{user_id}:meals:{mood}:{energy_level}"
+    suggestions = await shared_cache.get(key)
+    if suggestions is None:
+        favorite_foods = [
+            stat["food"] for stat in await db_manager.get_user_food_stats(user_id, limit=5, order_by="mood")
+            if stat["avg_mood_delta"] > 0
+        ]
+        suggestions = jsonable_encoder(
+            await ai_service.get_meal_suggestions(user_id, mood, energy_level, favorite_foods))
+        await shared_cache.set(key, suggestions, SUGGESTION_CACHE_TTL)
     return {"suggestions": suggestions}
 
 @app.get("/api/suggestions/mindful-practices")
 async def get_mindful_practices(
     current_mood: Optional[str] = None,
-    user_id: str = Depends(get_current_user)
+    user_id: str = Depends(rate_limited("suggestions"))
 ):
-    practices = await ai_service.get_mindful_practices(user_id, current_mood)
+    key = f"ai:{user_id}:practices:{current_mood}"
+    practices = await shared_cache.get(key)
+    if practices is None:
+        practices = jsonable_encoder(await ai_service.get_mindful_practices(user_id, current_mood))
+        await shared_cache.set(key, practices, SUGGESTION_CACHE_TTL)
     return {"practices": practices}
 
 # Journal
 @app.post("/api/journal")
-async def create_journal_entry(entry: JournalCreate, user_id: str = Depends(get_current_user)):
-    entry_id = await db_manager.create_journal_entry(user_id, entry)
+async def create_journal_entry(
+    entry: JournalCreate,
+    background_tasks: BackgroundTasks,
+    user_id: str = Depends(rate_limited("ai"))
+):
+    result = await db_manager.create_journal_entry(user_id, entry)
+    entry_id = result["id"]
+    await invalidate_user_context(user_id)
     
-    # Generate AI reflection
-    try:
-        reflection = await ai_service.generate_journal_reflection(entry.content)
-        await db_manager.save_journal_reflection(entry_id, reflection)
-    except Exception as e:
-        print(f"Failed to generate journal reflection: {e}")
+    # Generate AI reflection after responding; delivered as a journal.reflection_ready event
+    background_tasks.add_task(generate_journal_reflection, user_id, entry_id, entry.content)
+    if embedding_service:
+        embedding_service.enqueue(user_id, "journal_entries", entry_id,
+                                  f"{entry.title}\n{entry.content}" if entry.title else entry.content)
     
-    result = await db_manager.get_journal_entry(entry_id)
     return result
 
 @app.get("/api/journal")
@@ -482,29 +921,207 @@ async def get_journal_entries(
     entries = await db_manager.get_user_journal_entries(user_id, limit, offset)
     return entries
 
+# Batched writes (offline sync)
+BATCH_MODELS = {
+    "checkin": CheckinCreate,
+    "food_log": FoodLogCreate,
+    "journal": JournalCreate,
+}
+
+async def _enrich_batch_results(user_id: str, results: list):
+    """Generate insights and reflections for newly created batch rows"""
+    for result in results:
+        if result["status"] != "created" or not result["data"]:
+            continue
+        if result["type"] == "checkin":
+            await generate_checkin_insights(user_id, result["data"]["id"])
+        elif result["type"] == "journal":
+            await generate_journal_reflection(user_id, result["data"]["id"], result["data"]["content"])
+
+@app.post("/api/batch")
+async def apply_batch(
+    batch: BatchRequest,
+    background_tasks: BackgroundTasks,
+    user_id: str = Depends(rate_limited("ai"))
+):
+    """Apply many check-ins, food logs and journal entries in one transaction.
+
+    Each operation carries a client-generated client_id; replaying a batch
+    returns the originally stored rows instead of writing duplicates.
+    Invalid operations are reported individually and do not block the rest.
+    """
+    errors = {}
+    valid = []
+    for op in batch.operations:
+        try:
+            valid.append((op.client_id, op.type, BATCH_MODELS[op.type](**op.data)))
+        except ValidationError as e:
+            errors[op.client_id] = e.errors(include_url=False)
+
+    applied = await db_manager.apply_batch(user_id, valid) if valid else []
+    if any(result["status"] == "created" for result in applied):
+        await invalidate_user_context(user_id)
+    by_client_id = {result["client_id"]: result for result in applied}
+
+    results = []
+    for op in batch.operations:
+        if op.client_id in errors:
+            results.append({"client_id": op.client_id, "type": op.type, "status": "error",
+                            "detail": errors[op.client_id]})
+        else:
+            results.append(by_client_id[op.client_id])
+
+    background_tasks.add_task(_enrich_batch_results, user_id, applied)
+    return {"results": results}
+
+# Delta sync
+@app.get("/api/sync")
+async def sync_changes(
+    since: int = 0,
+    limit: int = 500,
+    user_id: str = Depends(get_current_user)
+):
+    """Return check-ins, food logs, journal entries and conversations changed after `since`.
+
+    Clients store the returned version and pass it back as `since`; keep
+    calling while has_more is true.
+    """
+    if since < 0 or not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="since must be >= 0 and limit between 1 and 1000")
+    return await db_manager.get_changes_since(user_id, since, limit)
+
+# Export
+@app.get("/api/export")
+async def export_data(
+    format: str = "ndjson",
+    tables: Optional[str] = None,
+    cursor: Optional[str] = None,
+    compress: bool = False,
+    user_id: str = Depends(rate_limited("export"))
+):
+    """Stream the user's check-ins, food logs, journal entries, conversations and insights.
+
+    format=ndjson (default) streams every table, one {"table", "cursor", "data"}
+    object per line; format=csv needs a single table in `tables`. Pass the
+    last cursor received to resume an interrupted export; compress=true
+    gzips the stream.
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    try:
+        selected = parse_tables(tables)
+        parse_cursor(cursor, selected)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format == "csv" and len(selected) != 1:
+        raise HTTPException(status_code=400, detail="CSV export needs exactly one table")
+
+    pages = export_pages(db_manager.db_path, user_id, selected, cursor)
+    if format == "csv":
+        body, media_type, filename = csv_stream(pages), "text/csv", f"mindmate-{selected[0]}.csv"
+    else:
+        body, media_type, filename = ndjson_stream(pages), "application/x-ndjson", "mindmate-export.ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if compress:
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+# Bulk import
+@app.post("/api/import")
+async def bulk_import(
+    request: Request,
+    format: str = "ndjson",
+    type: Optional[str] = None,
+    user_id: str = Depends(rate_limited("import"))
+):
+    """Import history from another tracker; the request body is streamed, not buffered.
+
+    NDJSON lines carry their own "type" (checkin, food_log or journal); CSV
+    bodies hold a single type given by `type`. No insights or reflections are
+    generated for imported rows.
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    if type is not None and type not in IMPORT_MODELS:
+        raise HTTPException(status_code=400, detail=f"type must be one of {', '.join(IMPORT_MODELS)}")
+    if format == "csv" and type is None:
+        raise HTTPException(status_code=400, detail="CSV imports need a type")
+
+    result = await import_records(db_manager.db_path, user_id, request.stream(), format, type)
+    if sum(result["imported"].values()):
+        await invalidate_user_context(user_id)
+    return result
+
 # Emergency Resources
+# In production, this would be location-based
+EMERGENCY_RESOURCES = {
+    "helplines": [
+        {"name": "National Suicide Prevention Lifeline", "number": "988", "available": "24/7"},
+        {"name": "Crisis Text Line", "number": "Text HOME to 741741", "available": "24/7"},
+        {"name": "NAMI Helpline", "number": "1-800-950-NAMI", "available": "Mon-Fri 10am-10pm ET"}
+    ],
+    "grounding_techniques": [
+        "5-4-3-2-1 technique: Name 5 things you see, 4 you can touch, 3 you hear, 2 you smell, 1 you taste",
+        "Deep breathing: Inhale for 4, hold for 4, exhale for 6",
+        "Progressive muscle relaxation: Tense and release each muscle group"
+    ]
+}
+EMERGENCY_RESOURCES_ETAG = static_etag(EMERGENCY_RESOURCES)
+
 @app.get("/api/emergency/resources")
-async def get_emergency_resources(user_id: str = Depends(get_current_user)):
-    # In production, this would be location-based
-    resources = {
-        "helplines": [
-            {"name": "National Suicide Prevention Lifeline", "number": "988", "available": "24/7"},
-            {"name": "Crisis Text Line", "number": "Text HOME to 741741", "available": "24/7"},
-            {"name": "NAMI Helpline", "number": "1-800-950-NAMI", "available": "Mon-Fri 10am-10pm ET"}
-        ],
-        "grounding_techniques": [
-            "5-4-3-2-1 technique: Name 5 things you see, 4 you can touch, 3 you hear, 2 you smell, 1 you taste",
-            "Deep breathing: Inhale for 4, hold for 4, exhale for 6",
-            "Progressive muscle relaxation: Tense and release each muscle group"
-        ]
-    }
-    return resources
+async def get_emergency_resources(request: Request, user_id: str = Depends(get_current_user)):
+    if etag_matches(request, EMERGENCY_RESOURCES_ETAG):
+        return not_modified(EMERGENCY_RESOURCES_ETAG, "static")
+    return cached_json(EMERGENCY_RESOURCES, EMERGENCY_RESOURCES_ETAG, "static")
+
+# Operational metrics are only served when a token is configured
+METRICS_TOKEN = os.getenv("MINDMATE_METRICS_TOKEN")
+
+@app.get("/api/metrics")
+async def get_metrics(request: Request):
+    """This worker's counters and timings; requires the X-Metrics-Token header"""
+    supplied = request.headers.get("x-metrics-token", "")
+    if not METRICS_TOKEN or not hmac.compare_digest(supplied, METRICS_TOKEN):
+        raise HTTPException(status_code=404, detail="Not Found")
+    snapshot = metrics.snapshot()
+    snapshot["structured_output_success_rate"] = metrics.outcome_rates(
+        "llm_structured_output", "task", success=("ok", "salvaged", "repaired"), failure=("failed",)
+    )
+    snapshot["semantic_cache_hit_rate"] = metrics.outcome_rates(
+        "semantic_cache", "scope", success=("hit",), failure=("miss",)
+    )
+    return snapshot
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
\ No newline at end of file
+    import argparse
+    import uvicorn
+    
+    parser = argparse.ArgumentParser(description="Run the MindMate API")
+    parser.add_argument("--production", action="store_true",
+                        help="run multiple worker processes without auto-reload")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("MINDMATE_WORKERS", "0")),
+                        help="worker processes in production mode (default: one per CPU core)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    
+    if args.production:
+        # Workers share auth/context/AI caches through shared_cache's SQLite file
+        workers = args.workers or os.cpu_count() or 1
+        os.environ["MINDMATE_WORKERS"] = str(workers)
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            log_level="info"
+        )
+    else:
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            reload=True,
+            log_level="info"
+        )
\ No newline at end of file
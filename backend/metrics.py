@@ -0,0 +1,90 @@
+# backend/metrics.py - In-process counters and latency timings
+#
+# Metrics are per worker process and reset on restart; /api/metrics exposes
+# a snapshot for whoever holds MINDMATE_METRICS_TOKEN.
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Tuple
+
+# Latency samples kept per timing series for percentiles
+SAMPLES_PER_SERIES = 1000
+
+SeriesKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, Any]) -> SeriesKey:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def _format(key: SeriesKey) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{label}={value}" for label, value in labels) + "}"
+
+
+def _percentile(ordered, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Metrics:
+    def __init__(self):
+        self.counters: Dict[SeriesKey, float] = {}
+        self.timings: Dict[SeriesKey, Deque[float]] = {}
+        self.timing_totals: Dict[SeriesKey, Tuple[int, float]] = {}
+
+    def increment(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _key(name, labels)
+        samples = self.timings.get(key)
+        if samples is None:
+            samples = self.timings[key] = deque(maxlen=SAMPLES_PER_SERIES)
+        samples.append(seconds)
+        count, total = self.timing_totals.get(key, (0, 0.0))
+        self.timing_totals[key] = (count + 1, total + seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def outcome_rates(self, name: str, group_by: str, success: Tuple[str, ...],
+                      failure: Tuple[str, ...]) -> Dict[str, float]:
+        """Per group_by label, the share of success outcomes among success + failure ones"""
+        totals: Dict[str, float] = {}
+        successes: Dict[str, float] = {}
+        for (series, labels), value in self.counters.items():
+            labels = dict(labels)
+            if series != name or labels.get("outcome") not in success + failure:
+                continue
+            group = labels.get(group_by, "")
+            totals[group] = totals.get(group, 0) + value
+            if labels["outcome"] in success:
+                successes[group] = successes.get(group, 0) + value
+        return {group: round(successes.get(group, 0) / total, 4) for group, total in totals.items() if total}
+
+    def snapshot(self) -> Dict[str, Any]:
+        timings = {}
+        for key, samples in self.timings.items():
+            ordered = sorted(samples)
+            count, total = self.timing_totals[key]
+            timings[_format(key)] = {
+                "count": count,
+                "avg_ms": round(total / count * 1000, 2),
+                "p50_ms": round(_percentile(ordered, 0.50) * 1000, 2),
+                "p95_ms": round(_percentile(ordered, 0.95) * 1000, 2),
+            }
+        return {
+            "counters": {_format(key): value for key, value in sorted(self.counters.items())},
+            "timings": dict(sorted(timings.items())),
+        }
+
+
+metrics = Metrics()
@@ -0,0 +1,345 @@
+# backend/migrations.py - Versioned schema migrations
+#
+# The schema version lives in PRAGMA user_version. On startup migrate() reads
+# it and returns straight away when the file is current; otherwise it applies
+# each newer migration in its own transaction and bumps the version. Add new
+# schema changes as a new function at the end of MIGRATIONS, never by editing
+# an old one. Migration 1 uses IF NOT EXISTS everywhere, so databases created
+# before versioning (user_version 0) upgrade in place.
+import re
+from datetime import datetime
+from typing import List, Optional
+
+from db_connection import connect
+
+
+async def _add_column_if_missing(db, table: str, column: str, declaration: str) -> bool:
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        columns = [row[1] for row in await cursor.fetchall()]
+    if column in columns:
+        return False
+    await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+    return True
+
+
+async def _backfill_change_log(db, table: str):
+    """Give rows written before change tracking existed an initial version"""
+    await db.execute(f"""
+        INSERT INTO change_log (user_id, table_name, row_id, operation, changed_at)
+        SELECT user_id, '{table}', id, 'upsert', created_at FROM {table} ORDER BY created_at
+    """)
+    await db.execute(f"""
+        UPDATE {table} SET version = change_log.version
+        FROM change_log
+        WHERE change_log.table_name = '{table}' AND change_log.row_id = {table}.id
+    """)
+
+
+async def _core_tables(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE,
+            password TEXT,
+            age INTEGER,
+            preferences TEXT DEFAULT '[]',
+            goals TEXT DEFAULT '[]',
+            dietary_restrictions TEXT DEFAULT '[]',
+            timezone TEXT DEFAULT 'UTC',
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            has_completed_onboarding BOOLEAN DEFAULT 0
+        )
+    """)
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS checkins (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            checkin_type TEXT NOT NULL,
+            mood INTEGER NOT NULL,
+            energy_level INTEGER NOT NULL,
+            stress_level INTEGER NOT NULL,
+            sleep_hours REAL,
+            exercise_minutes INTEGER,
+            notes TEXT,
+            gratitude TEXT,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    """)
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS food_logs (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            food_name TEXT NOT NULL,
+            meal_type TEXT NOT NULL,
+            portion_size TEXT,
+            calories INTEGER,
+            mood_before INTEGER,
+            mood_after INTEGER,
+            notes TEXT,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    """)
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            user_message TEXT NOT NULL,
+            ai_response TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    """)
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS journal_entries (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            title TEXT,
+            content TEXT NOT NULL,
+            mood INTEGER,
+            tags TEXT DEFAULT '[]',
+            is_private BOOLEAN DEFAULT 1,
+            ai_reflection TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    """)
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS insights (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            checkin_id TEXT,
+            insight_type TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (checkin_id) REFERENCES checkins (id)
+        )
+    """)
+
+    # Create indexes for better performance
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_checkins_user_date ON checkins(user_id, created_at)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_food_logs_user_date ON food_logs(user_id, created_at)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_conversations_user_date ON conversations(user_id, created_at)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_journal_user_date ON journal_entries(user_id, created_at)")
+
+
+async def _batch_operations(db):
+    """Client-generated operation IDs already applied through /api/batch"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS batch_operations (
+            user_id TEXT NOT NULL,
+            client_id TEXT NOT NULL,
+            operation_type TEXT NOT NULL,
+            record_id TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, client_id)
+        )
+    """)
+
+
+async def _change_log(db):
+    """Change tracking for delta sync: every write to a synced table appends
+    here and stamps the row with the same version"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            version INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            row_id TEXT NOT NULL,
+            operation TEXT NOT NULL,
+            changed_at TEXT NOT NULL
+        )
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_change_log_user_version ON change_log(user_id, version)")
+    for table in ("checkins", "food_logs", "journal_entries", "conversations"):
+        if await _add_column_if_missing(db, table, "version", "INTEGER"):
+            await _backfill_change_log(db, table)
+
+
+# database.split_food_names as it was when migration 4 was written
+_FOOD_SEPARATORS_V4 = re.compile(r"\s*(?:[,;+&/]|\band\b)\s*", re.IGNORECASE)
+
+
+def _food_names_v4(food_name: Optional[str]) -> List[str]:
+    names = []
+    for part in _FOOD_SEPARATORS_V4.split(food_name or ""):
+        name = " ".join(re.sub(r"[^\w\s'-]", " ", part.lower()).split()).strip("'-")
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+async def _food_catalog(db):
+    """Canonical food names, log <-> food links and per-user food aggregates"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS foods (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            created_at TEXT NOT NULL
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS food_log_items (
+            log_id TEXT NOT NULL,
+            food_id INTEGER NOT NULL,
+            PRIMARY KEY (log_id, food_id),
+            FOREIGN KEY (log_id) REFERENCES food_logs (id),
+            FOREIGN KEY (food_id) REFERENCES foods (id)
+        ) WITHOUT ROWID
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_food_log_items_food ON food_log_items(food_id)")
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_food_stats (
+            user_id TEXT NOT NULL,
+            food_id INTEGER NOT NULL,
+            log_count INTEGER NOT NULL,
+            mood_delta_sum INTEGER NOT NULL,
+            mood_delta_count INTEGER NOT NULL,
+            last_eaten_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, food_id),
+            FOREIGN KEY (food_id) REFERENCES foods (id)
+        ) WITHOUT ROWID
+    """)
+    # Link logs written before the catalog existed and aggregate them. The
+    # SQL and name splitting are copied here rather than shared with
+    # database.py, so later changes there cannot alter this migration.
+    async with db.execute("""
+        SELECT id, food_name FROM food_logs
+        WHERE NOT EXISTS (SELECT 1 FROM food_log_items WHERE log_id = food_logs.id)
+    """) as cursor:
+        links = [(log_id, name) for log_id, food_name in await cursor.fetchall()
+                 for name in _food_names_v4(food_name)]
+    names = sorted({name for _, name in links})
+    now = datetime.utcnow().isoformat()
+    await db.executemany("INSERT OR IGNORE INTO foods (name, created_at) VALUES (?, ?)",
+                         [(name, now) for name in names])
+    food_ids = {}
+    for start in range(0, len(names), 500):
+        chunk = names[start:start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        async with db.execute(f"SELECT name, id FROM foods WHERE name IN ({placeholders})", chunk) as cursor:
+            food_ids.update(await cursor.fetchall())
+    await db.executemany("INSERT OR IGNORE INTO food_log_items (log_id, food_id) VALUES (?, ?)",
+                         [(log_id, food_ids[name]) for log_id, name in links])
+    await db.execute("DELETE FROM user_food_stats")
+    await db.execute("""
+        INSERT INTO user_food_stats (user_id, food_id, log_count, mood_delta_sum,
+                                     mood_delta_count, last_eaten_at)
+        SELECT fl.user_id, li.food_id, COUNT(*),
+               COALESCE(SUM(fl.mood_after - fl.mood_before), 0),
+               COUNT(fl.mood_after - fl.mood_before),
+               MAX(fl.created_at)
+        FROM food_log_items li
+        JOIN food_logs fl ON fl.id = li.log_id
+        GROUP BY fl.user_id, li.food_id
+    """)
+
+
+async def _weekly_summaries(db):
+    """Precomputed WeeklySummary per user and week, plus its LLM narrative"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS weekly_summaries (
+            user_id TEXT NOT NULL,
+            week_start TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            narrative TEXT,
+            narrative_claimed_at TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, week_start),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        ) WITHOUT ROWID
+    """)
+
+
+async def _embeddings(db):
+    """Row of each user's vector file (see embeddings.py) -> source journal entry or conversation"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS embeddings (
+            user_id TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            row_index INTEGER NOT NULL,
+            source_table TEXT NOT NULL,
+            source_id TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, dim, row_index)
+        ) WITHOUT ROWID
+    """)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_embeddings_source ON embeddings (source_table, source_id)"
+    )
+
+
+async def _insights_user_date(db):
+    """Index for reading a user's insights in date order (history, export)"""
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_insights_user_date ON insights(user_id, created_at)")
+
+
+async def _recompute_progress(db):
+    """Users recompute.py has finished per job, so an interrupted run can resume"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS recompute_progress (
+            job TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            completed_at TEXT NOT NULL,
+            PRIMARY KEY (job, user_id)
+        ) WITHOUT ROWID
+    """)
+
+
+# (version, description, migration); versions must be consecutive
+MIGRATIONS = [
+    (1, "core tables", _core_tables),
+    (2, "batch operations", _batch_operations),
+    (3, "change log", _change_log),
+    (4, "food catalog", _food_catalog),
+    (5, "weekly summaries", _weekly_summaries),
+    (6, "embeddings", _embeddings),
+    (7, "insights user/date index", _insights_user_date),
+    (8, "recompute progress", _recompute_progress),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def migrate(db_path: str) -> List[int]:
+    """Bring the database up to SCHEMA_VERSION; returns the versions applied"""
+    applied = []
+    async with connect(db_path) as db:
+        # Stored in the file: every later connection, in any worker, uses WAL
+        await db.execute("PRAGMA journal_mode=WAL")
+        async with db.execute("PRAGMA user_version") as cursor:
+            (current,) = await cursor.fetchone()
+        if current >= SCHEMA_VERSION:
+            return applied
+
+        for version, description, migration in MIGRATIONS:
+            if version <= current:
+                continue
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                # Another worker may have migrated while we waited for the lock
+                async with db.execute("PRAGMA user_version") as cursor:
+                    (current,) = await cursor.fetchone()
+                if version <= current:
+                    await db.rollback()
+                    continue
+                await migration(db)
+                await db.execute(f"PRAGMA user_version = {version}")
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+            applied.append(version)
+            print(f"Applied migration {version} ({description}) at {datetime.utcnow().isoformat()}")
+    return applied
@@ -0,0 +1,87 @@
+# backend/model_keepalive.py - Keep LLM models loaded while traffic is expected
+#
+# Ollama unloads a model once it has been idle for its keep_alive period,
+# and the next request then pays the full load time. ModelKeepAlive tracks
+# when each model was last used and refreshes it with a no-op load request
+# shortly before keep_alive would expire - but only while there is traffic to
+# serve: recently (active_window) or, going by an hour-of-day histogram of
+# past requests, usually at this hour. Quiet periods still unload models and
+# free the memory.
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Set
+
+KEEP_ALIVE_SECONDS = int(os.getenv("MINDMATE_MODEL_KEEP_ALIVE", "600"))
+ACTIVE_WINDOW_SECONDS = int(os.getenv("MINDMATE_KEEPALIVE_ACTIVE_WINDOW", "7200"))
+
+
+class ModelKeepAlive:
+    def __init__(self, ping: Callable[[str], Awaitable[bool]], keep_alive: float = KEEP_ALIVE_SECONDS,
+                 active_window: float = ACTIVE_WINDOW_SECONDS, check_interval: float = 60.0):
+        self.ping = ping
+        self.keep_alive = keep_alive
+        self.active_window = active_window
+        self.check_interval = check_interval
+        self.models: Set[str] = set()
+        self.last_used: Dict[str, float] = {}
+        self.last_loaded: Dict[str, float] = {}
+        # Requests per UTC hour of day, decayed daily so old patterns fade
+        self.hourly = [0.0] * 24
+        self._day = datetime.utcnow().date()
+        self._task = None
+
+    def touch(self, model: str):
+        """Record a request to model (which also keeps it loaded)"""
+        now = time.time()
+        self.last_used[model] = now
+        self.last_loaded[model] = now
+        today = datetime.utcnow().date()
+        if today != self._day:
+            decay = 0.8 ** (today - self._day).days
+            self.hourly = [count * decay for count in self.hourly]
+            self._day = today
+        self.hourly[datetime.utcnow().hour] += 1
+
+    def loaded(self, model: str):
+        self.last_loaded[model] = time.time()
+
+    def _busy_hour(self) -> bool:
+        """True if this hour usually sees at least an average hour's traffic"""
+        total = sum(self.hourly)
+        return total >= 24 and self.hourly[datetime.utcnow().hour] >= total / 24
+
+    def due(self, now: float = None) -> List[str]:
+        """Models whose keep_alive is about to lapse while traffic is expected"""
+        now = now or time.time()
+        busy_hour = self._busy_hour()
+        due = []
+        for model in self.models:
+            # Refresh with a check interval to spare before Ollama's timer runs out
+            if now - self.last_loaded.get(model, 0) < self.keep_alive - 2 * self.check_interval:
+                continue
+            if busy_hour or now - self.last_used.get(model, 0) < self.active_window:
+                due.append(model)
+        return due
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            for model in self.due():
+                if await self.ping(model):
+                    self.loaded(model)
+
+    def start(self, models: Iterable[str]):
+        self.models = set(models)
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
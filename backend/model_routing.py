@@ -0,0 +1,94 @@
+# backend/model_routing.py - Per-task model choice and generation budgets
+#
+# Each kind of generation (chat, one-line insights, reflections, structured
+# suggestions...) gets its own model tier, token cap, stop sequences,
+# temperature and timeout instead of one setting for everything. Defaults
+# live in DEFAULT_POLICIES; a JSON file (MINDMATE_MODEL_POLICY, default
+# model_policy.json) can override any of them, e.g.
+#
+#   {"tiers": {"small": "qwen2.5:1.5b"},
+#    "tasks": {"insight": {"num_predict": 60}, "chat": {"tier": "large"}}}
+#
+# See model_policy.example.json for the full shape.
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+POLICY_FILE = os.getenv("MINDMATE_MODEL_POLICY", "model_policy.json")
+
+# tier -> model; tiers missing from the server fall back to "standard"
+DEFAULT_TIERS = {
+    "small": "llama3.2:1b",
+    "standard": "llama3.2:3b",
+}
+
+# task -> generation policy (timeout in seconds)
+DEFAULT_POLICIES: Dict[str, Dict[str, Any]] = {
+    "chat": {"tier": "standard", "num_predict": 400, "temperature": 0.7, "top_p": 0.9, "stop": [], "timeout": 30},
+    "insight": {"tier": "small", "num_predict": 80, "temperature": 0.7, "top_p": 0.9,
+                "stop": ["\n\n"], "timeout": 10},
+    "reflection": {"tier": "small", "num_predict": 160, "temperature": 0.7, "top_p": 0.9,
+                   "stop": ["\n\n\n"], "timeout": 15},
+    "weekly_summary": {"tier": "small", "num_predict": 200, "temperature": 0.7, "top_p": 0.9,
+                       "stop": ["\n\n\n"], "timeout": 20},
+    "meals": {"tier": "standard", "num_predict": 450, "temperature": 0.4, "top_p": 0.9, "stop": [], "timeout": 30},
+    "practices": {"tier": "standard", "num_predict": 450, "temperature": 0.4, "top_p": 0.9,
+                  "stop": [], "timeout": 30},
+    # Second attempt after an unparseable structured reply
+    "repair": {"tier": "standard", "num_predict": 350, "temperature": 0.2, "top_p": 0.9, "stop": [], "timeout": 20},
+}
+
+
+class ModelRouter:
+    def __init__(self, policy_file: Optional[str] = POLICY_FILE):
+        self.tiers = dict(DEFAULT_TIERS)
+        self.policies = {task: dict(policy) for task, policy in DEFAULT_POLICIES.items()}
+        # tier -> model actually served, filled in by resolve()
+        self.models: Dict[str, str] = dict(self.tiers)
+        if policy_file and os.path.exists(policy_file):
+            self.load(policy_file)
+
+    def load(self, policy_file: str):
+        with open(policy_file) as f:
+            config = json.load(f)
+        self.tiers.update(config.get("tiers", {}))
+        for task, overrides in config.get("tasks", {}).items():
+            self.policies.setdefault(task, dict(DEFAULT_POLICIES["chat"])).update(overrides)
+        self.models = dict(self.tiers)
+
+    def resolve(self, available: List[str], fallback: str) -> Dict[str, str]:
+        """Map tiers onto the models the server has; returns tier -> model"""
+        standard = self.tiers.get("standard")
+        if standard not in available:
+            standard = fallback if fallback in available else (available[0] if available else fallback)
+        self.models = {
+            tier: model if model in available else standard
+            for tier, model in self.tiers.items()
+        }
+        return self.models
+
+    def policy(self, task: str) -> Dict[str, Any]:
+        return self.policies.get(task) or self.policies["chat"]
+
+    def model(self, task: str) -> str:
+        tier = self.policy(task)["tier"]
+        return self.models.get(tier) or self.models["standard"]
+
+    def request(self, task: str, messages: List[Dict[str, str]], stream: bool = False,
+                format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Ollama /api/chat body for a task"""
+        policy = self.policy(task)
+        options = {
+            "temperature": policy["temperature"],
+            "top_p": policy["top_p"],
+            "num_predict": policy["num_predict"],
+        }
+        if policy.get("stop"):
+            options["stop"] = policy["stop"]
+        data = {"model": self.model(task), "messages": messages, "stream": stream, "options": options}
+        if format is not None:
+            data["format"] = format
+        return data
+
+    def timeout(self, task: str) -> float:
+        return self.policy(task)["timeout"]
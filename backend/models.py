@@ -143,6 +143,15 @@ class JournalResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+# Batch Models
+class BatchOperation(BaseModel):
+    client_id: str = Field(..., min_length=1, max_length=100)  # client-generated, used for idempotency
+    type: str = Field(..., pattern=r'^(checkin|food_log|journal)$')
+    data: Dict[str, Any]
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=200)
+
 # Insights Models
 class MoodTrend(BaseModel):
     date: str
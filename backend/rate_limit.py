@@ -0,0 +1,112 @@
+# backend/rate_limit.py - Token bucket rate limiting
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from shared_cache import SharedCache
+
+# route -> (burst capacity, tokens refilled per minute)
+ROUTE_LIMITS: Dict[str, Tuple[float, float]] = {
+    "chat": (20, 20),            # LLM generation
+    "suggestions": (10, 10),     # LLM generation
+    "ai": (30, 30),              # check-ins/journal entries that trigger insights/reflections
+    "login": (10, 5),            # bcrypt verification, keyed by IP
+    "signup": (5, 2),            # bcrypt hashing, keyed by IP
+    "export": (5, 2),            # full-history exports
+    "import": (5, 2),            # bulk imports from other trackers
+}
+
+
+class RateLimiter:
+    """Token buckets keyed by (route, client key) with O(1) checks.
+
+    With a SharedCache (multi-worker mode) the buckets live in its SQLite
+    file and every worker spends from the same budget, whichever worker a
+    client's connections land on. Without one, or if the shared file cannot
+    be reached, buckets live in this process.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]] = None, shared: Optional[SharedCache] = None,
+                 max_keys: int = 100000):
+        self.limits = {}
+        for route, (capacity, per_minute) in (limits or ROUTE_LIMITS).items():
+            if capacity < 1 or per_minute <= 0:
+                raise ValueError(f"Rate limit for {route} needs capacity >= 1 and a positive refill rate")
+            self.limits[route] = (float(capacity), per_minute / 60.0)
+        self.shared = shared
+        self.max_keys = max_keys
+        # (route, key) -> [tokens, last refill timestamp], least recently used first
+        self.buckets: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+
+    async def try_acquire(self, route: str, key: str, cost: float = 1.0) -> float:
+        """Take cost tokens; returns 0 on success or seconds until enough tokens exist."""
+        capacity, rate = self.limits[route]
+        if self.shared is not None:
+            try:
+                retry_after = await self.shared.take_tokens(f"{route}:{key}", capacity, rate, cost)
+                if retry_after is not None:
+                    return retry_after
+            except Exception as e:
+                print(f"Shared rate limit unavailable, using this worker's buckets: {e}")
+        return self._take_local(route, key, capacity, rate, cost)
+
+    def _take_local(self, route: str, key: str, capacity: float, rate: float, cost: float) -> float:
+        now = time.monotonic()
+        self._expire(now)
+        bucket = self.buckets.get((route, key))
+        if bucket is None:
+            if len(self.buckets) >= self.max_keys:
+                # Still full of partly drained buckets (e.g. many distinct abusive keys)
+                self.buckets.popitem(last=False)
+            bucket = self.buckets[(route, key)] = [capacity, now]
+        else:
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            self.buckets.move_to_end((route, key))
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return 0.0
+        return (cost - bucket[0]) / rate
+
+    def _expire(self, now: float, limit: int = 2):
+        """Forget up to limit least recently used buckets that have refilled completely.
+
+        Buckets are kept in update order, so the refilled ones collect at the
+        front; a couple per call keeps the dict small without a full sweep.
+        """
+        for _ in range(limit):
+            if not self.buckets:
+                return
+            (route, key), (tokens, updated) = next(iter(self.buckets.items()))
+            capacity, rate = self.limits[route]
+            if tokens + (now - updated) * rate < capacity:
+                return
+            del self.buckets[(route, key)]
+
+    async def check(self, route: str, key: str):
+        """Raise 429 with Retry-After when the bucket is empty"""
+        retry_after = await self.try_acquire(route, key)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests. Please slow down.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+
+
+# Only honour X-Forwarded-For behind a trusted reverse proxy; otherwise
+# clients could dodge IP limits by sending a different header each time
+TRUST_PROXY = os.getenv("MINDMATE_TRUST_PROXY", "0") == "1"
+
+
+def client_ip(request: Request) -> str:
+    if TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
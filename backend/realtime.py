@@ -0,0 +1,128 @@
+# backend/realtime.py - WebSocket connection registry and server-push events
+import asyncio
+import os
+from collections import defaultdict
+from typing import Any, Dict, Set
+
+from fastapi import WebSocket
+
+MAX_CONNECTIONS_PER_USER = int(os.getenv("MINDMATE_WS_MAX_PER_USER", "3"))
+HEARTBEAT_INTERVAL = float(os.getenv("MINDMATE_WS_HEARTBEAT", "25"))
+# A client that has not sent anything (including pongs) for this long is dropped
+IDLE_TIMEOUT = HEARTBEAT_INTERVAL * 3
+# Outgoing messages buffered per connection before we treat the client as too slow
+SEND_QUEUE_SIZE = 256
+
+
+class Connection:
+    """One authenticated socket with a bounded outgoing queue.
+
+    All writes go through the queue and a single sender task, so a slow
+    client never blocks the code that publishes to it.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: str):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.last_seen = asyncio.get_running_loop().time()
+        self.closed = False
+        self._sender = asyncio.create_task(self._send_loop())
+
+    async def _send_loop(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                if message is None:
+                    break
+                await self.websocket.send_json(message)
+        except Exception:
+            # Socket went away; the receive loop notices and unregisters us
+            self.closed = True
+
+    def send(self, message: Dict[str, Any]) -> bool:
+        """Queue a message; returns False if the client cannot keep up."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def send_wait(self, message: Dict[str, Any]):
+        """Queue a message, waiting for room (used for chat token streams)."""
+        if not self.closed:
+            await self.queue.put(message)
+
+    def touch(self):
+        self.last_seen = asyncio.get_running_loop().time()
+
+    async def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        self._sender.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+class ConnectionManager:
+    def __init__(self, max_per_user: int = MAX_CONNECTIONS_PER_USER):
+        self.max_per_user = max_per_user
+        self.connections: Dict[str, Set[Connection]] = defaultdict(set)
+        # Slots claimed by sockets still in their handshake
+        self.reserved: Dict[str, int] = defaultdict(int)
+
+    def reserve(self, user_id: str) -> bool:
+        """Claim a slot before awaiting the handshake; False when the user is at the cap.
+
+        Check and claim happen without an await in between, so concurrent
+        connects cannot both pass the check.
+        """
+        if len(self.connections.get(user_id, ())) + self.reserved.get(user_id, 0) >= self.max_per_user:
+            return False
+        self.reserved[user_id] += 1
+        return True
+
+    def release(self, user_id: str):
+        """Give back a reserved slot whose handshake failed"""
+        if self.reserved.get(user_id, 0) > 1:
+            self.reserved[user_id] -= 1
+        else:
+            self.reserved.pop(user_id, None)
+
+    def register(self, connection: Connection):
+        """Turn the user's reserved slot into a registered connection"""
+        self.release(connection.user_id)
+        self.connections[connection.user_id].add(connection)
+
+    def unregister(self, connection: Connection):
+        user_connections = self.connections.get(connection.user_id)
+        if user_connections is not None:
+            user_connections.discard(connection)
+            if not user_connections:
+                del self.connections[connection.user_id]
+
+    async def publish(self, user_id: str, event: Dict[str, Any]):
+        """Push an event to every open socket of a user.
+
+        Connections whose queue is full are closed rather than letting their
+        backlog grow without bound; the client reconnects and resyncs.
+        """
+        for connection in list(self.connections.get(user_id, ())):
+            if not connection.send(event):
+                self.unregister(connection)
+                await connection.close(code=1013)
+
+    async def heartbeat(self, connection: Connection):
+        """Ping periodically and drop the connection once it goes idle"""
+        loop = asyncio.get_running_loop()
+        while not connection.closed:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            if loop.time() - connection.last_seen > IDLE_TIMEOUT:
+                await connection.close(code=1001)
+                break
+            connection.send({"type": "ping"})
@@ -0,0 +1,251 @@
+# backend/recompute.py - Rebuild derived data for every user in parallel
+#
+# Derived tables are normally kept up to date one write (or one week) at a
+# time. After a backfill or an algorithm change this recomputes them across
+# the whole user base: users are split into batches, a process pool with one
+# worker per core computes each batch from a read-only connection, and the
+# parent writes every finished batch back in one transaction. The parent is
+# the only writer, so workers never wait on SQLite's write lock.
+#
+# Jobs:
+#   food_stats        per-user food aggregates (user_food_stats)
+#   weekly_summaries  the numeric WeeklySummary of every complete week in each
+#                     user's history (narratives of changed weeks are reset
+#                     and regenerated by weekly_summary.py)
+#
+# Each batch's results and its recompute_progress rows commit together, so
+# an interrupted run continues where it stopped with --resume.
+#
+# Usage:
+#   python recompute.py                          # all jobs, one worker per core
+#   python recompute.py --jobs weekly_summaries --workers 4
+#   python recompute.py --resume                 # continue an interrupted run
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+from database import DatabaseManager
+from db_connection import connect
+from weekly_summary import MOOD_SCORES, UPSERT_SUMMARY_SQL, _build_summary, last_complete_week
+
+JOBS = ("food_stats", "weekly_summaries")
+BATCH_SIZE = 200
+
+
+def _connect_read_only(db_path: str) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True, timeout=30)
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+
+def _week_of(created_at: str) -> date:
+    day = date.fromisoformat(created_at[:10])
+    return day - timedelta(days=day.weekday())
+
+
+def user_food_stats(conn: sqlite3.Connection, user_id: str) -> List[tuple]:
+    """user_food_stats rows for one user (same aggregates as DatabaseManager._rebuild_food_stats)"""
+    return conn.execute("""
+        SELECT fl.user_id, li.food_id, COUNT(*),
+               COALESCE(SUM(fl.mood_after - fl.mood_before), 0),
+               COUNT(fl.mood_after - fl.mood_before),
+               MAX(fl.created_at)
+        FROM food_logs fl
+        JOIN food_log_items li ON li.log_id = fl.id
+        WHERE fl.user_id = ?
+        GROUP BY li.food_id
+    """, (user_id,)).fetchall()
+
+
+def user_weekly_summaries(conn: sqlite3.Connection, user_id: str, last_week: date) -> Dict[str, Dict[str, Any]]:
+    """week_start -> WeeklySummary dict for every complete week with a check-in.
+
+    Streams the user's rows once and matches compute_weekly_summaries() in
+    weekly_summary.py, which does the same for one week across all users.
+    """
+    end = (last_week + timedelta(days=7)).isoformat()
+    weeks: Dict[date, Dict[str, Any]] = {}
+    for created_at, mood, stress, sleep in conn.execute("""
+        SELECT created_at, mood, stress_level, sleep_hours FROM checkins
+        WHERE user_id = ? AND created_at < ?
+    """, (user_id, end)):
+        week = weeks.setdefault(_week_of(created_at), {"scores": [], "stress": [], "sleep": [], "moods": Counter()})
+        if mood in MOOD_SCORES:
+            week["scores"].append(MOOD_SCORES[mood])
+        if stress is not None:
+            week["stress"].append(stress)
+        if sleep is not None:
+            week["sleep"].append(sleep)
+        week["moods"][mood] += 1
+    if not weeks:
+        return {}
+
+    food: Dict[date, Dict[str, int]] = {}
+    for created_at, mindful in conn.execute("""
+        SELECT created_at, mood_before IS NOT NULL AND mood_after IS NOT NULL FROM food_logs
+        WHERE user_id = ? AND created_at < ?
+    """, (user_id, end)):
+        stats = food.setdefault(_week_of(created_at), {"logs": 0, "mindful_logs": 0})
+        stats["logs"] += 1
+        stats["mindful_logs"] += mindful
+
+    deltas: Dict[date, Dict[str, List[int]]] = {}
+    for created_at, name, delta in conn.execute("""
+        SELECT fl.created_at, f.name, fl.mood_after - fl.mood_before
+        FROM food_logs fl
+        JOIN food_log_items li ON li.log_id = fl.id
+        JOIN foods f ON f.id = li.food_id
+        WHERE fl.user_id = ? AND fl.created_at < ?
+          AND fl.mood_before IS NOT NULL AND fl.mood_after IS NOT NULL
+    """, (user_id, end)):
+        deltas.setdefault(_week_of(created_at), {}).setdefault(name, []).append(delta)
+
+    summaries = {}
+    for week_start, week in weeks.items():
+        previous = weeks.get(week_start - timedelta(days=7))
+        stats = {
+            "checkins": sum(week["moods"].values()),
+            "avg_mood": _mean(week["scores"]),
+            "previous_avg_mood": _mean(previous["scores"]) if previous else None,
+            "avg_stress": _mean(week["stress"]),
+            "avg_sleep": _mean(week["sleep"]),
+        }
+        moods = [mood for mood, _ in sorted(week["moods"].items(), key=lambda item: (-item[1], str(item[0])))]
+        averages = {name: _mean(values) for name, values in deltas.get(week_start, {}).items()}
+        best = min((name for name, average in averages.items() if average > 0),
+                   key=lambda name: (-averages[name], name), default=None)
+        summaries[week_start.isoformat()] = _build_summary(
+            stats, moods, food.get(week_start), best,
+            week_start.isoformat(), (week_start + timedelta(days=6)).isoformat()
+        )
+    return summaries
+
+
+def compute_batch(db_path: str, jobs: List[str], user_ids: List[str], last_week: date) -> Dict[str, Any]:
+    """Worker entry point: derived data for a batch of users, read-only"""
+    conn = _connect_read_only(db_path)
+    try:
+        results: Dict[str, Any] = {"user_ids": user_ids}
+        if "food_stats" in jobs:
+            results["food_stats"] = [row for user_id in user_ids for row in user_food_stats(conn, user_id)]
+        if "weekly_summaries" in jobs:
+            results["weekly_summaries"] = [
+                (user_id, week_start, json.dumps(summary))
+                for user_id in user_ids
+                for week_start, summary in user_weekly_summaries(conn, user_id, last_week).items()
+            ]
+        return results
+    finally:
+        conn.close()
+
+
+def write_batch(conn: sqlite3.Connection, jobs: List[str], results: Dict[str, Any]):
+    """Store one batch's results and mark its users done, in a single transaction"""
+    user_ids = results["user_ids"]
+    now = datetime.utcnow().isoformat()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if "food_stats" in jobs:
+            conn.executemany("DELETE FROM user_food_stats WHERE user_id = ?", [(user_id,) for user_id in user_ids])
+            conn.executemany("""
+                INSERT INTO user_food_stats (user_id, food_id, log_count, mood_delta_sum,
+                                             mood_delta_count, last_eaten_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, results["food_stats"])
+        if "weekly_summaries" in jobs:
+            conn.executemany(UPSERT_SUMMARY_SQL, [
+                (user_id, week_start, summary, now, now)
+                for user_id, week_start, summary in results["weekly_summaries"]
+            ])
+        conn.executemany(
+            "INSERT OR REPLACE INTO recompute_progress (job, user_id, completed_at) VALUES (?, ?, ?)",
+            [(job, user_id, now) for job in jobs for user_id in user_ids]
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+async def _prepare(db_path: str, jobs: List[str]):
+    await DatabaseManager(db_path).init_db()
+    if "food_stats" in jobs:
+        # Catalog links are inputs to the food stats; add any that are missing first
+        async with connect(db_path) as db:
+            await db.execute("BEGIN IMMEDIATE")
+            await DatabaseManager._link_food_logs(db, await DatabaseManager._unlinked_food_logs(db),
+                                                  update_stats=False)
+            await db.commit()
+
+
+def _pending_users(conn: sqlite3.Connection, jobs: List[str]) -> List[str]:
+    placeholders = ", ".join("?" for _ in jobs)
+    return [row[0] for row in conn.execute(f"""
+        SELECT id FROM users
+        WHERE (SELECT COUNT(*) FROM recompute_progress
+               WHERE user_id = users.id AND job IN ({placeholders})) < ?
+        ORDER BY id
+    """, (*jobs, len(jobs)))]
+
+
+def run(db_path: str, jobs: List[str], workers: Optional[int] = None, batch_size: int = BATCH_SIZE,
+        resume: bool = False, last_week: Optional[date] = None) -> Dict[str, Any]:
+    asyncio.run(_prepare(db_path, jobs))
+    last_week = last_week or last_complete_week()
+    workers = workers or os.cpu_count() or 1
+
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        if not resume:
+            conn.executemany("DELETE FROM recompute_progress WHERE job = ?", [(job,) for job in jobs])
+        users = _pending_users(conn, jobs)
+        batches = [users[start:start + batch_size] for start in range(0, len(users), batch_size)]
+        print(f"Recomputing {', '.join(jobs)} for {len(users)} users in {len(batches)} batches "
+              f"on {workers} workers")
+
+        started = time.perf_counter()
+        done = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(compute_batch, db_path, jobs, batch, last_week) for batch in batches]
+            for future in as_completed(futures):
+                results = future.result()
+                write_batch(conn, jobs, results)
+                done += len(results["user_ids"])
+                elapsed = time.perf_counter() - started
+                rate = done / elapsed if elapsed else 0.0
+                eta = (len(users) - done) / rate if rate else 0.0
+                print(f"  {done}/{len(users)} users ({100 * done / len(users):.1f}%), "
+                      f"{rate:.0f} users/s, ETA {eta:.0f}s", flush=True)
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Recomputed {done} users in {elapsed:.1f}s")
+    return {"users": done, "seconds": round(elapsed, 2)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute derived data for all users in parallel")
+    parser.add_argument("--db", default="mindmate.db")
+    parser.add_argument("--jobs", nargs="+", choices=JOBS, default=list(JOBS))
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="users per batch")
+    parser.add_argument("--resume", action="store_true", help="skip users finished by an interrupted run")
+    parser.add_argument("--last-week", type=date.fromisoformat, default=None,
+                        help="Monday of the last week to summarize (default: last complete week)")
+    args = parser.parse_args(argv)
+    run(args.db, args.jobs, args.workers, args.batch_size, args.resume, args.last_week)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# backend/semantic_cache.py - Reuse chat replies for near-duplicate messages
+#
+# "I feel anxious today" and "feeling really anxious" deserve the same kind
+# of answer, yet each costs a full generation. SemanticCache embeds the
+# incoming message and compares it with recent messages from the same scope
+# and context bucket (recent mood and stress level); above the similarity
+# threshold the earlier reply is returned instead of calling the model.
+#
+# Opt-in with MINDMATE_SEMANTIC_CACHE=1; it uses the MINDMATE_EMBEDDINGS
+# embedder, so that has to be enabled too. MINDMATE_SEMANTIC_CACHE_SCOPE is
+# "user" (default: only a user's own earlier replies are reused) or "global"
+# (replies are shared between users in the same context bucket; replies that
+# drew on a user's recalled memories are never shared). Entries live in
+# process memory, so each worker keeps its own cache, bounded by
+# MINDMATE_SEMANTIC_CACHE_ENTRIES entries across all scopes (about 3 KB each
+# with 768-dimension vectors): past it, the oldest entries of the least
+# recently used scope are evicted first.
+import os
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from metrics import metrics
+
+SEMANTIC_CACHE_ENABLED = os.getenv("MINDMATE_SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE_SCOPE = os.getenv("MINDMATE_SEMANTIC_CACHE_SCOPE", "user")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("MINDMATE_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = int(os.getenv("MINDMATE_SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_ENTRIES = int(os.getenv("MINDMATE_SEMANTIC_CACHE_ENTRIES", "10000"))
+
+# Long messages are personal enough that a near match is unlikely to fit
+MAX_MESSAGE_LENGTH = 280
+
+
+def context_bucket(context: Any) -> str:
+    """Coarse summary of the user context a cached reply must match"""
+    if context is None:
+        return "none"
+    if not isinstance(context, dict):
+        context = context.model_dump() if hasattr(context, "model_dump") else {}
+    mood = context.get("recent_mood")
+    mood = getattr(mood, "value", mood) or "unknown"
+    stress = context.get("avg_stress")
+    stress = "unknown" if stress is None else ("high" if stress >= 7 else "low" if stress <= 3 else "medium")
+    return f"{mood}:{stress}"
+
+
+class _Index:
+    """Recent (message vector, reply) pairs for one scope and context bucket"""
+
+    def __init__(self, dim: int):
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.expires = np.empty(0, dtype=np.float64)
+        self.responses: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.responses)
+
+    def prune(self, now: float) -> int:
+        """Drop expired entries; returns how many were dropped"""
+        live = self.expires > now
+        if live.all():
+            return 0
+        self.vectors = self.vectors[live]
+        self.expires = self.expires[live]
+        self.responses = [response for response, keep in zip(self.responses, live) if keep]
+        return len(live) - len(self.responses)
+
+    def drop_oldest(self, count: int):
+        self.vectors = self.vectors[count:]
+        self.expires = self.expires[count:]
+        self.responses = self.responses[count:]
+
+    def best(self, vector: np.ndarray) -> Tuple[float, Optional[str]]:
+        if not self.responses:
+            return 0.0, None
+        scores = self.vectors @ vector
+        index = int(np.argmax(scores))
+        return float(scores[index]), self.responses[index]
+
+    def add(self, vector: np.ndarray, response: str, expires: float, max_entries: int) -> int:
+        """Append an entry, keeping the newest max_entries; returns the change in size"""
+        before = len(self.responses)
+        self.vectors = np.vstack([self.vectors, vector[None, :]])[-max_entries:]
+        self.expires = np.append(self.expires, expires)[-max_entries:]
+        self.responses = (self.responses + [response])[-max_entries:]
+        return len(self.responses) - before
+
+
+class SemanticCache:
+    def __init__(self, embedder, threshold: float = SEMANTIC_CACHE_THRESHOLD, ttl: int = SEMANTIC_CACHE_TTL,
+                 scope: str = SEMANTIC_CACHE_SCOPE, max_entries: int = SEMANTIC_CACHE_ENTRIES,
+                 max_scope_entries: int = 500):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.scope = scope
+        # Entries across all scopes, and per scope (bounds the copy on each store)
+        self.max_entries = max_entries
+        self.max_scope_entries = max_scope_entries
+        # Least recently used scope first
+        self._indexes: "OrderedDict[str, _Index]" = OrderedDict()
+        self._size = 0
+
+    def _key(self, user_id: str, context: Any) -> str:
+        owner = "*" if self.scope == "global" else user_id
+        return f"{owner}|{context_bucket(context)}"
+
+    async def lookup(self, user_id: str, message: str, context: Any) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """Cached reply for a near-duplicate message (or None) and the message's vector for reuse"""
+        if len(message) > MAX_MESSAGE_LENGTH:
+            metrics.increment("semantic_cache", outcome="skipped", scope=self.scope)
+            return None, None
+        vector = (await self.embedder.embed([message]))[0]
+        key = self._key(user_id, context)
+        index = self._indexes.get(key)
+        response = None
+        if index is not None:
+            self._size -= index.prune(time.time())
+            if index:
+                self._indexes.move_to_end(key)
+                score, candidate = index.best(vector)
+                if score >= self.threshold:
+                    response = candidate
+            else:
+                del self._indexes[key]
+        metrics.increment("semantic_cache", outcome="hit" if response else "miss", scope=self.scope)
+        return response, vector
+
+    def store(self, user_id: str, context: Any, vector: Optional[np.ndarray], response: str,
+              personal: bool = False):
+        """Remember a fresh reply; personal replies (built on recalled memories) stay with their user"""
+        if vector is None or (personal and self.scope == "global"):
+            return
+        key = self._key(user_id, context)
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._indexes[key] = _Index(vector.shape[0])
+        else:
+            self._indexes.move_to_end(key)
+        now = time.time()
+        self._size -= index.prune(now)
+        self._size += index.add(vector, response, now + self.ttl, self.max_scope_entries)
+        self._evict()
+
+    def _evict(self):
+        """Drop the oldest entries of the least recently used scopes until within max_entries"""
+        while self._size > self.max_entries:
+            key, index = next(iter(self._indexes.items()))
+            count = min(len(index), self._size - self.max_entries)
+            index.drop_oldest(count)
+            self._size -= count
+            if not index:
+                del self._indexes[key]
+
+    def __len__(self) -> int:
+        return self._size
@@ -0,0 +1,270 @@
+# backend/shared_cache.py - Cache shared by all worker processes on one host
+#
+# Values live in a small SQLite file next to the main database, so every
+# worker sees the same entries without running an external service. Each
+# worker also keeps a short-lived in-process copy of hot keys; invalidations
+# are written to a log table that every worker polls, so a change made in one
+# worker evicts the local copies in the others within poll_interval seconds.
+# The same polling loop relays small broadcast messages between workers
+# (used for realtime push events whose socket lives in another process).
+# Rate-limit token buckets live here too, so every worker spends from the
+# same budget, and so do the leases that keep background jobs to one worker.
+import asyncio
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+CACHE_DB_PATH = os.getenv("MINDMATE_CACHE_DB", "mindmate_cache.db")
+
+
+class SharedCache:
+    def __init__(
+        self,
+        db_path: str = CACHE_DB_PATH,
+        local_ttl: float = 5.0,
+        poll_interval: float = 1.0,
+        max_local_entries: int = 10000,
+    ):
+        self.db_path = db_path
+        self.local_ttl = local_ttl
+        self.poll_interval = poll_interval
+        self.max_local_entries = max_local_entries
+        self._local: Dict[str, Tuple[float, Any]] = {}
+        self._db: Optional[aiosqlite.Connection] = None
+        self._last_invalidation = 0
+        self._poller: Optional[asyncio.Task] = None
+        self._polls = 0
+        self._last_message = 0
+        self._subscribers: List[Callable[[str, Any], Awaitable[None]]] = []
+
+    async def init(self):
+        self._db = await aiosqlite.connect(self.db_path)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute("PRAGMA synchronous=NORMAL")
+        await self._db.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        await self._db.execute("""
+            CREATE TABLE IF NOT EXISTS cache_invalidations (
+                id INTEGER PRIMARY KEY,
+                key_prefix TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        await self._db.execute("""
+            CREATE TABLE IF NOT EXISTS cache_messages (
+                id INTEGER PRIMARY KEY,
+                origin INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        await self._db.execute("""
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                granted INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                full_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        await self._db.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        await self._db.commit()
+        async with self._db.execute("SELECT COALESCE(MAX(id), 0) FROM cache_invalidations") as cursor:
+            (self._last_invalidation,) = await cursor.fetchone()
+        async with self._db.execute("SELECT COALESCE(MAX(id), 0) FROM cache_messages") as cursor:
+            (self._last_message,) = await cursor.fetchone()
+        self._poller = asyncio.create_task(self._poll_invalidations())
+
+    async def close(self):
+        if self._poller:
+            self._poller.cancel()
+            self._poller = None
+        if self._db:
+            await self._db.close()
+            self._db = None
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        local = self._local.get(key)
+        if local and local[0] > now:
+            return local[1]
+
+        if self._db is None:
+            return default
+        async with self._db.execute(
+            "SELECT value, expires_at FROM cache_entries WHERE key = ? AND expires_at > ?", (key, now)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if not row:
+            self._local.pop(key, None)
+            return default
+
+        value = json.loads(row[0])
+        self._remember(key, value, min(row[1], now + self.local_ttl))
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float):
+        expires_at = time.time() + ttl
+        self._remember(key, value, min(expires_at, time.time() + self.local_ttl))
+        if self._db is None:
+            return
+        await self._db.execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), expires_at)
+        )
+        await self._db.commit()
+
+    async def invalidate(self, prefix: str):
+        """Drop every key starting with prefix, in this and all other workers"""
+        self._drop_local(prefix)
+        if self._db is None:
+            return
+        await self._db.execute(
+            "DELETE FROM cache_entries WHERE key >= ? AND key < ?", (prefix, prefix + "\uffff")
+        )
+        await self._db.execute(
+            "INSERT INTO cache_invalidations (key_prefix, created_at) VALUES (?, ?)", (prefix, time.time())
+        )
+        await self._db.commit()
+
+    def subscribe(self, callback: Callable[[str, Any], Awaitable[None]]):
+        """Register an async callback for messages broadcast by other workers"""
+        self._subscribers.append(callback)
+
+    async def broadcast(self, channel: str, payload: Any):
+        """Deliver payload to subscribers in every other worker process"""
+        if self._db is None:
+            return
+        await self._db.execute(
+            "INSERT INTO cache_messages (origin, channel, payload, created_at) VALUES (?, ?, ?, ?)",
+            (os.getpid(), channel, json.dumps(payload), time.time())
+        )
+        await self._db.commit()
+
+    async def take_tokens(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> Optional[float]:
+        """Token bucket shared by all workers: refill at rate/second, then take cost.
+
+        Returns 0 on success or seconds until enough tokens exist; None when
+        the cache is not open. Refill and take are one UPSERT statement, so
+        concurrent requests in different workers cannot spend the same token.
+        """
+        if self._db is None:
+            return None
+        now = time.time()
+        granted = capacity >= cost
+        tokens = capacity - cost if granted else capacity
+        refilled = "MIN(:capacity, tokens + (:now - updated_at) * :rate)"
+        left = f"({refilled} - CASE WHEN {refilled} >= :cost THEN :cost ELSE 0 END)"
+        async with self._db.execute(f"""
+            INSERT INTO rate_buckets (key, tokens, granted, updated_at, full_at)
+            VALUES (:key, :tokens, :granted, :now, :now + (:capacity - :tokens) / :rate)
+            ON CONFLICT (key) DO UPDATE SET
+                tokens = {left},
+                granted = {refilled} >= :cost,
+                updated_at = :now,
+                full_at = :now + (:capacity - {left}) / :rate
+            RETURNING tokens, granted
+        """, {"key": key, "tokens": tokens, "granted": granted, "now": now,
+              "capacity": capacity, "rate": rate, "cost": cost}) as cursor:
+            tokens, granted = await cursor.fetchone()
+        await self._db.commit()
+        if granted:
+            return 0.0
+        return (cost - tokens) / rate
+
+    async def acquire_lease(self, name: str, ttl: float) -> bool:
+        """Hold (or renew) the named lease for ttl seconds; False while another worker holds it.
+
+        Used so background jobs run in one worker only: the holder keeps
+        renewing it, and another worker takes over once it lapses. Always
+        True when the cache is not open (a single process).
+        """
+        if self._db is None:
+            return True
+        now = time.time()
+        async with self._db.execute("""
+            INSERT INTO leases (name, owner, expires_at) VALUES (:name, :owner, :expires_at)
+            ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE leases.owner = excluded.owner OR leases.expires_at <= :now
+            RETURNING owner
+        """, {"name": name, "owner": os.getpid(), "expires_at": now + ttl, "now": now}) as cursor:
+            row = await cursor.fetchone()
+        await self._db.commit()
+        return row is not None
+
+    def _remember(self, key: str, value: Any, expires_at: float):
+        if len(self._local) >= self.max_local_entries:
+            # Cheap bound: discard the oldest half rather than tracking LRU order
+            for stale in list(self._local)[: self.max_local_entries // 2]:
+                del self._local[stale]
+        self._local[key] = (expires_at, value)
+
+    def _drop_local(self, prefix: str):
+        for key in [k for k in self._local if k.startswith(prefix)]:
+            del self._local[key]
+
+    async def _poll_invalidations(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                async with self._db.execute(
+                    "SELECT id, key_prefix FROM cache_invalidations WHERE id > ? ORDER BY id",
+                    (self._last_invalidation,)
+                ) as cursor:
+                    rows = await cursor.fetchall()
+                for invalidation_id, prefix in rows:
+                    self._drop_local(prefix)
+                    self._last_invalidation = invalidation_id
+
+                if self._subscribers:
+                    async with self._db.execute(
+                        "SELECT id, origin, channel, payload FROM cache_messages WHERE id > ? ORDER BY id",
+                        (self._last_message,)
+                    ) as cursor:
+                        messages = await cursor.fetchall()
+                    for message_id, origin, channel, payload in messages:
+                        self._last_message = message_id
+                        if origin == os.getpid():
+                            continue
+                        for callback in self._subscribers:
+                            await callback(channel, json.loads(payload))
+
+                self._polls += 1
+                if self._polls % 60 == 0:
+                    await self._housekeeping(time.time())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Shared cache poll error: {e}")
+
+    async def _housekeeping(self, now: float):
+        """Delete expired values, full buckets, and invalidations and messages every worker has seen.
+
+        The newest invalidation and message are always kept: ids are rowids,
+        and an emptied table would hand out ids from 1 again, below every
+        worker's last-seen id, so later rows would be skipped.
+        """
+        await self._db.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+        # A bucket that has refilled completely behaves like a new one
+        await self._db.execute("DELETE FROM rate_buckets WHERE full_at <= ?", (now,))
+        for table in ("cache_invalidations", "cache_messages"):
+            await self._db.execute(f"""
+                DELETE FROM {table}
+                WHERE created_at < ? AND id < (SELECT MAX(id) FROM {table})
+            """, (now - 60 * self.poll_interval,))
+        await self._db.commit()
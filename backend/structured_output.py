@@ -0,0 +1,99 @@
+# backend/structured_output.py - JSON schemas for LLM replies and a tolerant parser
+#
+# Suggestions are requested with Ollama's `format` option set to a JSON
+# schema built from the pydantic model, which constrains decoding to valid
+# JSON. Replies can still arrive truncated (num_predict) or, from older
+# servers that ignore `format`, wrapped in markdown fences or prose, so the
+# parser pulls out every complete item it can find instead of failing the
+# whole reply on the first syntax error.
+import json
+import re
+from typing import Any, Dict, List, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+_FENCE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_decoder = json.JSONDecoder()
+
+
+def list_schema(model: Type[BaseModel], key: str, count: int) -> Dict[str, Any]:
+    """Schema for {key: [model, ...]} with exactly `count` items"""
+    return {
+        "type": "object",
+        "properties": {
+            key: {
+                "type": "array",
+                "items": model.model_json_schema(),
+                "minItems": count,
+                "maxItems": count,
+            }
+        },
+        "required": [key],
+    }
+
+
+def _salvage_array(text: str, start: int) -> Tuple[List[Any], bool]:
+    """Decode array elements from text[start] == '[' until the array closes or breaks"""
+    items = []
+    position = start + 1
+    while True:
+        while position < len(text) and text[position] in " \t\r\n,":
+            position += 1
+        if position >= len(text):
+            return items, False
+        if text[position] == "]":
+            return items, True
+        try:
+            item, position = _decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            return items, False
+        items.append(item)
+
+
+def salvage_json_list(text: str, key: str) -> Tuple[List[Any], bool]:
+    """Extract a list of items from an LLM reply.
+
+    Accepts {key: [...]}, a bare [...] or a single object, with or without
+    code fences or surrounding text. Returns (items, complete), where
+    complete is False when the reply was cut off or malformed and the items
+    are only those decoded before the break.
+    """
+    text = _FENCE.sub("", text or "")
+    starts = [index for index in (text.find("{"), text.find("[")) if index != -1]
+    if not starts:
+        return [], False
+    start = min(starts)
+
+    if text[start] == "[":
+        return _salvage_array(text, start)
+
+    try:
+        value, _ = _decoder.raw_decode(text, start)
+    except json.JSONDecodeError:
+        # Truncated object: recover the complete elements of its list, if any
+        match = re.compile(r'"%s"\s*:\s*\[' % re.escape(key)).search(text, start)
+        if not match:
+            return [], False
+        items, _ = _salvage_array(text, match.end() - 1)
+        return items, False
+
+    if isinstance(value.get(key), list):
+        return value[key], True
+    lists = [item for item in value.values()
+             if isinstance(item, list) and item and all(isinstance(entry, dict) for entry in item)]
+    if len(lists) == 1:
+        return lists[0], True
+    return [value], True
+
+
+def validate_items(items: List[Any], model: Type[BaseModel]) -> List[BaseModel]:
+    """Model instances for the items that validate; the rest are dropped"""
+    valid = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            valid.append(model.model_validate(item))
+        except ValidationError:
+            continue
+    return valid
@@ -0,0 +1,30 @@
+# test_ai_service.py - main.py runs the Ollama-backed service unless told otherwise
+import sys
+
+import pytest
+
+import ai_service
+import main
+
+
+def test_real_service_by_default(monkeypatch):
+    monkeypatch.delenv("MINDMATE_AI", raising=False)
+    monkeypatch.setenv("MINDMATE_OLLAMA_URL", "http://models:11434")
+    service = main.make_ai_service()
+    assert isinstance(service, ai_service.AIService)
+    assert service.ollama_url == "http://models:11434"
+
+
+def test_placeholder_only_when_selected(monkeypatch):
+    monkeypatch.setenv("MINDMATE_AI", "placeholder")
+    service = main.make_ai_service()
+    assert isinstance(service, main.PlaceholderAIService)
+    assert not service.initialized
+
+
+def test_missing_dependency_fails_startup(monkeypatch):
+    monkeypatch.delenv("MINDMATE_AI", raising=False)
+    # Importing ai_service fails as it would without aiohttp installed
+    monkeypatch.setitem(sys.modules, "ai_service", None)
+    with pytest.raises(ImportError):
+        main.make_ai_service()
@@ -0,0 +1,80 @@
+# test_archive.py - Archive round trip: old rows move out, stay readable, re-runs are safe
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+
+from archive import _pack, archive_old_rows
+from models import UserCreate
+
+
+def _conversation(user_id: str, index: int, days_ago: int) -> dict:
+    return {
+        "id": f"{user_id}-{index}",
+        "user_id": user_id,
+        "user_message": f"message {index}",
+        "ai_response": f"reply {index} " * 40,
+        "created_at": (datetime.utcnow() - timedelta(days=days_ago, minutes=index)).isoformat(),
+    }
+
+
+def _seed(db, user_ids):
+    rows = [_conversation(user_id, index, 400 if index < 3 else 1)
+            for user_id in user_ids for index in range(5)]
+    asyncio.run(db.save_conversations(rows))
+    old = (datetime.utcnow() - timedelta(days=400)).isoformat()
+    with sqlite3.connect(db.db_path) as conn:
+        conn.executemany(
+            "INSERT INTO insights (id, user_id, insight_type, content, created_at) VALUES (?, ?, 'daily', ?, ?)",
+            [(f"{user_id}-insight", user_id, "Nice work", old) for user_id in user_ids]
+        )
+    return rows
+
+
+def test_round_trip(db, user_id):
+    other = asyncio.run(db.create_user(UserCreate(name="Other", email="other@example.com", password="x")))["id"]
+    rows = _seed(db, [user_id, other])
+
+    moved = asyncio.run(archive_old_rows(db.db_path, days=180, batch_size=2))
+    assert moved == {"conversations": 6, "insights": 2}
+
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0] == 4
+        assert conn.execute("SELECT COUNT(*) FROM insights").fetchone()[0] == 0
+
+    history = asyncio.run(db.get_conversation_history(user_id, limit=10, include_archived=True))
+    expected = sorted((row for row in rows if row["user_id"] == user_id),
+                      key=lambda row: row["created_at"], reverse=True)
+    assert [row["id"] for row in history] == [row["id"] for row in expected]
+    assert history[-1]["ai_response"] == expected[-1]["ai_response"]
+
+    found = asyncio.run(db.search_conversations(user_id, "message 1", include_archived=True))
+    assert [row["id"] for row in found] == [f"{user_id}-1"]
+    insights = asyncio.run(db.get_user_insights(other, include_archived=True))
+    assert [row["id"] for row in insights] == [f"{other}-insight"]
+
+    # Nothing left to move
+    assert asyncio.run(archive_old_rows(db.db_path, days=180)) == {"conversations": 0, "insights": 0}
+
+
+def test_rerun_after_interrupted_delete(db, user_id):
+    rows = _seed(db, [user_id])
+    # Simulate a crash after the archive commit but before the hot delete
+    asyncio.run(archive_old_rows(db.db_path, days=180))
+    with sqlite3.connect(db.db_path) as conn:
+        conn.executemany(
+            "INSERT INTO conversations (id, user_id, user_message, ai_response, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(row["id"], row["user_id"], row["user_message"], row["ai_response"], row["created_at"])
+             for row in rows[:3]]
+        )
+
+    moved = asyncio.run(archive_old_rows(db.db_path, days=180))
+    assert moved["conversations"] == 3
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0] == 2
+    history = asyncio.run(db.get_conversation_history(user_id, limit=10, include_archived=True))
+    assert len(history) == 5 == len({row["id"] for row in history})
+
+
+def test_pack_is_compressed():
+    row = _conversation("u1", 0, 400)
+    assert len(_pack(row)) < len(row["ai_response"])
@@ -0,0 +1,54 @@
+# test_batch.py - Batched offline writes: all-or-nothing and idempotent replays
+import asyncio
+import sqlite3
+
+import pytest
+
+from database import DatabaseManager
+from models import CheckinCreate, FoodLogCreate, JournalCreate
+
+CHECKIN = CheckinCreate(checkin_type="morning", mood="good", energy_level=3, stress_level=4, hunger_level=5)
+FOOD_LOG = FoodLogCreate(meal_type="lunch", food_name="oatmeal", mood_before=4, mood_after=6)
+JOURNAL = JournalCreate(content="A quiet day")
+
+
+def _operations(prefix: str = "op"):
+    return [(f"{prefix}-1", "checkin", CHECKIN), (f"{prefix}-2", "food_log", FOOD_LOG),
+            (f"{prefix}-3", "journal", JOURNAL)]
+
+
+def _counts(db):
+    with sqlite3.connect(db.db_path) as conn:
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("checkins", "food_logs", "journal_entries", "batch_operations", "change_log")}
+
+
+def test_replay_returns_stored_rows(db, user_id):
+    first = asyncio.run(db.apply_batch(user_id, _operations()))
+    assert [(result["type"], result["status"]) for result in first] == [
+        ("checkin", "created"), ("food_log", "created"), ("journal", "created")]
+    assert first[1]["data"]["food_name"] == "oatmeal"
+    counts = _counts(db)
+
+    replay = asyncio.run(db.apply_batch(user_id, _operations() + [("op-4", "journal", JOURNAL)]))
+    assert [result["status"] for result in replay] == ["duplicate"] * 3 + ["created"]
+    assert [result["data"]["id"] for result in replay[:3]] == [result["data"]["id"] for result in first]
+    assert _counts(db)["journal_entries"] == counts["journal_entries"] + 1
+
+
+def test_repeated_client_id_in_one_batch_is_written_once(db, user_id):
+    results = asyncio.run(db.apply_batch(user_id, [("same", "journal", JOURNAL), ("same", "journal", JOURNAL)]))
+    assert results[0]["data"]["id"] == results[1]["data"]["id"]
+    assert _counts(db)["journal_entries"] == 1
+
+
+def test_failure_rolls_back_every_operation(db, user_id, monkeypatch):
+    before = _counts(db)
+
+    async def fail(database, changes):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(DatabaseManager, "_record_changes", staticmethod(fail))
+    with pytest.raises(sqlite3.OperationalError):
+        asyncio.run(db.apply_batch(user_id, _operations()))
+    assert _counts(db) == before
@@ -0,0 +1,83 @@
+# test_bulk_import.py - CSV and NDJSON import edge cases
+import asyncio
+import json
+import sqlite3
+
+from bulk_import import import_records, iter_records
+
+
+async def _chunks(data: bytes, size: int = 7):
+    """Small chunks, so records and UTF-8 characters straddle read boundaries"""
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def _records(data: bytes, format: str = "csv", record_type: str = "journal"):
+    async def collect():
+        return [item async for item in iter_records(_chunks(data), format, record_type)]
+    return asyncio.run(collect())
+
+
+def _import(db, user_id, data: bytes, format: str = "csv", record_type: str = "journal"):
+    return asyncio.run(import_records(db.db_path, user_id, _chunks(data, 64), format, record_type))
+
+
+def test_quoted_field_spanning_many_lines():
+    body = "\n".join(f"line {i}, with \"\"quotes\"\"" for i in range(250))
+    data = f'title,content\nLong,"{body}"\nShort,done\n'.encode()
+    records = _records(data)
+    assert [(line, record["title"]) for line, record in records] == [(2, "Long"), (252, "Short")]
+    assert records[0][1]["content"] == body.replace('""', '"')
+
+
+def test_unterminated_quote_is_an_error_not_eof():
+    records = _records(b'title,content\nOk,fine\nBad,"never closed\nmore\n')
+    assert records[0][1]["content"] == "fine"
+    assert records[1] == (3, {"_error": "Invalid CSV: unterminated quoted field at end of input"})
+
+
+def test_oversized_field_is_reported_per_line(monkeypatch):
+    import csv
+    monkeypatch.setattr(csv, "field_size_limit", lambda: 20)
+    records = _records(b'title,content\nBad,"' + b"x" * 30 + b'\nGood,fine\n')
+    assert records[0] == (2, {"_error": "Invalid CSV: field larger than field limit"})
+    assert records[1][1]["title"] == "Good"
+
+
+def test_crlf_bom_blank_lines_and_ragged_rows():
+    data = "﻿title,content\r\n\r\nCafé,\"a\r\nb\"\r\nOnly title\r\nX,y,extra\r\n".encode()
+    records = [record for _, record in _records(data)]
+    assert records == [
+        {"title": "Café", "content": "a\nb", "type": "journal"},
+        {"title": "Only title", "type": "journal"},
+        {"title": "X", "content": "y", "type": "journal"},
+    ]
+
+
+def test_ndjson_errors_are_reported_per_line(db, user_id):
+    lines = [
+        {"type": "journal", "content": "First", "source_id": "a"},
+        "{not json",
+        {"type": "unknown"},
+        ["not", "an", "object"],
+        {"type": "journal", "content": ""},
+        {"type": "journal", "content": "Second", "created_at": "2026-01-05T08:00:00+02:00"},
+    ]
+    data = "\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines).encode()
+    result = _import(db, user_id, data, "ndjson", None)
+    assert result["imported"]["journal"] == 2
+    assert [error["line"] for error in result["errors"]] == [2, 3, 4, 5]
+    assert result["errors"][0]["detail"].startswith("Invalid JSON")
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute("SELECT created_at FROM journal_entries WHERE created_at LIKE '2026-01-05%'"
+                            ).fetchone() == ("2026-01-05T06:00:00",)
+
+
+def test_reimport_skips_rows_with_the_same_source_id(db, user_id):
+    data = b"source_id,content\na,First\nb,Second\na,First again\n"
+    first = _import(db, user_id, data)
+    assert (first["imported"]["journal"], first["skipped"]) == (2, 1)
+    second = _import(db, user_id, data)
+    assert (second["imported"]["journal"], second["skipped"]) == (0, 3)
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM journal_entries").fetchone()[0] == 2
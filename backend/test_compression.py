@@ -0,0 +1,86 @@
+# test_compression.py - What the compression middleware compresses and what it passes through
+import gzip
+
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from compression import CompressionMiddleware
+
+BIG = {"items": ["I'm here to listen and support you."] * 200}
+
+
+def _client(**options) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, enable_brotli=False, **options)
+
+    @app.get("/big")
+    def big():
+        return JSONResponse(BIG, headers={"Vary": "Authorization"})
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    def stream():
+        async def chunks():
+            for _ in range(50):
+                yield b'{"line": "' + b"x" * 100 + b'"}\n'
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    @app.get("/encoded")
+    def encoded():
+        return Response(gzip.compress(b"x" * 5000), media_type="application/json",
+                        headers={"Content-Encoding": "gzip"})
+
+    @app.get("/binary")
+    def binary():
+        return Response(b"\x00" * 5000, media_type="image/png")
+
+    @app.get("/not-modified")
+    def not_modified():
+        return Response(status_code=304, headers={"ETag": 'W/"x"'})
+
+    return TestClient(app)
+
+
+def _raw(client, path, encoding="gzip"):
+    """Response without httpx's transparent decoding"""
+    with client.stream("GET", path, headers={"Accept-Encoding": encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_large_json_is_gzipped():
+    response, body = _raw(_client(), "/big")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Authorization, Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(body)
+    assert gzip.decompress(body) == JSONResponse(BIG).body
+
+
+def test_offloaded_compression_matches():
+    response, body = _raw(_client(offload_size=1), "/big")
+    assert gzip.decompress(body) == JSONResponse(BIG).body
+
+
+def test_passthrough():
+    client = _client()
+    for path in ("/small", "/stream", "/encoded", "/binary", "/not-modified"):
+        response, body = _raw(client, path)
+        assert response.headers.get("content-encoding") in (None, "gzip"), path
+        if path == "/encoded":
+            # Already encoded by the route: sent as is, not compressed twice
+            assert gzip.decompress(body) == b"x" * 5000
+        else:
+            assert "content-encoding" not in response.headers, path
+    response, body = _raw(client, "/stream")
+    assert body.count(b"\n") == 50
+
+
+def test_no_accepted_encoding():
+    response, body = _raw(_client(), "/big", encoding="identity")
+    assert "content-encoding" not in response.headers
+    assert body == JSONResponse(BIG).body
+    response, _ = _raw(_client(), "/big", encoding="gzip;q=0")
+    assert "content-encoding" not in response.headers
@@ -0,0 +1,51 @@
+# test_create_returning.py - Create paths return the row as stored, and duplicate signups
+import asyncio
+import sqlite3
+
+from models import CheckinCreate, FoodLogCreate, JournalCreate, UserCreate
+
+
+def _change_log(db):
+    with sqlite3.connect(db.db_path) as conn:
+        return conn.execute("SELECT version, table_name, row_id FROM change_log ORDER BY version").fetchall()
+
+
+def _stored(db, table, row_id):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        return dict(conn.execute(f"SELECT * FROM {table} WHERE id = ?", (row_id,)).fetchone())
+
+
+def test_created_rows_match_the_database(db, user_id):
+    checkin = asyncio.run(db.create_checkin(user_id, CheckinCreate(
+        checkin_type="evening", mood="low", energy_level=2, stress_level=7, hunger_level=4, notes="Long day")))
+    food_log = asyncio.run(db.create_food_log(user_id, FoodLogCreate(meal_type="dinner", food_name="Pasta")))
+    entry = asyncio.run(db.create_journal_entry(user_id, JournalCreate(
+        title="Evening", content="Wrote this down " * 20, tags=["work"])))
+
+    assert checkin == _stored(db, "checkins", checkin["id"])
+    assert food_log == _stored(db, "food_logs", food_log["id"])
+    # Journal content is stored compressed and parsed tags are returned
+    assert entry["content"] == "Wrote this down " * 20
+    assert entry["tags"] == ["work"]
+    assert entry["version"] == _stored(db, "journal_entries", entry["id"])["version"]
+
+    versions = [version for version, table, _ in _change_log(db) if table != "users"]
+    assert [checkin["version"], food_log["version"], entry["version"]] == versions
+
+
+def test_duplicate_email_is_not_created(db, user_id):
+    before = _change_log(db)
+    duplicate = asyncio.run(db.create_user(UserCreate(name="Again", email="test@example.com", password="y")))
+    assert duplicate is None
+    assert _change_log(db) == before
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute("SELECT name FROM users").fetchall() == [("Test User",)]
+
+
+def test_signup_with_a_registered_email_is_rejected(client, auth_headers):
+    response = client.post("/api/auth/signup", json={"name": "Someone Else", "email": "test@example.com",
+                                                     "password": "secret456", "age": 41})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already registered"
+    assert client.get("/api/auth/me", headers=auth_headers).json()["name"] == "Test User"
@@ -0,0 +1,54 @@
+# test_dashboard.py - /api/dashboard field selection and its single read snapshot
+import asyncio
+import sqlite3
+from datetime import datetime
+
+from models import CheckinCreate, FoodLogCreate
+
+CHECKIN = CheckinCreate(checkin_type="morning", mood="good", energy_level=4, stress_level=3, hunger_level=5)
+
+
+def test_returns_only_the_requested_fields(client, auth_headers):
+    import main
+
+    user_id = client.get("/api/auth/me", headers=auth_headers).json()["id"]
+    asyncio.run(main.db_manager.create_checkin(user_id, CHECKIN))
+    asyncio.run(main.db_manager.create_food_log(user_id, FoodLogCreate(meal_type="lunch", food_name="Soup")))
+
+    response = client.get("/api/dashboard?fields=user,today_checkins,food_logs", headers=auth_headers)
+    assert response.status_code == 200
+    dashboard = response.json()
+    assert set(dashboard) == {"user", "today_checkins", "food_logs"}
+    assert dashboard["user"] == main.profile_payload(asyncio.run(main.db_manager.get_user(user_id)))
+    assert dashboard["today_checkins"]["morning"]["mood"] == "good"
+    assert dashboard["today_checkins"]["evening"] is None
+    assert [log["food_name"] for log in dashboard["food_logs"]] == ["Soup"]
+
+    everything = client.get("/api/dashboard", headers=auth_headers).json()
+    assert set(everything) == set(main.DASHBOARD_FIELDS)
+
+    response = client.get("/api/dashboard?fields=user,secrets", headers=auth_headers)
+    assert response.status_code == 400
+    assert "secrets" in response.json()["detail"]
+
+
+def test_sections_share_one_snapshot(db, user_id, monkeypatch):
+    read_checkins = db.get_user_checkins
+
+    async def checkins_then_concurrent_write(*args, **kwargs):
+        rows = await read_checkins(*args, **kwargs)
+        # Another connection commits while the dashboard is still reading
+        with sqlite3.connect(db.db_path) as conn:
+            conn.execute(
+                "INSERT INTO conversations (id, user_id, user_message, ai_response, created_at) VALUES (?, ?, ?, ?, ?)",
+                ("late", user_id, "hello", "hi", datetime.utcnow().isoformat())
+            )
+        return rows
+
+    monkeypatch.setattr(db, "get_user_checkins", checkins_then_concurrent_write)
+    dashboard = asyncio.run(db.get_dashboard(user_id, {"recent_checkins", "chat_history"}))
+    assert dashboard == {"recent_checkins": [], "chat_history": []}
+
+    # The write is there for the next request
+    dashboard = asyncio.run(db.get_dashboard(user_id, {"chat_history"}))
+    assert [row["id"] for row in dashboard["chat_history"]] == ["late"]
@@ -0,0 +1,93 @@
+# test_embeddings.py - Per-user float16 vector files, top-k ranking and archived rows
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from archive import archive_old_rows
+from embeddings import EmbeddingService, VectorStore
+
+TOPICS = ("sleep", "work", "food", "family")
+
+
+class TopicEmbedder:
+    """One axis per topic word, so similarity is just shared topics"""
+
+    dim = len(TOPICS)
+
+    async def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for axis, topic in enumerate(TOPICS):
+                matrix[row, axis] = text.lower().count(topic)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+def _conversation(user_id: str, index: int, message: str, days_ago: int) -> dict:
+    return {
+        "id": f"{user_id}-{index}",
+        "user_id": user_id,
+        "user_message": message,
+        "ai_response": "Thanks for sharing.",
+        "created_at": (datetime.utcnow() - timedelta(days=days_ago)).isoformat(),
+    }
+
+
+def _embed_conversations(service, rows):
+    asyncio.run(service.add([(row["user_id"], "conversations", row["id"], row["user_message"]) for row in rows]))
+
+
+def test_vectors_are_stored_per_user_as_float16(db, user_id, tmp_path):
+    service = EmbeddingService(db.db_path, TopicEmbedder(), str(tmp_path / "vectors"))
+    _embed_conversations(service, [_conversation(user_id, 0, "sleep", 1), _conversation("other", 0, "work", 1)])
+
+    path = service.store.path(user_id, TopicEmbedder.dim)
+    assert os.path.getsize(path) == TopicEmbedder.dim * 2
+    assert np.fromfile(path, dtype=np.float16).tolist() == [1.0, 0.0, 0.0, 0.0]
+    assert np.fromfile(service.store.path("other", TopicEmbedder.dim), dtype=np.float16).tolist() == [0.0, 1.0, 0.0, 0.0]
+
+
+def test_appends_are_visible_to_cached_and_fresh_memmaps(db, user_id, tmp_path):
+    vector_dir = str(tmp_path / "vectors")
+    service = EmbeddingService(db.db_path, TopicEmbedder(), vector_dir)
+    _embed_conversations(service, [_conversation(user_id, 0, "sleep", 1)])
+    assert service.store.matrix(user_id, TopicEmbedder.dim, 1).shape == (1, TopicEmbedder.dim)
+
+    _embed_conversations(service, [_conversation(user_id, 1, "food", 1), _conversation(user_id, 2, "family", 1)])
+    expected = np.eye(TopicEmbedder.dim, dtype=np.float16)[[0, 2, 3]]
+    assert np.array_equal(service.store.matrix(user_id, TopicEmbedder.dim, 3), expected)
+    # A new worker reads the same file from scratch
+    assert np.array_equal(VectorStore(vector_dir).matrix(user_id, TopicEmbedder.dim, 3), expected)
+    assert VectorStore(vector_dir).matrix(user_id, TopicEmbedder.dim, 4) is None
+
+
+def test_top_k_ranks_best_first(tmp_path):
+    store = VectorStore(str(tmp_path))
+    vectors = np.array([[0.1, 1.0], [1.0, 0.0], [0.6, 0.8], [0.0, 1.0], [0.8, 0.6]], dtype=np.float32)
+    store.write("u1", 0, vectors)
+    query = np.array([1.0, 0.0], dtype=np.float32)
+
+    assert [row for row, _ in store.top_k("u1", 2, 5, query, 3)] == [1, 4, 2]
+    assert [row for row, _ in store.top_k("u1", 2, 5, query, 10)] == [1, 4, 2, 0, 3]
+    assert [row for row, _ in store.top_k("u1", 2, 5, query, 2, live=np.array([0, 2, 3]))] == [2, 0]
+    assert store.top_k("u1", 2, 5, query, 3, live=np.array([], dtype=np.int64)) == []
+    assert store.top_k("nobody", 2, 5, query, 3) == []
+
+
+def test_archived_conversations_leave_search(db, user_id, tmp_path):
+    service = EmbeddingService(db.db_path, TopicEmbedder(), str(tmp_path / "vectors"))
+    rows = [_conversation(user_id, index, "work work", 400) for index in range(3)]
+    rows.append(_conversation(user_id, 3, "work and sleep", 1))
+    asyncio.run(db.save_conversations(rows))
+    _embed_conversations(service, rows)
+    assert len(asyncio.run(service.search(user_id, "work", k=1))) == 1
+
+    asyncio.run(archive_old_rows(db.db_path, days=180))
+
+    # The archived rows' vectors score higher but no longer take the top slots
+    hits = asyncio.run(service.search(user_id, "work", k=1))
+    assert [hit["id"] for hit in hits] == [f"{user_id}-3"]
+    assert hits[0]["text"] == "User: work and sleep\nAssistant: Thanks for sharing."
@@ -0,0 +1,68 @@
+# test_export.py - Export streams every row once and resumes after any cursor
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from archive import archive_old_rows
+from export import EXPORT_TABLES, export_pages, ndjson_stream, parse_cursor
+from models import JournalCreate
+
+
+def _seed(db, user_id):
+    old = datetime.utcnow() - timedelta(days=400)
+    asyncio.run(db.save_conversations([
+        {"id": f"c{i}", "user_id": user_id, "user_message": f"message {i}", "ai_response": "reply",
+         "created_at": (old + timedelta(days=i * 200)).isoformat()}
+        for i in range(3)
+    ]))
+    # Two old conversations move to the archive, one stays hot
+    assert asyncio.run(archive_old_rows(db.db_path, days=180))["conversations"] == 2
+    for i in range(3):
+        asyncio.run(db.create_journal_entry(user_id, JournalCreate(content=f"entry {i}")))
+
+
+def _export(db, user_id, cursor=None):
+    async def collect():
+        pages = export_pages(db.db_path, user_id, list(EXPORT_TABLES), cursor, page_size=2)
+        return [json.loads(line) for chunk in [c async for c in ndjson_stream(pages)]
+                for line in chunk.decode().splitlines()]
+    return asyncio.run(collect())
+
+
+def test_resume_after_every_cursor(db, user_id):
+    _seed(db, user_id)
+    lines = _export(db, user_id)
+    assert [(line["table"], line["data"]["id"]) for line in lines if line["table"] == "conversations"] == [
+        ("conversations", "c0"), ("conversations", "c1"), ("conversations", "c2")]
+    assert sum(line["table"] == "journal_entries" for line in lines) == 3
+    assert all("version" not in line["data"] for line in lines)
+
+    for position, line in enumerate(lines):
+        assert _export(db, user_id, line["cursor"]) == lines[position + 1:]
+
+
+def test_invalid_cursor():
+    with pytest.raises(ValueError):
+        parse_cursor("users/2026-01-01/x", EXPORT_TABLES)
+    with pytest.raises(ValueError):
+        parse_cursor("checkins/2026-01-01", EXPORT_TABLES)
+
+
+def test_endpoint_streams_gzip_and_resumes(client, auth_headers):
+    for i in range(3):
+        assert client.post("/api/journal", json={"content": f"entry {i}"}, headers=auth_headers).status_code == 200
+
+    response = client.get("/api/export?tables=journal_entries&compress=true", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["data"]["content"] for line in lines] == ["entry 0", "entry 1", "entry 2"]
+
+    resumed = client.get("/api/export", params={"tables": "journal_entries", "cursor": lines[0]["cursor"]},
+                         headers=auth_headers)
+    assert [json.loads(line)["data"]["id"] for line in resumed.text.splitlines()] == \
+        [line["data"]["id"] for line in lines[1:]]
+
+    assert client.get("/api/export?cursor=bogus", headers=auth_headers).status_code == 400
@@ -0,0 +1,64 @@
+# test_food_catalog.py - Food names linked into the catalog and the per-user aggregates
+import asyncio
+import sqlite3
+
+from database import split_food_names
+from models import FoodLogCreate, UserCreate
+
+
+def _log(db, user_id, food_name, mood_before=None, mood_after=None):
+    return asyncio.run(db.create_food_log(user_id, FoodLogCreate(
+        meal_type="lunch", food_name=food_name, mood_before=mood_before, mood_after=mood_after)))
+
+
+def test_names_are_split_and_canonical():
+    assert split_food_names("Rice, Beans and  GREEK-Yogurt!") == ["rice", "beans", "greek-yogurt"]
+    assert split_food_names("Tea & tea / toast") == ["tea", "toast"]
+    assert split_food_names(None) == []
+
+
+def test_logs_share_catalog_entries_across_users(db, user_id):
+    other = asyncio.run(db.create_user(UserCreate(name="Other", email="other@example.com", password="x")))["id"]
+    log = _log(db, user_id, "Rice and beans")
+    _log(db, other, "rice")
+
+    with sqlite3.connect(db.db_path) as conn:
+        assert [name for (name,) in conn.execute("SELECT name FROM foods ORDER BY name")] == ["beans", "rice"]
+        linked = conn.execute("""
+            SELECT f.name FROM food_log_items li JOIN foods f ON f.id = li.food_id
+            WHERE li.log_id = ? ORDER BY f.name
+        """, (log["id"],)).fetchall()
+    assert [name for (name,) in linked] == ["beans", "rice"]
+
+
+def test_stats_aggregate_counts_and_mood_change(db, user_id):
+    _log(db, user_id, "salad", mood_before=4, mood_after=7)
+    _log(db, user_id, "Salad, soup", mood_before=5, mood_after=6)
+    _log(db, user_id, "soup")
+    _log(db, user_id, "cake", mood_before=6, mood_after=3)
+
+    by_frequency = asyncio.run(db.get_user_food_stats(user_id))
+    assert [(row["food"], row["log_count"]) for row in by_frequency][:2] == [("soup", 2), ("salad", 2)]
+    stats = {row["food"]: row for row in by_frequency}
+    assert stats["salad"]["avg_mood_delta"] == 2.0
+    assert stats["soup"]["avg_mood_delta"] == 1.0 and stats["soup"]["mood_delta_count"] == 1
+
+    by_mood = asyncio.run(db.get_user_food_stats(user_id, order_by="mood"))
+    assert [row["food"] for row in by_mood] == ["salad", "soup", "cake"]
+
+    # Incremental aggregates match a rebuild from the link table
+    asyncio.run(db.rebuild_food_catalog())
+    assert asyncio.run(db.get_user_food_stats(user_id)) == by_frequency
+
+
+def test_rebuild_links_logs_written_without_the_catalog(db, user_id):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("""
+            INSERT INTO food_logs (id, user_id, food_name, meal_type, mood_before, mood_after, created_at)
+            VALUES ('raw', ?, 'Oats + berries', 'breakfast', 3, 5, '2026-10-01T08:00:00')
+        """, (user_id,))
+    assert asyncio.run(db.get_user_food_stats(user_id)) == []
+
+    asyncio.run(db.rebuild_food_catalog())
+    stats = asyncio.run(db.get_user_food_stats(user_id, order_by="mood"))
+    assert {(row["food"], row["avg_mood_delta"]) for row in stats} == {("oats", 2.0), ("berries", 2.0)}
@@ -0,0 +1,74 @@
+# test_http_cache.py - ETags and conditional GETs on read-heavy endpoints
+import asyncio
+import sqlite3
+from datetime import date
+
+import main
+from http_cache import etag_matches, make_etag
+from weekly_summary import store_weekly_summaries
+
+
+class FakeRequest:
+    def __init__(self, if_none_match=None):
+        self.headers = {"if-none-match": if_none_match} if if_none_match else {}
+
+
+def test_weak_comparison_and_lists():
+    etag = make_etag("profile", "u1", 3)
+    assert etag.startswith('W/"')
+    assert etag_matches(FakeRequest(etag), etag)
+    assert etag_matches(FakeRequest(etag[2:]), etag)
+    assert etag_matches(FakeRequest(f'W/"other", {etag}'), etag)
+    assert etag_matches(FakeRequest("*"), etag)
+    assert not etag_matches(FakeRequest('W/"other"'), etag)
+    assert not etag_matches(FakeRequest(), etag)
+
+
+def test_profile_revalidates_until_it_changes(client, auth_headers):
+    first = client.get("/api/users/profile", headers=auth_headers)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+    assert "last-modified" in first.headers
+
+    cached = client.get("/api/users/profile", headers={**auth_headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    assert client.put("/api/users/profile", json={"name": "Renamed"}, headers=auth_headers).status_code == 200
+    changed = client.get("/api/users/profile", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["name"] == "Renamed"
+
+
+def test_static_resources_are_public(client):
+    first = client.get("/api/emergency/resources")
+    assert first.status_code == 200
+    assert first.headers["cache-control"].startswith("public")
+    again = client.get("/api/emergency/resources", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+
+
+def test_weekly_summary_etag_is_namespaced_and_follows_the_narrative(client, auth_headers):
+    user_id = client.get("/api/auth/me", headers=auth_headers).json()["id"]
+    summary = {"week_start": "2026-10-05", "week_end": "2026-10-11", "avg_mood": 3.5, "mood_trend": "stable",
+               "top_emotions": ["good"], "mindful_eating_score": 5.0, "key_insights": ["Steady week."],
+               "recommendations": []}
+    asyncio.run(store_weekly_summaries(main.db_manager.db_path, date(2026, 10, 5), {user_id: summary}))
+
+    first = client.get("/api/insights/weekly-summary", headers=auth_headers)
+    etag = first.headers["etag"]
+    assert first.json()["summary"] == "Steady week."
+    with sqlite3.connect(main.db_manager.db_path) as conn:
+        (updated_at,) = conn.execute("SELECT updated_at FROM weekly_summaries").fetchone()
+    assert etag == make_etag("weekly-summary", user_id, "2026-10-05", updated_at)
+    assert client.get("/api/insights/weekly-summary",
+                      headers={**auth_headers, "If-None-Match": etag}).status_code == 304
+
+    with sqlite3.connect(main.db_manager.db_path) as conn:
+        conn.execute("UPDATE weekly_summaries SET narrative = 'A calm week.', updated_at = '2026-10-13T03:00:00'")
+    changed = client.get("/api/insights/weekly-summary", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["summary"] == "A calm week."
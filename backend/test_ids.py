@@ -0,0 +1,38 @@
+# test_ids.py - UUIDv7 IDs are valid, time-stamped and strictly increasing
+import time
+import uuid
+
+import pytest
+
+import ids
+from ids import id_timestamp, new_id
+
+
+def test_format_and_timestamp():
+    before = time.time()
+    value = new_id()
+    parsed = uuid.UUID(value)
+    assert (parsed.version, parsed.variant) == (7, uuid.RFC_4122)
+    assert len(value) == 36 and str(parsed) == value
+    assert before - 0.001 <= id_timestamp(value) <= time.time()
+
+
+def test_increasing_within_one_millisecond(monkeypatch):
+    monkeypatch.setattr(ids.time, "time_ns", lambda: 1_700_000_000_000_000_000)
+    values = [new_id() for _ in range(5000)]
+    assert values == sorted(values) and len(set(values)) == len(values)
+    # The counter overflowed into the following milliseconds rather than wrapping
+    assert id_timestamp(values[-1]) > id_timestamp(values[0])
+
+
+def test_increasing_when_the_clock_steps_back(monkeypatch):
+    now = [1_800_000_000_000_000_000]
+    monkeypatch.setattr(ids.time, "time_ns", lambda: now[0])
+    first = new_id()
+    now[0] -= 5_000_000_000
+    assert new_id() > first
+
+
+def test_id_timestamp_rejects_uuid4():
+    with pytest.raises(ValueError):
+        id_timestamp(str(uuid.uuid4()))
@@ -0,0 +1,70 @@
+# test_migrations.py - Upgrading a database created before schema versioning
+import asyncio
+import sqlite3
+
+import aiosqlite
+
+from migrations import SCHEMA_VERSION, _core_tables, migrate
+
+NOW = "2026-01-05T08:00:00"
+
+
+def _legacy_database(path: str):
+    """The pre-versioning schema (user_version 0) with a little data in it"""
+    async def create():
+        async with aiosqlite.connect(path) as db:
+            await _core_tables(db)
+            await db.commit()
+    asyncio.run(create())
+
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO users (id, name, email, created_at, updated_at) VALUES ('u1', 'Ann', 'a@x.io', ?, ?)",
+                     (NOW, NOW))
+        conn.execute("""INSERT INTO checkins (id, user_id, checkin_type, mood, energy_level, stress_level, created_at)
+                        VALUES ('c1', 'u1', 'morning', 'good', 3, 4, ?)""", (NOW,))
+        conn.executemany("""INSERT INTO food_logs (id, user_id, food_name, meal_type, mood_before, mood_after,
+                                                   created_at) VALUES (?, 'u1', ?, 'lunch', ?, ?, ?)""", [
+            ("f1", "Greek-Yogurt & granola", 3, 5, NOW),
+            ("f2", "granola", None, None, "2026-01-06T08:00:00"),
+        ])
+        conn.execute("""INSERT INTO conversations (id, user_id, user_message, ai_response, created_at)
+                        VALUES ('m1', 'u1', 'hi', 'hello', ?)""", (NOW,))
+
+
+def test_upgrade_from_user_version_0(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    _legacy_database(path)
+
+    applied = asyncio.run(migrate(path))
+    assert applied == list(range(1, SCHEMA_VERSION + 1))
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        # Existing rows were given change-log versions
+        versions = conn.execute("""
+            SELECT COUNT(*), COUNT(version) FROM (
+                SELECT version FROM checkins UNION ALL SELECT version FROM food_logs
+                UNION ALL SELECT version FROM conversations)
+        """).fetchone()
+        assert versions == (4, 4)
+        assert conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0] == 4
+        # Food logs were split into catalog entries and aggregated
+        assert [row[0] for row in conn.execute("SELECT name FROM foods ORDER BY name")] == ["granola", "greek-yogurt"]
+        stats = dict((row[0], row[1:]) for row in conn.execute("""
+            SELECT f.name, s.log_count, s.mood_delta_sum, s.mood_delta_count, s.last_eaten_at
+            FROM user_food_stats s JOIN foods f ON f.id = s.food_id
+        """))
+        assert stats == {"greek-yogurt": (1, 2, 1, NOW), "granola": (2, 2, 1, "2026-01-06T08:00:00")}
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert {"batch_operations", "weekly_summaries", "embeddings", "recompute_progress"} <= tables
+
+
+def test_migrate_is_a_no_op_when_current(tmp_path):
+    path = str(tmp_path / "fresh.db")
+    assert asyncio.run(migrate(path)) == list(range(1, SCHEMA_VERSION + 1))
+    assert asyncio.run(migrate(path)) == []
+
+
+def test_database_uses_wal(db):
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
@@ -0,0 +1,48 @@
+# test_model_keepalive.py - When models are refreshed before keep_alive lapses
+from model_keepalive import ModelKeepAlive
+
+
+async def _ping(model):
+    return True
+
+
+def _keepalive(**kwargs) -> ModelKeepAlive:
+    keepalive = ModelKeepAlive(_ping, keep_alive=600, active_window=3600, check_interval=60, **kwargs)
+    keepalive.models = {"small", "standard"}
+    return keepalive
+
+
+def test_refreshed_shortly_before_keep_alive_lapses():
+    keepalive = _keepalive()
+    keepalive.last_used = {"small": 1000.0, "standard": 1000.0}
+    keepalive.last_loaded = {"small": 1000.0, "standard": 1000.0}
+
+    # Due once less than two check intervals of keep_alive remain
+    assert keepalive.due(now=1000.0 + 479) == []
+    assert sorted(keepalive.due(now=1000.0 + 480)) == ["small", "standard"]
+
+    # A refreshed model waits for its next lapse
+    keepalive.last_loaded["small"] = 1480.0
+    assert keepalive.due(now=1490.0) == ["standard"]
+
+
+def test_idle_models_are_left_to_unload():
+    keepalive = _keepalive()
+    keepalive.last_used = {"small": 1000.0, "standard": 5000.0}
+    keepalive.last_loaded = {"small": 5000.0, "standard": 5000.0}
+    # small has been idle past the active window, standard has not
+    assert keepalive.due(now=5000.0 + 500) == ["standard"]
+    assert keepalive.due(now=5000.0 + 3600) == []
+
+
+def test_usually_busy_hour_keeps_idle_models_loaded():
+    keepalive = _keepalive()
+    keepalive.last_used = {"small": 0.0}
+    keepalive.last_loaded = {"small": 0.0, "standard": 0.0}
+    assert keepalive.due(now=100000.0) == []
+
+    # Traffic history concentrated in the current hour
+    for _ in range(48):
+        keepalive.touch("other")
+    keepalive.last_loaded.pop("other")
+    assert sorted(keepalive.due(now=100000.0)) == ["small", "standard"]
@@ -0,0 +1,49 @@
+# test_model_routing.py - Per-task policies, the override file and tier resolution
+import json
+
+from model_routing import DEFAULT_POLICIES, ModelRouter
+
+
+def test_defaults_without_a_policy_file(tmp_path):
+    router = ModelRouter(str(tmp_path / "missing.json"))
+    assert router.policy("insight") == DEFAULT_POLICIES["insight"]
+    assert router.model("insight") == "llama3.2:1b"
+    assert router.model("chat") == "llama3.2:3b"
+
+
+def test_policy_file_overrides_tiers_and_tasks(tmp_path):
+    path = tmp_path / "model_policy.json"
+    path.write_text(json.dumps({
+        "tiers": {"small": "qwen2.5:1.5b", "large": "llama3.1:8b"},
+        "tasks": {"insight": {"num_predict": 60}, "chat": {"tier": "large"}, "haiku": {"tier": "small"}},
+    }))
+    router = ModelRouter(str(path))
+
+    assert router.model("insight") == "qwen2.5:1.5b"
+    assert router.policy("insight")["num_predict"] == 60
+    assert router.policy("insight")["stop"] == ["\n\n"]
+    assert router.model("chat") == "llama3.1:8b"
+    # A new task starts from the chat defaults
+    assert router.policy("haiku")["num_predict"] == DEFAULT_POLICIES["chat"]["num_predict"]
+    assert router.model("haiku") == "qwen2.5:1.5b"
+    # Defaults are copied, never edited
+    assert DEFAULT_POLICIES["insight"]["num_predict"] == 80
+
+
+def test_unknown_task_uses_the_chat_policy(tmp_path):
+    router = ModelRouter(None)
+    request = router.request("nonexistent", [{"role": "user", "content": "hi"}])
+    assert request["model"] == router.model("chat")
+    assert request["options"]["num_predict"] == DEFAULT_POLICIES["chat"]["num_predict"]
+    assert router.timeout("nonexistent") == DEFAULT_POLICIES["chat"]["timeout"]
+
+
+def test_tiers_missing_from_the_server_fall_back_to_standard():
+    router = ModelRouter(None)
+    assert router.resolve(["llama3.2:3b"], "llama3.2:3b") == {"small": "llama3.2:3b", "standard": "llama3.2:3b"}
+    assert router.model("insight") == "llama3.2:3b"
+
+    # Neither tier served: the configured fallback, else whatever the server has
+    assert router.resolve(["mistral:7b"], "llama3.2:3b")["small"] == "mistral:7b"
+    assert router.resolve(["phi3:mini", "mistral:7b"], "mistral:7b") == {"small": "mistral:7b",
+                                                                        "standard": "mistral:7b"}
@@ -0,0 +1,68 @@
+# test_rate_limit.py - Token buckets, 429 responses and budgets shared across workers
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from rate_limit import RateLimiter
+from shared_cache import SharedCache
+
+LIMITS = {"login": (3, 6)}  # burst of 3, one token every 10 seconds
+
+
+def test_burst_then_429_with_retry_after():
+    async def scenario():
+        limiter = RateLimiter(LIMITS)
+        for _ in range(3):
+            await limiter.check("login", "ip:1.2.3.4")
+        with pytest.raises(HTTPException) as raised:
+            await limiter.check("login", "ip:1.2.3.4")
+        # Other clients keep their own budget
+        await limiter.check("login", "ip:5.6.7.8")
+        return raised.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert 1 <= int(error.headers["Retry-After"]) <= 10
+
+
+def test_full_buckets_expire_from_the_front():
+    limiter = RateLimiter(LIMITS)
+    asyncio.run(limiter.try_acquire("login", "a"))
+    asyncio.run(limiter.try_acquire("login", "b"))
+    # Pretend both were last touched long ago and have refilled
+    for bucket in limiter.buckets.values():
+        bucket[1] -= 3600
+    asyncio.run(limiter.try_acquire("login", "c"))
+    assert list(limiter.buckets) == [("login", "c")]
+
+
+def test_max_keys_evicts_least_recently_used():
+    limiter = RateLimiter(LIMITS, max_keys=2)
+    for key in ("a", "b", "a", "c"):
+        asyncio.run(limiter.try_acquire("login", key))
+    assert list(limiter.buckets) == [("login", "a"), ("login", "c")]
+
+
+def test_workers_share_one_budget(tmp_path):
+    async def scenario():
+        caches = [SharedCache(str(tmp_path / "cache.db")) for _ in range(2)]
+        for cache in caches:
+            await cache.init()
+        try:
+            # Two workers, each with its own limiter, serving the same client
+            workers = [RateLimiter(LIMITS, shared=cache) for cache in caches]
+            results = [await workers[i % 2].try_acquire("login", "ip:1.2.3.4") for i in range(5)]
+        finally:
+            for cache in caches:
+                await cache.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert results[:3] == [0.0, 0.0, 0.0]
+    assert all(9 < retry_after <= 10 for retry_after in results[3:])
+
+
+def test_rejects_non_positive_refill():
+    with pytest.raises(ValueError):
+        RateLimiter({"login": (3, 0)})
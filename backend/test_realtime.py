@@ -0,0 +1,67 @@
+# test_realtime.py - Per-user WebSocket connection cap and the /ws channel
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from realtime import ConnectionManager
+
+
+def test_reserve_enforces_cap_before_handshake():
+    manager = ConnectionManager(max_per_user=2)
+    # Two handshakes in flight use up the cap before either registers
+    assert manager.reserve("u1")
+    assert manager.reserve("u1")
+    assert not manager.reserve("u1")
+    assert manager.reserve("u2")
+
+
+def test_release_frees_reserved_slot():
+    manager = ConnectionManager(max_per_user=1)
+    assert manager.reserve("u1")
+    manager.release("u1")
+    assert manager.reserved == {}
+    assert manager.reserve("u1")
+
+
+def test_registered_connections_count_toward_cap():
+    class FakeConnection:
+        user_id = "u1"
+
+    manager = ConnectionManager(max_per_user=2)
+    connection = FakeConnection()
+    assert manager.reserve("u1")
+    manager.register(connection)
+    assert manager.reserved == {}
+    assert manager.reserve("u1")
+    assert not manager.reserve("u1")
+
+    manager.unregister(connection)
+    assert manager.reserve("u1")
+
+
+def _token(client, headers):
+    return headers["Authorization"].split()[1]
+
+
+def test_rejections_carry_their_close_codes(client, auth_headers, monkeypatch):
+    import main
+
+    with client.websocket_connect("/ws?token=not-a-token") as websocket:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == 4401
+
+    monkeypatch.setattr(main, "connection_manager", ConnectionManager(max_per_user=1))
+    token = _token(client, auth_headers)
+    with client.websocket_connect(f"/ws?token={token}"):
+        with client.websocket_connect(f"/ws?token={token}") as second:
+            with pytest.raises(WebSocketDisconnect) as closed:
+                second.receive_json()
+    assert closed.value.code == 4429
+
+
+def test_malformed_frame_keeps_the_connection(client, auth_headers):
+    with client.websocket_connect(f"/ws?token={_token(client, auth_headers)}") as websocket:
+        websocket.send_text("{not json")
+        assert websocket.receive_json()["type"] == "error"
+        websocket.send_json({"type": "bogus"})
+        assert websocket.receive_json() == {"type": "error", "detail": "Unknown message type: bogus"}
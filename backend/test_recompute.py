@@ -0,0 +1,76 @@
+# test_recompute.py - Bulk recompute matches the weekly job and resumes where it stopped
+import asyncio
+import sqlite3
+from datetime import date, timedelta
+
+import recompute
+from models import UserCreate
+from weekly_summary import compute_weekly_summaries
+
+WEEK = date(2026, 10, 5)
+
+
+def _seed(db, user_ids):
+    checkins, food_logs = [], []
+    for number, user_id in enumerate(user_ids):
+        for day in range(-7, 7, 2 + number):
+            created_at = f"{WEEK + timedelta(days=day)}T0{number + 7}:30:00"
+            checkins.append((f"{user_id}-c{day}", user_id, "morning", ("low", "good", "neutral")[day % 3],
+                             3, 2 + day % 5, 6.5 + number if day % 2 else None, None, None, None, created_at))
+            food_logs.append((f"{user_id}-f{day}", user_id, "rice, beans" if day % 2 else "tea", "lunch",
+                              3, 4 + day % 3 if day > 0 else None, created_at))
+    with sqlite3.connect(db.db_path) as conn:
+        conn.executemany("""
+            INSERT INTO checkins (id, user_id, checkin_type, mood, energy_level, stress_level, sleep_hours,
+                                  exercise_minutes, notes, gratitude, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, checkins)
+        conn.executemany("""
+            INSERT INTO food_logs (id, user_id, food_name, meal_type, mood_before, mood_after, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, food_logs)
+    asyncio.run(db.rebuild_food_catalog())
+
+
+def _users(db, count):
+    return [asyncio.run(db.create_user(UserCreate(name=f"User {index}", email=f"u{index}@example.com",
+                                                  password="x")))["id"] for index in range(count)]
+
+
+def test_per_user_summaries_match_the_weekly_job(db):
+    user_ids = _users(db, 3)
+    _seed(db, user_ids)
+
+    with sqlite3.connect(db.db_path) as conn:
+        per_user = {user_id: recompute.user_weekly_summaries(conn, user_id, WEEK) for user_id in user_ids}
+    for week in (WEEK - timedelta(days=7), WEEK):
+        weekly = asyncio.run(compute_weekly_summaries(db.db_path, week))
+        assert weekly
+        assert weekly == {user_id: per_user[user_id][week.isoformat()]
+                          for user_id in user_ids if week.isoformat() in per_user[user_id]}
+
+
+def test_resume_skips_finished_users(db):
+    user_ids = _users(db, 5)
+    _seed(db, user_ids)
+    finished = user_ids[:2]
+    with sqlite3.connect(db.db_path) as conn:
+        conn.executemany(
+            "INSERT INTO recompute_progress (job, user_id, completed_at) VALUES ('food_stats', ?, '2026-10-18')",
+            [(user_id,) for user_id in finished])
+        # A marker the recompute would replace if it touched these users
+        conn.executemany("UPDATE user_food_stats SET log_count = 99 WHERE user_id = ?",
+                         [(user_id,) for user_id in finished])
+
+    result = recompute.run(db.db_path, ["food_stats"], workers=1, batch_size=2, resume=True, last_week=WEEK)
+    assert result["users"] == 3
+    with sqlite3.connect(db.db_path) as conn:
+        counts = dict(conn.execute("SELECT user_id, MAX(log_count) FROM user_food_stats GROUP BY user_id"))
+        done = {row[0] for row in conn.execute("SELECT user_id FROM recompute_progress WHERE job = 'food_stats'")}
+    assert {user_id: counts[user_id] for user_id in finished} == {user_id: 99 for user_id in finished}
+    assert all(counts[user_id] < 99 for user_id in user_ids[2:])
+    assert done == set(user_ids)
+
+    # Nothing left to resume; a fresh run starts over
+    assert recompute.run(db.db_path, ["food_stats"], workers=1, resume=True, last_week=WEEK)["users"] == 0
+    assert recompute.run(db.db_path, ["food_stats"], workers=1, last_week=WEEK)["users"] == 5
@@ -0,0 +1,64 @@
+# test_semantic_cache.py - Near-duplicate replies and the global entry budget
+import asyncio
+
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+CONTEXT = {"recent_mood": "low", "avg_stress": 8}
+
+
+class OneHotEmbedder:
+    """Each distinct message gets its own axis, so only exact repeats match"""
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+        self.axes = {}
+
+    async def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row, self.axes.setdefault(text, len(self.axes) % self.dim)] = 1.0
+        return matrix
+
+
+def _remember(cache, user_id, message, reply):
+    _, vector = asyncio.run(cache.lookup(user_id, message, CONTEXT))
+    cache.store(user_id, CONTEXT, vector, reply)
+
+
+def test_hit_for_the_same_user_only():
+    cache = SemanticCache(OneHotEmbedder(), scope="user")
+    _remember(cache, "u1", "I feel anxious", "Let's breathe together.")
+    assert asyncio.run(cache.lookup("u1", "I feel anxious", CONTEXT))[0] == "Let's breathe together."
+    assert asyncio.run(cache.lookup("u2", "I feel anxious", CONTEXT))[0] is None
+
+
+def test_budget_is_global_and_evicts_least_recently_used_scope():
+    cache = SemanticCache(OneHotEmbedder(), scope="user", max_entries=4, max_scope_entries=3)
+    for user_id in ("u1", "u2"):
+        _remember(cache, user_id, f"{user_id} first", "reply")
+        _remember(cache, user_id, f"{user_id} second", "reply")
+    # u1 was used last, so u2 loses its oldest entry when u3 arrives
+    assert asyncio.run(cache.lookup("u1", "u1 first", CONTEXT))[0] == "reply"
+    _remember(cache, "u3", "u3 first", "reply")
+
+    assert len(cache) == 4
+    assert asyncio.run(cache.lookup("u2", "u2 first", CONTEXT))[0] is None
+    assert asyncio.run(cache.lookup("u2", "u2 second", CONTEXT))[0] == "reply"
+    assert asyncio.run(cache.lookup("u1", "u1 first", CONTEXT))[0] == "reply"
+
+    # Many single-entry scopes never exceed the budget either
+    for index in range(20):
+        _remember(cache, f"user{index}", "hello", "reply")
+    assert len(cache) == 4
+    assert sum(len(index) for index in cache._indexes.values()) == 4
+
+
+def test_expired_entries_leave_the_budget():
+    cache = SemanticCache(OneHotEmbedder(), scope="user", ttl=-1)
+    _remember(cache, "u1", "hello", "reply")
+    _remember(cache, "u1", "again", "reply")
+    assert len(cache) == 1
+    assert asyncio.run(cache.lookup("u1", "hello", CONTEXT))[0] is None
+    assert len(cache) == 0 and not cache._indexes
@@ -0,0 +1,56 @@
+# test_shared_cache.py - Cross-worker invalidations survive housekeeping
+import asyncio
+import time
+
+import shared_cache
+from shared_cache import SharedCache
+
+
+def test_invalidations_after_housekeeping_reach_other_workers(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "cache.db")
+        writer, reader = SharedCache(path, poll_interval=0.01), SharedCache(path, poll_interval=0.01)
+        await writer.init()
+        await reader.init()
+        try:
+            seen = []
+            for round in range(3):
+                reader._remember("context:u1", {"round": round}, time.time() + 60)
+                await writer.invalidate("context:u1")
+                await asyncio.sleep(0.1)
+                seen.append("context:u1" not in reader._local)
+                # Everything is old enough to prune; the newest id must survive
+                await writer._housekeeping(time.time() + 3600)
+            async with writer._db.execute("SELECT COUNT(*) FROM cache_invalidations") as cursor:
+                (left,) = await cursor.fetchone()
+            return seen, left
+        finally:
+            await reader.close()
+            await writer.close()
+
+    seen, left = asyncio.run(scenario())
+    assert seen == [True, True, True]
+    assert left == 1
+
+
+def test_lease_is_held_by_one_worker_until_it_lapses(tmp_path, monkeypatch):
+    async def scenario():
+        path = str(tmp_path / "cache.db")
+        first, second = SharedCache(path), SharedCache(path)
+        await first.init()
+        await second.init()
+        try:
+            results = [await first.acquire_lease("archive", 60)]
+            # Same cache file, different process
+            monkeypatch.setattr(shared_cache.os, "getpid", lambda: -1)
+            results.append(await second.acquire_lease("archive", 60))
+            results.append(await second.acquire_lease("weekly-summaries", 60))
+            await first._db.execute("UPDATE leases SET expires_at = 0 WHERE name = 'archive'")
+            await first._db.commit()
+            results.append(await second.acquire_lease("archive", 60))
+            return results
+        finally:
+            await second.close()
+            await first.close()
+
+    assert asyncio.run(scenario()) == [True, False, True, True]
@@ -0,0 +1,52 @@
+# test_structured_output.py - Salvaging suggestion lists from imperfect LLM replies
+import json
+
+from models import MindfulPractice
+from structured_output import list_schema, salvage_json_list, validate_items
+
+PRACTICE = {"name": "Box breathing", "description": "Breathe in a square", "duration": 4,
+            "difficulty": "easy", "benefits": ["calm"], "instructions": ["in 4", "hold 4"]}
+OTHER = dict(PRACTICE, name="Body scan", duration=10)
+
+
+def test_complete_object():
+    assert salvage_json_list(json.dumps({"practices": [PRACTICE, OTHER]}), "practices") == ([PRACTICE, OTHER], True)
+
+
+def test_fenced_reply_with_prose():
+    text = "Here you go:\n```json\n" + json.dumps([PRACTICE]) + "\n```\nEnjoy!"
+    assert salvage_json_list(text, "practices") == ([PRACTICE], True)
+
+
+def test_truncated_reply_keeps_complete_items():
+    text = json.dumps({"practices": [PRACTICE, OTHER]})
+    items, complete = salvage_json_list(text[: text.index('"Body scan"') + 5], "practices")
+    assert (items, complete) == ([PRACTICE], False)
+
+
+def test_truncated_bare_array():
+    text = json.dumps([PRACTICE, OTHER])[:-20]
+    assert salvage_json_list(text, "practices") == ([PRACTICE], False)
+
+
+def test_other_key_and_single_object():
+    assert salvage_json_list(json.dumps({"items": [PRACTICE]}), "practices") == ([PRACTICE], True)
+    assert salvage_json_list(json.dumps(PRACTICE), "practices") == ([PRACTICE], True)
+
+
+def test_no_json():
+    assert salvage_json_list("Sorry, I can't help with that.", "practices") == ([], False)
+    assert salvage_json_list(None, "practices") == ([], False)
+
+
+def test_validate_items_drops_invalid():
+    items = [PRACTICE, dict(PRACTICE, duration="long"), "not an object", {"name": "partial"}]
+    assert [practice.name for practice in validate_items(items, MindfulPractice)] == ["Box breathing"]
+
+
+def test_list_schema_fixes_the_count():
+    schema = list_schema(MindfulPractice, "practices", 3)
+    assert schema["required"] == ["practices"]
+    array = schema["properties"]["practices"]
+    assert (array["minItems"], array["maxItems"]) == (3, 3)
+    assert set(array["items"]["required"]) == set(PRACTICE)
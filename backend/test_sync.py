@@ -0,0 +1,81 @@
+# test_sync.py - Delta sync: versions increase and pages resume from the last one
+import asyncio
+from datetime import datetime, timedelta
+
+import aiosqlite
+
+from archive import archive_old_rows
+from database import DatabaseManager
+from models import CheckinCreate, JournalCreate, UserCreate
+
+CHECKIN = CheckinCreate(checkin_type="morning", mood="good", energy_level=3, stress_level=4, hunger_level=5)
+
+
+def _write(db, user_id, count):
+    async def write():
+        rows = []
+        for i in range(count):
+            rows.append(await db.create_journal_entry(user_id, JournalCreate(content=f"entry {i}")))
+        rows.append(await db.create_checkin(user_id, CHECKIN))
+        return rows
+    return asyncio.run(write())
+
+
+def test_versions_increase_and_pages_resume(db, user_id):
+    rows = _write(db, user_id, 5)
+    versions = [row["version"] for row in rows]
+    assert versions == sorted(versions) and len(set(versions)) == len(versions)
+
+    seen, since, pages = [], 0, 0
+    while True:
+        page = asyncio.run(db.get_changes_since(user_id, since, limit=2))
+        seen += [row["id"] for table in ("journal_entries", "checkins") for row in page["changes"][table]]
+        since, pages = page["version"], pages + 1
+        if not page["has_more"]:
+            break
+    assert pages == 3
+    assert sorted(seen) == sorted(row["id"] for row in rows)
+    assert since == versions[-1]
+
+    # Nothing new: the cursor stays put
+    assert asyncio.run(db.get_changes_since(user_id, since)) == {
+        "version": since, "has_more": False,
+        "changes": {table: [] for table in page["changes"]}, "deleted": []}
+
+
+def test_deletes_and_other_users(db, user_id):
+    other = asyncio.run(db.create_user(UserCreate(name="Other", email="other@example.com", password="x")))["id"]
+    mine = _write(db, user_id, 1)
+    _write(db, other, 2)
+    since = asyncio.run(db.get_changes_since(user_id))["version"]
+
+    async def delete(row_id):
+        async with aiosqlite.connect(db.db_path) as conn:
+            await conn.execute("BEGIN IMMEDIATE")
+            await conn.execute("DELETE FROM journal_entries WHERE id = ?", (row_id,))
+            version = await DatabaseManager._record_changes(conn, [(user_id, "journal_entries", row_id, "delete")])
+            await conn.commit()
+        return version
+
+    version = asyncio.run(delete(mine[0]["id"]))
+    page = asyncio.run(db.get_changes_since(user_id, since))
+    assert page["deleted"] == [{"table": "journal_entries", "id": mine[0]["id"], "version": version}]
+    assert page["version"] == version
+    assert all(not rows for rows in page["changes"].values())
+
+
+def test_archived_conversations_are_synced_as_deletes(db, user_id):
+    old = (datetime.utcnow() - timedelta(days=400)).isoformat()
+    asyncio.run(db.save_conversations([
+        {"id": "old", "user_id": user_id, "user_message": "hi", "ai_response": "hello", "created_at": old},
+        {"id": "new", "user_id": user_id, "user_message": "hi", "ai_response": "hello",
+         "created_at": datetime.utcnow().isoformat()},
+    ]))
+    since = asyncio.run(db.get_changes_since(user_id))["version"]
+
+    asyncio.run(archive_old_rows(db.db_path, days=180))
+    page = asyncio.run(db.get_changes_since(user_id, since))
+    assert [(entry["table"], entry["id"]) for entry in page["deleted"]] == [("conversations", "old")]
+    # Still readable from the archive
+    history = asyncio.run(db.get_conversation_history(user_id, include_archived=True))
+    assert {row["id"] for row in history} == {"old", "new"}
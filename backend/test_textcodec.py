@@ -0,0 +1,46 @@
+# test_textcodec.py - Compressed text columns round-trip across dictionaries
+import pytest
+
+from textcodec import (CURRENT_DICTIONARY, DICTIONARIES, MAGIC, MIN_COMPRESS_LENGTH, compress_text,
+                       decode_row, decompress_text)
+from train_dictionary import train
+
+TEXT = ("I'm here to listen and support you. What's on your mind today? "
+        "Take a moment to notice how your body feels. ") * 3
+
+
+@pytest.mark.parametrize("dictionary_id", sorted(DICTIONARIES))
+def test_round_trip_with_every_dictionary(dictionary_id):
+    encoded = compress_text(TEXT, dictionary_id)
+    assert isinstance(encoded, bytes)
+    assert encoded.startswith(MAGIC + bytes([dictionary_id]))
+    assert decompress_text(encoded) == TEXT
+
+
+def test_new_rows_use_current_dictionary():
+    assert compress_text(TEXT)[len(MAGIC)] == CURRENT_DICTIONARY
+
+
+def test_short_values_stay_text():
+    short = "x" * (MIN_COMPRESS_LENGTH - 1)
+    assert compress_text(short) == short
+    assert decompress_text(short) == short
+    assert compress_text(None) is None
+
+
+def test_decode_row_only_touches_compressed_columns():
+    row = {"id": "1", "user_message": TEXT, "ai_response": compress_text(TEXT)}
+    assert decode_row("conversations", row) == {"id": "1", "user_message": TEXT, "ai_response": TEXT}
+
+
+def test_unicode_round_trip():
+    text = "Heute war ein guter Tag 🌞 — ich habe gut geschlafen und fühle mich ruhig. " * 2
+    assert decompress_text(compress_text(text)) == text
+
+
+def test_trained_dictionary_keeps_recurring_phrases():
+    values = [f"Thanks for sharing, {name}. Remember that small steps still count as progress."
+              for name in ("Sam", "Alex", "Jo", "Kim")]
+    dictionary = train(values, size=256)
+    assert b"Remember that small steps still count as progress." in dictionary
+    assert len(dictionary) <= 256
@@ -0,0 +1,40 @@
+# test_weekly_summary.py - Narratives are only stored when the model wrote them
+import asyncio
+import sqlite3
+from datetime import date
+
+from ai_service import AIService
+from weekly_summary import generate_narratives, store_weekly_summaries
+
+WEEK = date(2026, 10, 5)
+
+
+def _stored(db, user_id):
+    with sqlite3.connect(db.db_path) as conn:
+        return conn.execute("SELECT narrative, narrative_claimed_at FROM weekly_summaries WHERE user_id = ?",
+                            (user_id,)).fetchone()
+
+
+class FakeService:
+    def __init__(self, replies):
+        self.replies = list(replies)
+
+    async def generate_weekly_summary(self, user_id, summary=None):
+        return self.replies.pop(0)
+
+
+def test_unavailable_model_leaves_narrative_null_and_unclaimed(db, user_id):
+    asyncio.run(store_weekly_summaries(db.db_path, WEEK, {user_id: {"avg_mood": 3.0}}))
+    assert asyncio.run(generate_narratives(db.db_path, FakeService([None]), WEEK, spacing=0)) == 0
+    assert _stored(db, user_id) == (None, None)
+
+    # The next run picks the same week up again
+    assert asyncio.run(generate_narratives(db.db_path, FakeService(["A calm week."]), WEEK, spacing=0)) == 1
+    assert _stored(db, user_id)[0] == "A calm week."
+
+
+def test_uninitialized_service_returns_no_narrative():
+    service = AIService()
+    assert asyncio.run(service.generate_weekly_summary("u1")) is None
+    # Chat still falls back to a canned reply
+    assert asyncio.run(service._generate_response("hello"))
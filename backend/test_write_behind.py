@@ -0,0 +1,107 @@
+# test_write_behind.py - Buffered conversations: visibility, shutdown flush and poison rows
+import asyncio
+import sqlite3
+
+import pytest
+from fastapi import HTTPException
+
+from write_behind import ConversationWriteBuffer, MAX_FLUSH_FAILURES
+
+
+def test_pending_rows_visible_then_flushed_on_stop(db, user_id):
+    async def scenario():
+        buffer = ConversationWriteBuffer(db, flush_interval=3600)
+        await buffer.start()
+        row = await buffer.add(user_id, "hello", "hi there")
+        history = await db.get_conversation_history(user_id)
+        stored_before = await db._get_stored_conversation_history(user_id, 10)
+        await buffer.stop()
+        stored_after = await db._get_stored_conversation_history(user_id, 10)
+        return row, history, stored_before, stored_after
+
+    row, history, stored_before, stored_after = asyncio.run(scenario())
+    assert [entry["id"] for entry in history] == [row["id"]]
+    assert stored_before == []
+    assert [entry["id"] for entry in stored_after] == [row["id"]]
+    assert stored_after[0]["ai_response"] == "hi there"
+
+
+def test_poison_row_is_dropped_and_rest_are_written(db, user_id):
+    async def scenario():
+        buffer = ConversationWriteBuffer(db, flush_interval=3600)
+        good = [await buffer.add(user_id, f"message {i}", "reply") for i in range(3)]
+        # A row sqlite cannot bind fails every batch it is part of
+        buffer._pending.insert(1, dict(good[0], id="poison", user_message={"not": "text"}))
+        for _ in range(MAX_FLUSH_FAILURES):
+            await buffer.flush()
+        stored = await db._get_stored_conversation_history(user_id, 10)
+        return good, buffer._pending, stored
+
+    good, pending, stored = asyncio.run(scenario())
+    assert pending == []
+    assert {row["id"] for row in stored} == {row["id"] for row in good}
+
+
+class LockedDatabase:
+    """Fails multi-row writes as if the file were locked; single rows succeed"""
+
+    def __init__(self):
+        self.conversation_buffer = None
+        self.written = []
+
+    async def save_conversations(self, rows):
+        if len(rows) > 1:
+            raise sqlite3.OperationalError("database is locked")
+        self.written += rows
+
+
+def test_full_buffer_writes_through_instead_of_failing():
+    async def scenario():
+        database = LockedDatabase()
+        buffer = ConversationWriteBuffer(database, max_pending=2, flush_interval=3600)
+        await buffer.add("u1", "one", "reply")
+        await buffer.add("u1", "two", "reply")
+        row = await buffer.add("u1", "three", "reply")
+        return database, buffer, row
+
+    database, buffer, row = asyncio.run(scenario())
+    assert database.written == [row]
+    assert len(buffer._pending) == 2
+
+
+def test_operational_errors_keep_rows_queued():
+    async def scenario():
+        database = LockedDatabase()
+        buffer = ConversationWriteBuffer(database, flush_interval=3600)
+        for i in range(3):
+            await buffer.add("u1", f"message {i}", "reply")
+
+        async def unavailable(rows):
+            raise sqlite3.OperationalError("unable to open database file")
+
+        database.save_conversations = unavailable
+        for _ in range(MAX_FLUSH_FAILURES + 1):
+            await buffer.flush()
+        return buffer
+
+    assert len(asyncio.run(scenario())._pending) == 3
+
+
+def test_failed_write_through_is_503_with_retry_after():
+    async def scenario():
+        database = LockedDatabase()
+        buffer = ConversationWriteBuffer(database, max_pending=1, flush_interval=3600)
+        await buffer.add("u1", "one", "reply")
+
+        async def unavailable(rows):
+            raise sqlite3.OperationalError("database is locked")
+
+        database.save_conversations = unavailable
+        with pytest.raises(HTTPException) as raised:
+            await buffer.add("u1", "two", "reply")
+        return buffer, raised.value
+
+    buffer, error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert int(error.headers["Retry-After"]) >= 1
+    assert [row["user_message"] for row in buffer._pending] == ["one"]
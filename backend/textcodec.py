@@ -0,0 +1,123 @@
+# backend/textcodec.py - Transparent compression for large text columns
+#
+# journal_entries.content, journal_entries.ai_reflection and
+# conversations.ai_response are stored as zlib-compressed BLOBs primed with a
+# shared preset dictionary. Short entries compress poorly on their own, so the
+# dictionary carries the phrasing our AI responses and journal entries share;
+# zlib then only has to encode what is new in each row. Values that do not
+# shrink are stored as plain TEXT, and readers accept both forms, so existing
+# rows keep working until migrate_text_columns() rewrites them.
+#
+# Usage:
+#   python textcodec.py --migrate            # compress existing rows in mindmate.db
+#   python train_dictionary.py --id 3        # train a new dictionary from sampled rows
+import argparse
+import asyncio
+import os
+import zlib
+from typing import Any, Dict, Optional
+
+# table -> columns stored compressed
+COMPRESSED_COLUMNS = {
+    "journal_entries": ("content", "ai_reflection"),
+    "conversations": ("ai_response",),
+}
+
+COMPRESS_TEXT = os.getenv("MINDMATE_COMPRESS_TEXT", "1") == "1"
+MIN_COMPRESS_LENGTH = 64
+
+# Header: magic + dictionary id, so the dictionary can be retrained later
+# without breaking rows written with an older one. 0xFF never starts valid
+# UTF-8, and unlike a NUL byte it does not truncate SQLite's text functions
+# (trim(), length()) when they see the BLOB.
+MAGIC = b"\xffmz"
+
+# Preset dictionaries, text_dictionaries/<id>.txt. Each was trained from
+# sampled rows by train_dictionary.py; a file never changes once rows are
+# written with it, retraining adds a new id. Dictionary 1 predates the
+# trainer and holds hand-picked phrases.
+DICTIONARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "text_dictionaries")
+
+
+def _load_dictionaries() -> Dict[int, bytes]:
+    dictionaries = {}
+    for name in os.listdir(DICTIONARY_DIR):
+        stem, ext = os.path.splitext(name)
+        if ext == ".txt" and stem.isdigit():
+            with open(os.path.join(DICTIONARY_DIR, name), "rb") as f:
+                dictionaries[int(stem)] = f.read()
+    return dictionaries
+
+
+DICTIONARIES = _load_dictionaries()
+CURRENT_DICTIONARY = 2
+
+
+def compress_text(value: Optional[str], dictionary_id: int = CURRENT_DICTIONARY):
+    """Return bytes for storage, or the original string if compression does not help"""
+    if not COMPRESS_TEXT or value is None or len(value) < MIN_COMPRESS_LENGTH:
+        return value
+    compressor = zlib.compressobj(level=6, wbits=-15, zdict=DICTIONARIES[dictionary_id])
+    payload = compressor.compress(value.encode()) + compressor.flush()
+    encoded = MAGIC + bytes([dictionary_id]) + payload
+    return encoded if len(encoded) < len(value.encode()) else value
+
+
+def decompress_text(value: Any) -> Any:
+    if not isinstance(value, (bytes, bytearray)) or not value.startswith(MAGIC):
+        return value
+    dictionary_id = value[len(MAGIC)]
+    decompressor = zlib.decompressobj(wbits=-15, zdict=DICTIONARIES[dictionary_id])
+    return (decompressor.decompress(value[len(MAGIC) + 1:]) + decompressor.flush()).decode()
+
+
+def decode_row(table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    """Decompress the compressed columns of a row dict in place"""
+    for column in COMPRESSED_COLUMNS.get(table, ()):
+        if column in row:
+            row[column] = decompress_text(row[column])
+    return row
+
+
+async def migrate_text_columns(db_path: str, batch_size: int = 500) -> Dict[str, int]:
+    """Compress existing plain-text values; safe to interrupt and re-run"""
+    from db_connection import connect
+
+    rewritten = {}
+    async with connect(db_path) as db:
+        for table, columns in COMPRESSED_COLUMNS.items():
+            rewritten[table] = 0
+            for column in columns:
+                last_rowid = 0
+                while True:
+                    async with db.execute(f"""
+                        SELECT rowid, {column} FROM {table}
+                        WHERE rowid > ? AND typeof({column}) = 'text' AND length({column}) >= ?
+                        ORDER BY rowid LIMIT ?
+                    """, (last_rowid, MIN_COMPRESS_LENGTH, batch_size)) as cursor:
+                        rows = await cursor.fetchall()
+                    if not rows:
+                        break
+                    last_rowid = rows[-1][0]
+                    updates = []
+                    for rowid, value in rows:
+                        encoded = compress_text(value)
+                        if isinstance(encoded, bytes):
+                            updates.append((encoded, rowid))
+                    await db.executemany(f"UPDATE {table} SET {column} = ? WHERE rowid = ?", updates)
+                    await db.commit()
+                    rewritten[table] += len(updates)
+    return rewritten
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compress large text columns in place")
+    parser.add_argument("--db", default="mindmate.db")
+    parser.add_argument("--migrate", action="store_true", required=True)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args(argv)
+    print(f"Compressed values: {asyncio.run(migrate_text_columns(args.db, args.batch_size))}")
+
+
+if __name__ == "__main__":
+    main()
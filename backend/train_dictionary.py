@@ -0,0 +1,135 @@
+# backend/train_dictionary.py - Train the shared zlib dictionary used by textcodec.py
+#
+# Samples values from the compressed columns (COMPRESSED_COLUMNS), counts
+# word sequences that recur across rows and packs the most valuable ones into
+# a preset dictionary, most valuable last (zlib reaches the end of the
+# dictionary most cheaply). A held-out part of the sample is compressed with
+# the new and the current dictionary so the gain can be checked before the
+# dictionary is adopted.
+#
+# Dictionaries are immutable once rows are written with them: train into a
+# new id, check the file in, then point textcodec.CURRENT_DICTIONARY at it.
+#
+# Usage:
+#   python train_dictionary.py --db mindmate.db --id 2
+#   python train_dictionary.py --db snapshot.db --id 3 --sample 5000 --size 16384
+import argparse
+import os
+import random
+import sqlite3
+import zlib
+from collections import Counter
+from typing import Iterable, List
+
+from textcodec import (COMPRESSED_COLUMNS, CURRENT_DICTIONARY, DICTIONARIES, DICTIONARY_DIR,
+                       MIN_COMPRESS_LENGTH, decompress_text)
+
+# zlib only looks back 32 KiB, dictionary included
+MAX_DICTIONARY_SIZE = 32768
+
+
+def sample_values(db_path: str, per_column: int, seed: int = 7) -> List[str]:
+    """Up to per_column random non-trivial values from every compressed column"""
+    rng = random.Random(seed)
+    values = []
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        for table, columns in COMPRESSED_COLUMNS.items():
+            for column in columns:
+                rowids = [row[0] for row in conn.execute(
+                    f"SELECT rowid FROM {table} WHERE {column} IS NOT NULL AND length({column}) >= ?",
+                    (MIN_COMPRESS_LENGTH,))]
+                chosen = sorted(rng.sample(rowids, min(per_column, len(rowids))))
+                for start in range(0, len(chosen), 500):
+                    batch = chosen[start:start + 500]
+                    placeholders = ", ".join("?" for _ in batch)
+                    values += [decompress_text(row[0]) for row in conn.execute(
+                        f"SELECT {column} FROM {table} WHERE rowid IN ({placeholders})", batch)]
+    finally:
+        conn.close()
+    return values
+
+
+def train(values: Iterable[str], size: int, min_rows: int = 2, max_words: int = 12) -> bytes:
+    """Pack word sequences that occur in at least min_rows values into size bytes.
+
+    Each sequence scores (rows it appears in - 1) * length: what the
+    dictionary saves beyond the first occurrence zlib would find anyway.
+    Sequences already contained in a better one are skipped, and a longer
+    sequence replaces the ones it contains.
+    """
+    rows = Counter()
+    for value in values:
+        words = value.split()
+        rows.update({
+            " ".join(words[start:start + length])
+            for length in range(2, max_words + 1)
+            for start in range(len(words) - length + 1)
+        })
+    candidates = sorted(
+        ((count - 1) * len(text.encode()), text) for text, count in rows.items() if count >= min_rows
+    )
+    chosen, used = [], 0
+    for score, text in reversed(candidates):
+        encoded = len(text.encode()) + 1
+        if used + encoded > size:
+            continue
+        if any(text in kept for kept in chosen):
+            continue
+        contained = [kept for kept in chosen if kept in text]
+        for kept in contained:
+            chosen.remove(kept)
+            used -= len(kept.encode()) + 1
+        chosen.append(text)
+        used += encoded
+    # Best phrases last, closest to the data
+    return " ".join(reversed(chosen)).encode()
+
+
+def compressed_size(values: Iterable[str], dictionary: bytes) -> int:
+    total = 0
+    for value in values:
+        compressor = zlib.compressobj(level=6, wbits=-15, zdict=dictionary) if dictionary else \
+            zlib.compressobj(level=6, wbits=-15)
+        total += len(compressor.compress(value.encode()) + compressor.flush())
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train a preset dictionary for compressed text columns")
+    parser.add_argument("--db", default="mindmate.db")
+    parser.add_argument("--id", type=int, required=True, help="new dictionary id (never reuse one)")
+    parser.add_argument("--sample", type=int, default=2000, help="values sampled per column")
+    parser.add_argument("--size", type=int, default=16384, help="dictionary size in bytes")
+    parser.add_argument("--min-rows", type=int, default=2, help="rows a phrase must appear in")
+    args = parser.parse_args(argv)
+    if not 1 <= args.id <= 255:
+        parser.error("--id must fit in one byte (1-255)")
+    if args.id in DICTIONARIES:
+        parser.error(f"dictionary {args.id} already exists; rows may depend on it, train a new id")
+    if args.size > MAX_DICTIONARY_SIZE:
+        parser.error(f"--size cannot exceed {MAX_DICTIONARY_SIZE}")
+
+    values = sample_values(args.db, args.sample)
+    if len(values) < 2:
+        raise SystemExit("Not enough rows to train on")
+    random.Random(11).shuffle(values)
+    held_out = values[: max(1, len(values) // 5)]
+    dictionary = train(values[len(held_out):], args.size, args.min_rows)
+
+    path = os.path.join(DICTIONARY_DIR, f"{args.id}.txt")
+    with open(path, "wb") as f:
+        f.write(dictionary)
+
+    raw = sum(len(value.encode()) for value in held_out)
+    print(f"Trained on {len(values) - len(held_out)} values, {len(dictionary)} bytes -> {path}")
+    print(f"Held-out {len(held_out)} values, {raw} bytes raw:")
+    for label, candidate in (("no dictionary", b""),
+                             (f"dictionary {CURRENT_DICTIONARY} (current)", DICTIONARIES[CURRENT_DICTIONARY]),
+                             (f"dictionary {args.id} (new)", dictionary)):
+        size = compressed_size(held_out, candidate)
+        print(f"  {label:<28}{size:>10} bytes  ratio {raw / size:.2f}")
+
+
+if __name__ == "__main__":
+    main()
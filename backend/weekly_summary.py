@@ -0,0 +1,276 @@
+# backend/weekly_summary.py - Precomputed weekly summaries
+#
+# The numeric part of every active user's WeeklySummary is computed for the
+# last complete week (Monday-Sunday, UTC) with a handful of grouped queries
+# over all users at once, then stored in weekly_summaries. Narratives are
+# generated afterwards one user at a time, spaced out, so the LLM sees a slow
+# trickle off-peak instead of a Monday-morning spike. Each narrative is
+# claimed with an atomic UPDATE, so several workers (or a cron run alongside
+# the server) never generate the same one twice, and an interrupted run
+# picks up where it stopped.
+#
+# Usage:
+#   python weekly_summary.py                          # last complete week
+#   python weekly_summary.py --week-start 2026-10-05 --no-narratives
+import argparse
+import asyncio
+import json
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import aiosqlite
+
+from db_connection import connect
+from models import WeeklySummary
+
+# Hour of day (UTC) the in-process scheduler runs; negative disables it
+WEEKLY_SUMMARY_HOUR = int(os.getenv("MINDMATE_WEEKLY_SUMMARY_HOUR", "3"))
+# Seconds between narrative generations
+NARRATIVE_SPACING = float(os.getenv("MINDMATE_WEEKLY_SUMMARY_SPACING", "1.0"))
+# A claimed narrative not finished after this long is retried
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+MOOD_SCORES = {"very_low": 1, "low": 2, "neutral": 3, "good": 4, "excellent": 5}
+MOOD_SCORE_SQL = "CASE mood {} END".format(
+    " ".join(f"WHEN '{mood}' THEN {score}" for mood, score in MOOD_SCORES.items())
+)
+# Change in average mood (1-5 scale) week over week that counts as a trend
+TREND_THRESHOLD = 0.25
+
+
+def last_complete_week(today: Optional[date] = None) -> date:
+    """Monday of the most recent week that has fully ended"""
+    today = today or datetime.utcnow().date()
+    return today - timedelta(days=today.weekday() + 7)
+
+
+async def compute_weekly_summaries(db_path: str, week_start: date) -> Dict[str, Dict[str, Any]]:
+    """WeeklySummary dicts for every user with a check-in in the week"""
+    start = week_start.isoformat()
+    end = (week_start + timedelta(days=7)).isoformat()
+    previous = (week_start - timedelta(days=7)).isoformat()
+
+    async with connect(db_path) as db:
+        db.row_factory = aiosqlite.Row
+        async with db.execute(f"""
+            SELECT user_id,
+                   SUM(created_at >= :start) AS checkins,
+                   AVG(CASE WHEN created_at >= :start THEN score END) AS avg_mood,
+                   AVG(CASE WHEN created_at < :start THEN score END) AS previous_avg_mood,
+                   AVG(CASE WHEN created_at >= :start THEN stress_level END) AS avg_stress,
+                   AVG(CASE WHEN created_at >= :start THEN sleep_hours END) AS avg_sleep
+            FROM (
+                SELECT user_id, created_at, stress_level, sleep_hours, {MOOD_SCORE_SQL} AS score
+                FROM checkins WHERE created_at >= :previous AND created_at < :end
+            )
+            GROUP BY user_id
+            HAVING checkins > 0
+        """, {"start": start, "end": end, "previous": previous}) as cursor:
+            checkins = {row["user_id"]: dict(row) for row in await cursor.fetchall()}
+
+        moods: Dict[str, List[str]] = {}
+        async with db.execute("""
+            SELECT user_id, mood, COUNT(*) AS n FROM checkins
+            WHERE created_at >= ? AND created_at < ?
+            GROUP BY user_id, mood
+            ORDER BY user_id, n DESC, mood
+        """, (start, end)) as cursor:
+            for row in await cursor.fetchall():
+                moods.setdefault(row["user_id"], []).append(row["mood"])
+
+        async with db.execute("""
+            SELECT user_id, COUNT(*) AS logs,
+                   SUM(mood_before IS NOT NULL AND mood_after IS NOT NULL) AS mindful_logs
+            FROM food_logs WHERE created_at >= ? AND created_at < ?
+            GROUP BY user_id
+        """, (start, end)) as cursor:
+            food = {row["user_id"]: dict(row) for row in await cursor.fetchall()}
+
+        best_foods: Dict[str, str] = {}
+        async with db.execute("""
+            SELECT fl.user_id, f.name, AVG(fl.mood_after - fl.mood_before) AS delta
+            FROM food_logs fl
+            JOIN food_log_items li ON li.log_id = fl.id
+            JOIN foods f ON f.id = li.food_id
+            WHERE fl.created_at >= ? AND fl.created_at < ?
+              AND fl.mood_before IS NOT NULL AND fl.mood_after IS NOT NULL
+            GROUP BY fl.user_id, f.id
+            HAVING delta > 0
+            ORDER BY fl.user_id, delta DESC, f.name
+        """, (start, end)) as cursor:
+            for row in await cursor.fetchall():
+                best_foods.setdefault(row["user_id"], row["name"])
+
+    week_end = (week_start + timedelta(days=6)).isoformat()
+    return {
+        user_id: _build_summary(stats, moods.get(user_id, []), food.get(user_id), best_foods.get(user_id),
+                                start, week_end)
+        for user_id, stats in checkins.items()
+    }
+
+
+def _build_summary(stats: Dict[str, Any], moods: List[str], food: Optional[Dict[str, Any]],
+                   best_food: Optional[str], week_start: str, week_end: str) -> Dict[str, Any]:
+    avg_mood = stats["avg_mood"] or 0.0
+    previous = stats["previous_avg_mood"]
+    if previous is None or stats["avg_mood"] is None:
+        trend = "insufficient_data"
+    elif avg_mood - previous >= TREND_THRESHOLD:
+        trend = "improving"
+    elif previous - avg_mood >= TREND_THRESHOLD:
+        trend = "declining"
+    else:
+        trend = "stable"
+    # Share of meals logged with mood before and after eating, on a 0-10 scale
+    mindful_score = 10.0 * food["mindful_logs"] / food["logs"] if food else 0.0
+
+    insights = [f"You checked in {stats['checkins']} times this week"
+                + (f" with an average mood of {avg_mood:.1f}/5." if stats["avg_mood"] is not None else ".")]
+    if trend in ("improving", "declining"):
+        insights.append(f"Your mood was {trend} compared with the week before.")
+    if moods:
+        insights.append(f"Your most frequent mood was {moods[0].replace('_', ' ')}.")
+    if stats["avg_sleep"] is not None:
+        insights.append(f"You slept {stats['avg_sleep']:.1f} hours a night on average.")
+    if best_food:
+        insights.append(f"Your mood lifted most after eating {best_food}.")
+
+    recommendations = []
+    if stats["avg_stress"] is not None and stats["avg_stress"] >= 7:
+        recommendations.append("Try a short breathing practice on high-stress days.")
+    if stats["avg_sleep"] is not None and stats["avg_sleep"] < 7:
+        recommendations.append("Aim for a consistent bedtime to get closer to 7-8 hours of sleep.")
+    if food and mindful_score < 5:
+        recommendations.append("Note your mood before and after meals to see how food affects you.")
+    if trend == "declining":
+        recommendations.append("Consider reaching out to someone you trust this week.")
+    if stats["checkins"] < 4:
+        recommendations.append("Checking in a few more times a week makes your trends more useful.")
+    if not recommendations:
+        recommendations.append("Keep up the routines that helped you this week.")
+
+    return WeeklySummary(
+        week_start=week_start,
+        week_end=week_end,
+        avg_mood=round(avg_mood, 2),
+        mood_trend=trend,
+        top_emotions=moods[:3],
+        mindful_eating_score=round(mindful_score, 1),
+        key_insights=insights,
+        recommendations=recommendations,
+    ).model_dump()
+
+
+# (user_id, week_start, summary JSON, created_at, updated_at); a changed summary
+# drops its narrative so it is regenerated, an unchanged one is left alone
+UPSERT_SUMMARY_SQL = """
+    INSERT INTO weekly_summaries (user_id, week_start, summary, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, week_start) DO UPDATE SET
+        summary = excluded.summary,
+        narrative = NULL,
+        narrative_claimed_at = NULL,
+        updated_at = excluded.updated_at
+    WHERE summary != excluded.summary
+"""
+
+
+async def store_weekly_summaries(db_path: str, week_start: date, summaries: Dict[str, Dict[str, Any]]):
+    now = datetime.utcnow().isoformat()
+    async with connect(db_path) as db:
+        await db.executemany(UPSERT_SUMMARY_SQL, [
+            (user_id, week_start.isoformat(), json.dumps(summary), now, now)
+            for user_id, summary in summaries.items()
+        ])
+        await db.commit()
+
+
+async def _claim_next_narrative(db_path: str, week_start: date) -> Optional[tuple]:
+    now = datetime.utcnow()
+    async with connect(db_path) as db:
+        async with db.execute("""
+            UPDATE weekly_summaries SET narrative_claimed_at = ?
+            WHERE week_start = ? AND user_id = (
+                SELECT user_id FROM weekly_summaries
+                WHERE week_start = ? AND narrative IS NULL
+                  AND (narrative_claimed_at IS NULL OR narrative_claimed_at < ?)
+                LIMIT 1
+            )
+            RETURNING user_id, summary
+        """, (now.isoformat(), week_start.isoformat(), week_start.isoformat(),
+              (now - CLAIM_TIMEOUT).isoformat())) as cursor:
+            row = await cursor.fetchone()
+        await db.commit()
+    return (row[0], json.loads(row[1])) if row else None
+
+
+async def _release_claim(db_path: str, user_id: str, week_start: date):
+    async with connect(db_path) as db:
+        await db.execute("""
+            UPDATE weekly_summaries SET narrative_claimed_at = NULL
+            WHERE user_id = ? AND week_start = ? AND narrative IS NULL
+        """, (user_id, week_start.isoformat()))
+        await db.commit()
+
+
+async def generate_narratives(db_path: str, ai_service, week_start: date,
+                              spacing: float = NARRATIVE_SPACING) -> int:
+    """Generate missing narratives one user at a time; returns how many were written"""
+    written = 0
+    while True:
+        claimed = await _claim_next_narrative(db_path, week_start)
+        if not claimed:
+            return written
+        user_id, summary = claimed
+        try:
+            narrative = await ai_service.generate_weekly_summary(user_id, summary)
+        except Exception as e:
+            # Left claimed; retried once CLAIM_TIMEOUT passes
+            print(f"Weekly narrative failed for {user_id}: {e}")
+            continue
+        if not narrative:
+            # The model is unavailable: release the claim, leave the narrative
+            # NULL and stop; the next run retries
+            await _release_claim(db_path, user_id, week_start)
+            print("Weekly narratives paused: the model is unavailable")
+            return written
+        async with connect(db_path) as db:
+            await db.execute("""
+                UPDATE weekly_summaries SET narrative = ?, updated_at = ?
+                WHERE user_id = ? AND week_start = ?
+            """, (narrative, datetime.utcnow().isoformat(), user_id, week_start.isoformat()))
+            await db.commit()
+        written += 1
+        await asyncio.sleep(spacing)
+
+
+async def run_weekly_summaries(db_path: str, ai_service=None, week_start: Optional[date] = None,
+                               spacing: float = NARRATIVE_SPACING) -> Dict[str, int]:
+    week_start = week_start or last_complete_week()
+    summaries = await compute_weekly_summaries(db_path, week_start)
+    await store_weekly_summaries(db_path, week_start, summaries)
+    narratives = await generate_narratives(db_path, ai_service, week_start, spacing) if ai_service else 0
+    print(f"Weekly summaries for {week_start}: {len(summaries)} users, {narratives} narratives")
+    return {"users": len(summaries), "narratives": narratives}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute weekly summaries for all active users")
+    parser.add_argument("--db", default="mindmate.db")
+    parser.add_argument("--week-start", type=date.fromisoformat, default=None,
+                        help="Monday of the week to summarize (default: last complete week)")
+    parser.add_argument("--no-narratives", action="store_true", help="skip LLM narratives")
+    parser.add_argument("--spacing", type=float, default=NARRATIVE_SPACING)
+    args = parser.parse_args(argv)
+
+    ai_service = None
+    if not args.no_narratives:
+        from ai_service import AIService
+        ai_service = AIService()
+        asyncio.run(ai_service.initialize())
+    asyncio.run(run_weekly_summaries(args.db, ai_service, args.week_start, args.spacing))
+
+
+if __name__ == "__main__":
+    main()
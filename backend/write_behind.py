@@ -0,0 +1,138 @@
+# backend/write_behind.py - Batched, asynchronous persistence of chat conversations
+import asyncio
+import math
+import os
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, status
+
+from ids import new_id
+
+WRITE_BEHIND_ENABLED = os.getenv("MINDMATE_WRITE_BEHIND", "0") == "1"
+
+# Failed flushes in a row before the head batch is written row by row to find poison rows
+MAX_FLUSH_FAILURES = 3
+
+
+class ConversationWriteBuffer:
+    """Collects conversation rows in memory and writes them in multi-row transactions.
+
+    A flush happens when max_batch rows are waiting, every flush_interval
+    seconds, and on stop(). The buffer is bounded: once max_pending rows are
+    queued, add() waits for a flush and, if the buffer is still full, writes
+    its row straight through; if that write fails too, add() raises 503 with
+    Retry-After rather than grow the buffer or lose the row silently. Rows that fail to write are kept and retried
+    on the next flush; after MAX_FLUSH_FAILURES failures in a row the head
+    batch is written one row at a time and rows the database rejects
+    (anything but an OperationalError such as a locked or unavailable file)
+    are dropped, so one bad row cannot block the queue.
+    """
+
+    def __init__(self, db_manager, max_batch: int = 100, flush_interval: float = 0.5,
+                 max_pending: int = 5000):
+        self.db_manager = db_manager
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: List[Dict[str, Any]] = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._failures = 0
+
+    async def start(self):
+        self.db_manager.conversation_buffer = self
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        self.db_manager.conversation_buffer = None
+
+    async def add(self, user_id: str, user_message: str, ai_response: str) -> Dict[str, Any]:
+        # Same validation as DatabaseManager.save_conversation
+        if not user_message or not user_message.strip():
+            raise ValueError("User message cannot be empty")
+        if not ai_response or not ai_response.strip():
+            raise ValueError("AI response cannot be empty")
+
+        if len(self._pending) >= self.max_pending:
+            await self.flush()
+
+        row = {
+            "id": new_id(),
+            "user_id": user_id,
+            "user_message": user_message.strip(),
+            "ai_response": ai_response.strip(),
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        if len(self._pending) >= self.max_pending:
+            # Still backed up: write this row through rather than grow the buffer
+            try:
+                await self.db_manager.save_conversations([row])
+            except Exception as e:
+                print(f"Conversation write-through failed: {e}")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Conversations cannot be saved right now. Please try again shortly.",
+                    headers={"Retry-After": str(max(1, math.ceil(self.flush_interval * MAX_FLUSH_FAILURES)))}
+                )
+            return row
+        self._pending.append(row)
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+        return row
+
+    def pending_for(self, user_id: str) -> List[Dict[str, Any]]:
+        """Unflushed rows for a user, newest first"""
+        return [dict(row) for row in reversed(self._pending) if row["user_id"] == user_id]
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.max_batch]
+                try:
+                    await self.db_manager.save_conversations(batch)
+                except Exception as e:
+                    self._failures += 1
+                    if self._failures < MAX_FLUSH_FAILURES or not await self._isolate(batch):
+                        print(f"Conversation flush failed, will retry: {e}")
+                        return
+                    continue
+                self._failures = 0
+                # Rows appended while we were writing stay queued
+                del self._pending[:len(batch)]
+
+    async def _isolate(self, batch: List[Dict[str, Any]]) -> bool:
+        """Write batch row by row, dropping rows the database rejects.
+
+        Returns False (rows stay queued) as soon as a write fails in a way
+        that would fail for any row, e.g. the database is locked or missing.
+        """
+        for row in batch:
+            try:
+                await self.db_manager.save_conversations([row])
+            except sqlite3.OperationalError:
+                return False
+            except Exception as e:
+                print(f"Dropping conversation {row['id']} that cannot be stored: {e}")
+            self._pending.remove(row)
+        self._failures = 0
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()